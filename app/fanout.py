@@ -0,0 +1,65 @@
+# app/fanout.py
+import contextvars
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, Callable, Optional
+
+from django.conf import settings
+
+from .request_cache import run_with_deadline
+
+logger = logging.getLogger(__name__)
+
+# Shared, bounded pool so concurrent page loads cannot spawn unbounded threads
+_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'FANOUT_MAX_WORKERS', 16),
+    thread_name_prefix='fanout',
+)
+
+
+class FanOutLoader:
+    """Run independent FirebaseService reads concurrently with a per-request deadline.
+
+    Each call is registered under a name with the value to use if it fails or
+    misses the deadline; run() returns a dict of results keyed by those names,
+    so page latency follows the slowest call instead of the sum of all calls.
+    Calls must not start another FanOutLoader themselves.
+    """
+
+    def __init__(self, timeout: Optional[float] = None):
+        self.timeout = timeout if timeout is not None else getattr(settings, 'FANOUT_TIMEOUT', 10)
+        self._calls = {}
+        self.failed = []
+
+    def add(self, name: str, fn: Callable, *args, default: Any = None, **kwargs) -> 'FanOutLoader':
+        self._calls[name] = (fn, args, kwargs, default)
+        return self
+
+    def run(self) -> Dict[str, Any]:
+        # Each call runs in a copy of the caller's context so request-scoped
+        # state (the read cache) is visible from the pool threads; a call
+        # waiting on another's shared read gives up at the same deadline
+        deadline = time.monotonic() + self.timeout
+        futures = {
+            name: _executor.submit(contextvars.copy_context().run, run_with_deadline, deadline, fn, *args, **kwargs)
+            for name, (fn, args, kwargs, default) in self._calls.items()
+        }
+        wait(futures.values(), timeout=self.timeout)
+
+        results = {}
+        for name, future in futures.items():
+            default = self._calls[name][3]
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Fan-out call '{name}' missed the {self.timeout}s deadline")
+                self.failed.append(name)
+                results[name] = default
+                continue
+            try:
+                results[name] = future.result()
+            except Exception as e:
+                logger.error(f"Fan-out call '{name}' failed: {str(e)}")
+                self.failed.append(name)
+                results[name] = default
+        return results
@@ -0,0 +1,147 @@
+# app/firebase_mirror.py
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional, List, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CollectionMirror:
+    """Live in-memory copy of a Firestore collection kept up to date by an on_snapshot watch.
+
+    ``counters`` maps a counter name to a predicate over a document; the counts
+    are maintained incrementally as change events arrive, so reading them costs
+    nothing. The mirror only reports itself live once the initial snapshot has
+    been applied and the watch stream is still active; callers are expected to
+    fall back to a normal Firestore read otherwise.
+
+    Functions registered with add_listener() are called after each snapshot
+    is applied as ``listener(changes, reset)``, where ``changes`` maps document
+    IDs to their new data (None when removed) and ``reset`` is True when the
+    mirror was rebuilt from a full snapshot.
+    """
+
+    def __init__(self, collection_name: str, counters: Optional[Dict[str, Callable[[Dict[str, Any]], bool]]] = None,
+                 retry_interval: float = 30):
+        self.collection_name = collection_name
+        self.counters = counters or {}
+        self.retry_interval = retry_interval
+        self._documents = {}
+        self._counts = {name: 0 for name in self.counters}
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._watch = None
+        self._synced = False
+        self._last_attempt = 0.0
+        self.last_event_at = None
+        self._listeners = []
+
+    def add_listener(self, listener: Callable[[Dict[str, Optional[Dict[str, Any]]], bool], None]) -> None:
+        self._listeners.append(listener)
+
+    @property
+    def is_live(self) -> bool:
+        watch = self._watch
+        return self._synced and watch is not None and watch.is_active
+
+    def start(self, db) -> bool:
+        """Attach the snapshot listener (replacing a dead one)"""
+        with self._start_lock:
+            if self.is_live:
+                return True
+            self._last_attempt = time.monotonic()
+            self.stop()
+            try:
+                self._watch = db.collection(self.collection_name).on_snapshot(self._on_snapshot)
+                logger.info(f"Started {self.collection_name} mirror")
+                return True
+            except Exception as e:
+                logger.error(f"Error starting {self.collection_name} mirror: {str(e)}")
+                self._watch = None
+                return False
+
+    def ensure_started(self, db) -> bool:
+        """Start the watch if it is not running, retrying at most every retry_interval seconds"""
+        if self.is_live:
+            return True
+        watch = self._watch
+        if watch is not None and watch.is_active:
+            # Still waiting for the initial snapshot
+            return False
+        if time.monotonic() - self._last_attempt < self.retry_interval:
+            return False
+        self.start(db)
+        return self.is_live
+
+    def stop(self) -> None:
+        watch, self._watch = self._watch, None
+        self._synced = False
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error stopping {self.collection_name} mirror: {str(e)}")
+
+    def _count(self, data: Dict[str, Any], sign: int) -> None:
+        for name, predicate in self.counters.items():
+            try:
+                if predicate(data):
+                    self._counts[name] += sign
+            except Exception:
+                pass
+
+    def _on_snapshot(self, col_snapshot, changes, read_time) -> None:
+        try:
+            applied = {}
+            with self._lock:
+                reset = not self._synced
+                if reset:
+                    # The first callback carries the full collection; rebuild from it
+                    self._documents = {}
+                    self._counts = {name: 0 for name in self.counters}
+                    for doc in col_snapshot:
+                        data = doc.to_dict()
+                        data['id'] = doc.id
+                        self._documents[doc.id] = data
+                        self._count(data, 1)
+                        applied[doc.id] = data
+                else:
+                    for change in changes:
+                        doc = change.document
+                        previous = self._documents.pop(doc.id, None)
+                        if previous is not None:
+                            self._count(previous, -1)
+                        applied[doc.id] = None
+                        if change.type.name != 'REMOVED':
+                            data = doc.to_dict()
+                            data['id'] = doc.id
+                            self._documents[doc.id] = data
+                            self._count(data, 1)
+                            applied[doc.id] = data
+                self._synced = True
+                self.last_event_at = read_time
+        except Exception as e:
+            logger.error(f"Error applying {self.collection_name} snapshot: {str(e)}")
+            return
+
+        for listener in self._listeners:
+            try:
+                listener(applied, reset)
+            except Exception as e:
+                logger.error(f"Error in {self.collection_name} mirror listener: {str(e)}")
+
+    def documents(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [dict(data) for data in self._documents.values()]
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            data = self._documents.get(doc_id)
+            return dict(data) if data is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+            counts['total'] = len(self._documents)
+            return counts
@@ -0,0 +1,402 @@
+# app/firebase_replica.py
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Callable, Tuple, Set
+
+from django.db import transaction
+
+from .firebase_sync import (
+    bulk_upsert, firebase_id_map, parse_timestamp, driver_from_document, customer_from_document,
+    order_from_request, DRIVER_SYNC_FIELDS, CUSTOMER_SYNC_FIELDS, ORDER_SYNC_FIELDS,
+)
+from .models import Driver, Customer, DeliveryOrder, SyncCheckpoint
+
+logger = logging.getLogger(__name__)
+
+# SyncCheckpoint rows of the replicator are kept apart from --incremental ones:
+# they hold the read time of the last applied snapshot, not a document field
+REPLICA_CHECKPOINT_PREFIX = 'replica:'
+
+
+class SnapshotEvent:
+    """One on_snapshot callback, queued for the writer thread"""
+
+    __slots__ = ('replica', 'upserts', 'deletes', 'snapshot_ids', 'read_time', 'received_at')
+
+    def __init__(self, replica, upserts: Dict[str, Dict[str, Any]], deletes: Set[str],
+                 snapshot_ids: Optional[Set[str]], read_time: Optional[datetime]):
+        self.replica = replica
+        self.upserts = upserts
+        self.deletes = deletes
+        # Every document ID in the collection, set on the first snapshot after (re)attaching
+        self.snapshot_ids = snapshot_ids
+        self.read_time = read_time
+        self.received_at = time.time()
+
+
+class CollectionReplica:
+    """Keeps one Django model in step with a Firestore collection.
+
+    ``to_instances(items)`` turns ``[(doc_id, data), ...]`` into unsaved model
+    instances and returns them with the items it can't write yet (an order
+    whose customer hasn't been replicated); those are retried after a later
+    flush writes rows to a collection replicated before this one. At most
+    ``max_deferred`` are kept. Deferred documents exist only in memory, so
+    the checkpoint is held at the one in force when the oldest of them (or
+    of those dropped past ``max_deferred``) arrived; after a restart the
+    first snapshot hands them over again.
+
+    ``scope`` filters the model's rows down to the ones this collection
+    owns when other writers share the table; snapshots only delete those.
+    """
+
+    def __init__(self, collection: str, model, to_instances: Callable[[List[Tuple[str, Dict[str, Any]]]], Tuple[List[Any], List[Tuple[str, Dict[str, Any]]]]],
+                 update_fields: List[str], max_deferred: int = 10000, scope: Optional[Dict[str, Any]] = None):
+        self.collection = collection
+        self.model = model
+        self.to_instances = to_instances
+        self.update_fields = update_fields
+        self.scope = scope or {}
+        self.watch = None
+        self.checkpoint: Optional[datetime] = None
+        self.deferred: Dict[str, Dict[str, Any]] = {}
+        # Checkpoint in force when each deferred document arrived, and the oldest
+        # one of any dropped since the last full snapshot
+        self._deferred_since: Dict[str, Optional[datetime]] = {}
+        self._dropped = False
+        self._dropped_since: Optional[datetime] = None
+        self.max_deferred = max_deferred
+        self._initial = True
+        self.stats = {'upserted': 0, 'deleted': 0, 'errors': 0, 'lag': None, 'max_lag': 0.0, 'reconnects': 0}
+
+    @property
+    def checkpoint_key(self) -> str:
+        return f'{REPLICA_CHECKPOINT_PREFIX}{self.collection}'
+
+    @property
+    def is_active(self) -> bool:
+        watch = self.watch
+        return watch is not None and watch.is_active
+
+    def on_snapshot(self, put: Callable[[SnapshotEvent], None]):
+        """Watch callback that turns snapshots into SnapshotEvents for ``put``"""
+        def callback(col_snapshot, changes, read_time):
+            try:
+                if self._initial:
+                    # The first snapshot lists the whole collection. Only documents
+                    # written since the checkpoint need applying; the ID set lets the
+                    # writer drop rows deleted while nothing was listening.
+                    self._initial = False
+                    checkpoint = self.checkpoint
+                    upserts = {}
+                    ids = set()
+                    for doc in col_snapshot:
+                        ids.add(doc.id)
+                        updated = parse_timestamp(getattr(doc, 'update_time', None))
+                        if checkpoint is None or updated is None or updated >= checkpoint:
+                            upserts[doc.id] = doc.to_dict() or {}
+                    put(SnapshotEvent(self, upserts, set(), ids, read_time))
+                    return
+
+                upserts = {}
+                deletes = set()
+                for change in changes:
+                    doc = change.document
+                    if change.type.name == 'REMOVED':
+                        upserts.pop(doc.id, None)
+                        deletes.add(doc.id)
+                    else:
+                        deletes.discard(doc.id)
+                        upserts[doc.id] = doc.to_dict() or {}
+                put(SnapshotEvent(self, upserts, deletes, None, read_time))
+            except Exception as e:
+                logger.error(f"Error reading {self.collection} snapshot: {str(e)}")
+        return callback
+
+    def attach(self, db, put: Callable[[SnapshotEvent], None]) -> None:
+        self.detach()
+        self._initial = True
+        self.watch = db.collection(self.collection).on_snapshot(self.on_snapshot(put))
+        logger.info(f"Listening to {self.collection}")
+
+    def detach(self) -> None:
+        watch, self.watch = self.watch, None
+        if watch is not None:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error stopping {self.collection} listener: {str(e)}")
+
+    def apply(self, upserts: Dict[str, Dict[str, Any]], deletes: Set[str], snapshot_ids: Optional[Set[str]] = None,
+              batch_size: int = 500, retry_deferred: bool = False) -> int:
+        """Write one coalesced batch of changes (call inside a transaction); returns rows upserted"""
+        if snapshot_ids is not None:
+            # A full snapshot lists every document written since the checkpoint again
+            self._dropped = False
+        for doc_id in set(upserts) | deletes:
+            self.deferred.pop(doc_id, None)
+            self._deferred_since.pop(doc_id, None)
+        pending = dict(upserts)
+        since = {}
+        if retry_deferred:
+            pending.update(self.deferred)
+            since = self._deferred_since
+            self.deferred, self._deferred_since = {}, {}
+
+        upserted = 0
+        items = list(pending.items())
+        for i in range(0, len(items), batch_size):
+            try:
+                instances, deferred = self.to_instances(items[i:i + batch_size])
+            except Exception as e:
+                self.stats['errors'] += 1
+                logger.error(f"Error converting {self.collection} documents: {str(e)}")
+                continue
+            upserted += bulk_upsert(self.model, instances, self.update_fields, batch_size)
+            for doc_id, data in deferred:
+                self.deferred[doc_id] = data
+                self._deferred_since[doc_id] = since.get(doc_id, self.checkpoint)
+        self.stats['upserted'] += upserted
+
+        if len(self.deferred) > self.max_deferred:
+            dropped = len(self.deferred) - self.max_deferred
+            for doc_id in list(self.deferred)[:dropped]:
+                del self.deferred[doc_id]
+                self._hold_for_dropped(self._deferred_since.pop(doc_id, None))
+            logger.warning(f"Dropped {dropped} deferred {self.collection} documents; "
+                           f"they are read again when the listener is next attached")
+
+        owned = self.model.objects.filter(**self.scope)
+        stale = set(deletes)
+        if snapshot_ids is not None:
+            stale.update(set(owned.values_list('firebase_id', flat=True)) - snapshot_ids)
+            self.deferred = {doc_id: data for doc_id, data in self.deferred.items() if doc_id in snapshot_ids}
+            self._deferred_since = {doc_id: self._deferred_since[doc_id] for doc_id in self.deferred}
+        stale = list(stale)
+        for i in range(0, len(stale), 900):
+            _, deleted = owned.filter(firebase_id__in=stale[i:i + 900]).delete()
+            self.stats['deleted'] += deleted.get(self.model._meta.label, 0)
+        return upserted
+
+    def _hold_for_dropped(self, since: Optional[datetime]) -> None:
+        if not self._dropped:
+            self._dropped, self._dropped_since = True, since
+        elif self._dropped_since is not None:
+            self._dropped_since = None if since is None else min(self._dropped_since, since)
+
+    def held_checkpoint(self, read_time: datetime) -> Optional[datetime]:
+        """``read_time``, unless a document that isn't in the table yet arrived under an earlier checkpoint"""
+        floors = list(self._deferred_since.values())
+        if self._dropped:
+            floors.append(self._dropped_since)
+        if not floors:
+            return read_time
+        if any(floor is None for floor in floors):
+            return None
+        return min(min(floors), read_time)
+
+    def load_checkpoint(self) -> None:
+        checkpoint = SyncCheckpoint.objects.filter(collection=self.checkpoint_key).first()
+        self.checkpoint = checkpoint.last_updated if checkpoint else None
+
+    def save_checkpoint(self, read_time: datetime, synced: int) -> None:
+        checkpoint, _ = SyncCheckpoint.objects.get_or_create(
+            collection=self.checkpoint_key, defaults={'updated_field': 'update_time'})
+        checkpoint.last_updated = self.held_checkpoint(read_time)
+        checkpoint.synced_count += synced
+        checkpoint.save()
+        self.checkpoint = checkpoint.last_updated
+
+
+def _documents_to(build):
+    def to_instances(items):
+        return [build(doc_id, data) for doc_id, data in items], []
+    return to_instances
+
+
+def _requests_to_orders(items):
+    """DeliveryRequests documents as DeliveryOrders; those whose customer isn't local yet are deferred"""
+    customers = firebase_id_map(Customer, [data.get('userID') for _, data in items if data.get('userID')])
+    drivers = firebase_id_map(Driver, [data.get('driverID') for _, data in items if data.get('driverID')])
+    instances, deferred = [], []
+    for doc_id, data in items:
+        customer_pk = customers.get(data.get('userID'))
+        if customer_pk is None:
+            deferred.append((doc_id, data))
+            continue
+        instances.append(order_from_request(doc_id, data, customer_pk, drivers.get(data.get('driverID'))))
+    return instances, deferred
+
+
+def default_replicas() -> List[CollectionReplica]:
+    # Customers and drivers first, so orders in the same flush can resolve them
+    return [
+        CollectionReplica('Customers', Customer, _documents_to(customer_from_document), CUSTOMER_SYNC_FIELDS),
+        CollectionReplica('Drivers', Driver, _documents_to(driver_from_document), DRIVER_SYNC_FIELDS),
+        # DeliveryOrder also holds rows sync_firebase_data reads from Orders
+        CollectionReplica('DeliveryRequests', DeliveryOrder, _requests_to_orders, ORDER_SYNC_FIELDS,
+                          scope={'source': 'DeliveryRequests'}),
+    ]
+
+
+class FirestoreReplicator:
+    """Applies Firestore listener events to local tables in micro-batches.
+
+    Listener callbacks only enqueue events; a single writer (the thread
+    calling run()) drains up to ``batch_size`` of them or whatever arrived
+    within ``flush_interval`` seconds, coalesces repeated changes to a
+    document and commits one transaction per flush. The queue is bounded,
+    so a writer that falls behind blocks the listener threads instead of
+    buffering without limit.
+
+    The client library resumes an interrupted watch stream by itself. A
+    listener that stops for good is reattached after ``retry_interval``
+    seconds; its first snapshot is then applied only for documents written
+    since the collection's checkpoint, and rows whose documents disappeared
+    meanwhile are deleted.
+    """
+
+    def __init__(self, db, replicas: Optional[List[CollectionReplica]] = None, batch_size: int = 500,
+                 flush_interval: float = 0.5, queue_size: int = 1000, retry_interval: float = 30):
+        self.db = db
+        self.replicas = replicas if replicas is not None else default_replicas()
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.queue: 'queue.Queue[SnapshotEvent]' = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._next_attempt: Dict[str, float] = {}
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _put(self, event: SnapshotEvent) -> None:
+        while not self._stop.is_set():
+            try:
+                self.queue.put(event, timeout=1)
+                return
+            except queue.Full:
+                logger.warning(f"Replication queue full; {event.replica.collection} listener waiting")
+
+    def _ensure_listening(self) -> None:
+        now = time.monotonic()
+        for replica in self.replicas:
+            if replica.is_active or now < self._next_attempt.get(replica.collection, 0):
+                continue
+            if replica.watch is not None:
+                replica.stats['reconnects'] += 1
+                logger.warning(f"{replica.collection} listener stopped; reattaching")
+            self._next_attempt[replica.collection] = now + self.retry_interval
+            try:
+                replica.attach(self.db, self._put)
+            except Exception as e:
+                logger.error(f"Error attaching {replica.collection} listener: {str(e)}")
+
+    def _drain(self) -> List[SnapshotEvent]:
+        events = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(events) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                events.append(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self, events: List[SnapshotEvent]) -> None:
+        """Apply queued events, one transaction for the lot"""
+        if not events:
+            return
+        with transaction.atomic():
+            # Rows written to earlier replicas may be what deferred documents were waiting for
+            written = 0
+            for replica in self.replicas:
+                own = [event for event in events if event.replica is replica]
+                retry = bool(written and replica.deferred)
+                if not own and not retry:
+                    continue
+                upserts: Dict[str, Dict[str, Any]] = {}
+                deletes: Set[str] = set()
+                for event in own:
+                    if event.snapshot_ids is not None:
+                        # A full snapshot supersedes whatever came before it
+                        written += replica.apply(upserts, deletes, batch_size=self.batch_size)
+                        written += replica.apply(event.upserts, set(), event.snapshot_ids, batch_size=self.batch_size)
+                        upserts, deletes = {}, set()
+                        continue
+                    for doc_id, data in event.upserts.items():
+                        upserts[doc_id] = data
+                        deletes.discard(doc_id)
+                    for doc_id in event.deletes:
+                        upserts.pop(doc_id, None)
+                        deletes.add(doc_id)
+                written += replica.apply(upserts, deletes, batch_size=self.batch_size, retry_deferred=retry)
+
+                read_times = [event.read_time for event in own if event.read_time is not None]
+                if read_times:
+                    replica.save_checkpoint(parse_timestamp(max(read_times)),
+                                            sum(len(event.upserts) + len(event.deletes) for event in own))
+
+        now = time.time()
+        for event in events:
+            read_time = parse_timestamp(event.read_time) if event.read_time is not None else None
+            lag = now - (read_time.timestamp() if read_time else event.received_at)
+            stats = event.replica.stats
+            stats['lag'] = round(lag, 3)
+            stats['max_lag'] = round(max(stats['max_lag'], lag), 3)
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-collection counters; max_lag is reset on every call"""
+        report = {}
+        for replica in self.replicas:
+            report[replica.collection] = dict(replica.stats, live=replica.is_active, deferred=len(replica.deferred))
+            replica.stats['max_lag'] = 0.0
+        report['queue'] = {'depth': self.queue.qsize(), 'capacity': self.queue.maxsize}
+        return report
+
+    def run(self, max_duration: Optional[float] = None, report_interval: float = 30,
+            on_report: Optional[Callable[[Dict[str, Dict[str, Any]]], None]] = None) -> None:
+        for replica in self.replicas:
+            replica.load_checkpoint()
+        started = time.monotonic()
+        next_report = started + report_interval
+        try:
+            while not self._stop.is_set():
+                self._ensure_listening()
+                events = self._drain()
+                try:
+                    self.flush(events)
+                except Exception as e:
+                    # Nothing was committed; the listeners' next full snapshot repairs the gap
+                    logger.error(f"Error applying {len(events)} replication events: {str(e)}")
+                    for replica in {event.replica for event in events}:
+                        replica.stats['errors'] += 1
+                        replica.detach()
+                        replica.load_checkpoint()
+                        self._next_attempt[replica.collection] = 0
+
+                now = time.monotonic()
+                if on_report is not None and now >= next_report:
+                    on_report(self.report())
+                    next_report = now + report_interval
+                if max_duration is not None and now - started >= max_duration:
+                    break
+        finally:
+            for replica in self.replicas:
+                replica.detach()
+            # Whatever was already delivered still gets written
+            remaining = []
+            while True:
+                try:
+                    remaining.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.flush(remaining)
+            except Exception as e:
+                logger.error(f"Error applying {len(remaining)} replication events on shutdown: {str(e)}")
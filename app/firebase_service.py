@@ -1,11 +1,58 @@
 # logistics_app/firebase_service.py
+from django.conf import settings
 from firebase_admin import firestore
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from datetime import date, datetime, timedelta, timezone
+from itertools import combinations
+import base64
+import json
 import logging
+import threading
+
+from .firebase_cache import DocumentCache
+from .firebase_mirror import CollectionMirror
+from .geo_index import GridIndex
+from .geocoding import get_geocoder
+from . import rollups
+from .request_cache import memoize_read, forget_reads
 
 logger = logging.getLogger(__name__)
 
+# Trip statuses that count as a driver's current trip
+ACTIVE_TRIP_STATUSES = ['pending', 'accepted', 'picked_up', 'in_progress', 'started', 'ongoing']
+
+# Server timestamp set by every write to Drivers, Customers and DeliveryRequests;
+# sync_firebase_data --incremental reads documents changed since its checkpoint by it
+UPDATED_FIELD = 'dateUpdated'
+
 class FirebaseService:
+    # Process-wide caches for single-document reads, shared by every instance
+    driver_cache = DocumentCache(
+        max_entries=getattr(settings, 'FIREBASE_CACHE_MAX_ENTRIES', 2000),
+        ttl=getattr(settings, 'FIREBASE_CACHE_TTL', 60),
+    )
+    customer_cache = DocumentCache(
+        max_entries=getattr(settings, 'FIREBASE_CACHE_MAX_ENTRIES', 2000),
+        ttl=getattr(settings, 'FIREBASE_CACHE_TTL', 60),
+    )
+
+    # Opt-in live copy of the Drivers collection (FIREBASE_DRIVERS_MIRROR)
+    drivers_mirror = CollectionMirror(
+        'Drivers',
+        counters={
+            'online': lambda d: bool(d.get('isDriverOnline', False)),
+            'approved': lambda d: bool(d.get('isApproved', False)),
+        },
+        retry_interval=getattr(settings, 'FIREBASE_MIRROR_RETRY_INTERVAL', 30),
+    )
+
+    # Positions of online drivers for the fleet map, fed by a DriverLocation listener
+    driver_locations_mirror = CollectionMirror(
+        'DriverLocation',
+        retry_interval=getattr(settings, 'FIREBASE_MIRROR_RETRY_INTERVAL', 30),
+    )
+    driver_grid = GridIndex(cell_size=getattr(settings, 'FLEET_GRID_CELL_SIZE', 0.01))
+
     def __init__(self):
         try:
             self.db = firestore.client()
@@ -14,6 +61,17 @@ class FirebaseService:
             print(f"❌ Firebase connection failed: {str(e)}")
             self.db = None
     
+    @staticmethod
+    def _stamped(data: Dict[str, Any]) -> Dict[str, Any]:
+        """``data`` plus the UPDATED_FIELD server timestamp"""
+        return dict(data, **{UPDATED_FIELD: firestore.SERVER_TIMESTAMP})
+
+    def _drivers_mirror_live(self) -> bool:
+        """True when the Drivers mirror is enabled, connected and synced"""
+        if not self.db or not getattr(settings, 'FIREBASE_DRIVERS_MIRROR', False):
+            return False
+        return self.drivers_mirror.ensure_started(self.db)
+
     # Driver Management Methods
     def get_all_drivers(self) -> List[Dict[str, Any]]:
         """Get all drivers from Firestore"""
@@ -21,6 +79,10 @@ class FirebaseService:
             if not self.db:
                 print("❌ Firebase not connected")
                 return []
+
+            # Serve from memory while the snapshot listener is connected
+            if self._drivers_mirror_live():
+                return self.drivers_mirror.documents()
             
             # Use the correct capitalized collection name
             drivers_ref = self.db.collection('Drivers')  # Note: capitalized
@@ -31,9 +93,8 @@ class FirebaseService:
                 driver_data = doc.to_dict()
                 driver_data['id'] = doc.id
                 drivers.append(driver_data)
-                print(f"📄 Driver found: {doc.id}")
             
-            print(f"✅ Found {len(drivers)} drivers")
+            logger.debug(f"Found {len(drivers)} drivers")
             return drivers
             
         except Exception as e:
@@ -41,8 +102,12 @@ class FirebaseService:
             logger.error(f"Error fetching drivers: {str(e)}")
             return []
     
+    @memoize_read
     def get_driver_by_id(self, driver_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific driver by ID"""
+        cached = self.driver_cache.get(driver_id)
+        if cached is not None:
+            return cached
         try:
             doc_ref = self.db.collection('Drivers').document(driver_id)  # Capitalized
             doc = doc_ref.get()
@@ -50,6 +115,7 @@ class FirebaseService:
             if doc.exists:
                 driver_data = doc.to_dict()
                 driver_data['id'] = doc.id
+                self.driver_cache.set(driver_id, driver_data)
                 return driver_data
             return None
         except Exception as e:
@@ -60,16 +126,19 @@ class FirebaseService:
         """Update driver information"""
         try:
             doc_ref = self.db.collection('Drivers').document(driver_id)  # Capitalized
-            doc_ref.update(data)
+            doc_ref.update(self._stamped(data))
             return True
         except Exception as e:
             logger.error(f"Error updating driver {driver_id}: {str(e)}")
             return False
+        finally:
+            self.driver_cache.invalidate(driver_id)
+            forget_reads()
     
     def create_driver(self, data: Dict[str, Any]) -> Optional[str]:
         """Create a new driver"""
         try:
-            doc_ref = self.db.collection('Drivers').add(data)  # Capitalized
+            doc_ref = self.db.collection('Drivers').add(self._stamped(data))  # Capitalized
             return doc_ref[1].id
         except Exception as e:
             logger.error(f"Error creating driver: {str(e)}")
@@ -83,6 +152,9 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"Error deleting driver {driver_id}: {str(e)}")
             return False
+        finally:
+            self.driver_cache.invalidate(driver_id)
+            forget_reads()
     
     # Customer Management Methods
     def get_all_customers(self) -> List[Dict[str, Any]]:
@@ -111,8 +183,12 @@ class FirebaseService:
             logger.error(f"Error fetching customers: {str(e)}")
             return []
     
+    @memoize_read
     def get_customer_by_id(self, customer_id: str) -> Optional[Dict[str, Any]]:
         """Get a specific customer by ID"""
+        cached = self.customer_cache.get(customer_id)
+        if cached is not None:
+            return cached
         try:
             doc_ref = self.db.collection('Customers').document(customer_id)  # Capitalized
             doc = doc_ref.get()
@@ -120,6 +196,7 @@ class FirebaseService:
             if doc.exists:
                 customer_data = doc.to_dict()
                 customer_data['id'] = doc.id
+                self.customer_cache.set(customer_id, customer_data)
                 return customer_data
             return None
         except Exception as e:
@@ -130,16 +207,19 @@ class FirebaseService:
         """Update customer information"""
         try:
             doc_ref = self.db.collection('Customers').document(customer_id)  # Capitalized
-            doc_ref.update(data)
+            doc_ref.update(self._stamped(data))
             return True
         except Exception as e:
             logger.error(f"Error updating customer {customer_id}: {str(e)}")
             return False
+        finally:
+            self.customer_cache.invalidate(customer_id)
+            forget_reads()
     
     def create_customer(self, data: Dict[str, Any]) -> Optional[str]:
         """Create a new customer"""
         try:
-            doc_ref = self.db.collection('Customers').add(data)  # Capitalized
+            doc_ref = self.db.collection('Customers').add(self._stamped(data))  # Capitalized
             return doc_ref[1].id
         except Exception as e:
             logger.error(f"Error creating customer: {str(e)}")
@@ -153,19 +233,197 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"Error deleting customer {customer_id}: {str(e)}")
             return False
-    
+        finally:
+            self.customer_cache.invalidate(customer_id)
+            forget_reads()
+
+    # Batch Lookup Methods
+    def _get_documents_by_ids(self, collection: str, doc_ids, cache: Optional[DocumentCache] = None) -> Dict[str, Dict[str, Any]]:
+        """Fetch several documents of one collection in a single batch get"""
+        ids = {doc_id for doc_id in doc_ids if doc_id}
+        documents = {}
+
+        # Serve what we can from the cache and only batch-fetch the misses
+        if cache is not None:
+            for doc_id in list(ids):
+                cached = cache.get(doc_id)
+                if cached is not None:
+                    documents[doc_id] = cached
+                    ids.discard(doc_id)
+        if not ids:
+            return documents
+
+        collection_ref = self.db.collection(collection)
+        refs = [collection_ref.document(doc_id) for doc_id in ids]
+
+        for doc in self.db.get_all(refs):
+            if doc.exists:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                documents[doc.id] = data
+                if cache is not None:
+                    cache.set(doc.id, data)
+        return documents
+
+    def get_drivers_by_ids(self, driver_ids) -> Dict[str, Dict[str, Any]]:
+        """Get several drivers at once, keyed by driver ID"""
+        try:
+            return self._get_documents_by_ids('Drivers', driver_ids, self.driver_cache)
+        except Exception as e:
+            logger.error(f"Error batch fetching drivers: {str(e)}")
+            return {}
+
+    def get_customers_by_ids(self, customer_ids) -> Dict[str, Dict[str, Any]]:
+        """Get several customers at once, keyed by customer ID"""
+        try:
+            return self._get_documents_by_ids('Customers', customer_ids, self.customer_cache)
+        except Exception as e:
+            logger.error(f"Error batch fetching customers: {str(e)}")
+            return {}
+
+    def list_documents_page(self, collection: str, limit: int = 20, cursor: Optional[str] = None,
+                            fields: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Get one page of a collection in document-ID order.
+
+        ``fields`` becomes a select() projection, ``filters`` equality where()
+        clauses, and ``cursor`` is the next_cursor token of the previous page.
+        """
+        query = self.db.collection(collection)
+        for field, value in (filters or {}).items():
+            query = query.where(field, '==', value)
+        if fields:
+            query = query.select(fields)
+        query = query.order_by('__name__')
+
+        doc_id, _ = self._decode_cursor(cursor)
+        if doc_id:
+            query = query.start_after({'__name__': doc_id})
+
+        docs = list(query.limit(limit + 1).stream())
+        has_more = len(docs) > limit
+
+        data = []
+        for doc in docs[:limit]:
+            item = doc.to_dict()
+            item['id'] = doc.id
+            data.append(item)
+
+        return {
+            'data': data,
+            'next_cursor': self._encode_cursor(data[-1]['id'], 'next') if data and has_more else None,
+        }
+
+    def get_drivers_page(self, **kwargs) -> Dict[str, Any]:
+        """Get one page of drivers (see list_documents_page)"""
+        try:
+            return self.list_documents_page('Drivers', **kwargs)
+        except Exception as e:
+            logger.error(f"Error fetching drivers page: {str(e)}")
+            return {'data': [], 'next_cursor': None}
+
+    def get_customers_page(self, **kwargs) -> Dict[str, Any]:
+        """Get one page of customers (see list_documents_page)"""
+        try:
+            return self.list_documents_page('Customers', **kwargs)
+        except Exception as e:
+            logger.error(f"Error fetching customers page: {str(e)}")
+            return {'data': [], 'next_cursor': None}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters for the driver and customer document caches"""
+        return {
+            'drivers': self.driver_cache.stats(),
+            'customers': self.customer_cache.stats(),
+        }
+
     # Analytics and Reporting Methods
+    def _count_documents(self, query) -> int:
+        """Count matching documents with a server-side count() aggregation"""
+        result = query.count(alias='total').get()
+        return int(result[0][0].value)
+
+    def _sum_fields(self, query, fields: List[str], count: bool = False) -> Dict[str, Any]:
+        """sum() of each field (and count() as ``count``) over matching documents in one aggregation"""
+        aggregation = query.count(alias='count') if count else None
+        for field in fields:
+            aggregation = aggregation.sum(field, alias=field) if aggregation else query.sum(field, alias=field)
+        return {result.alias: result.value or 0 for result in aggregation.get()[0]}
+
+    def _sum_first_present(self, query, fields: List[str], count: bool = False) -> Dict[str, Any]:
+        """Sum, over matching documents, the first of ``fields`` each one has set.
+
+        sum() skips non-numeric values and no filter selects a missing field,
+        so each field is summed over the documents having the fields before it
+        (``!= None`` matches documents where a field is set) and the overlaps
+        are subtracted by inclusion-exclusion: one aggregation per subset of
+        the earlier fields. Values stored as strings are read with a
+        string-range query, which matches nothing else, and parsed. Returns
+        ``total`` (and ``count`` when asked for).
+        """
+        total = 0
+        result = {}
+        for size in range(len(fields)):
+            for subset in combinations(fields[:-1], size):
+                later = fields[fields.index(subset[-1]) + 1:] if subset else fields
+                filtered = query
+                for field in subset:
+                    filtered = filtered.where(field, '!=', None)
+                sums = self._sum_fields(filtered, later, count=count and not subset)
+                if not subset:
+                    result['count'] = sums.pop('count', 0)
+                total += (-1) ** size * sum(sums.values())
+
+        for field in fields:
+            for doc in query.where(field, '>=', '').select(fields).stream():
+                data = doc.to_dict()
+                if next((name for name in fields if data.get(name) is not None), None) == field:
+                    try:
+                        total += float(data[field])
+                    except ValueError:
+                        pass
+
+        result['total'] = total
+        if not count:
+            result.pop('count', None)
+        return result
+
+    def get_trip_totals(self) -> Dict[str, Any]:
+        """Trip totals from server-side aggregations, so trips written by the apps are included.
+
+        Revenue is the first of rollups.REVENUE_FIELDS set on each completed
+        trip, as trip_revenue() reads it. Takes a count() for all trips plus a
+        handful of aggregation and string-range queries on completed ones;
+        the status/amount queries need composite indexes, which Firestore
+        offers to create from the first error.
+        """
+        try:
+            trips_ref = self.db.collection('DeliveryRequests')
+            completed_ref = trips_ref.where('status', 'in', rollups.COMPLETED_STATUSES)
+            revenue = self._sum_first_present(completed_ref, rollups.REVENUE_FIELDS, count=True)
+            totals = {
+                'trips_total': self._count_documents(trips_ref),
+                'completed_trips': revenue['count'],
+                'revenue_total': revenue['total'],
+            }
+            return rollups.trip_totals_analytics(totals)
+        except Exception as e:
+            logger.error(f"Error getting trip totals: {str(e)}")
+            return {
+                'total_trips': 0,
+                'completed_trips': 0,
+                'total_revenue': 0,
+                'completion_rate': 0
+            }
+
     def get_drivers_stats(self) -> Dict[str, Any]:
         """Get driver statistics"""
         try:
-            drivers = self.get_all_drivers()
-            total_drivers = len(drivers)
-            active_drivers = len([d for d in drivers if d.get('status') == 'active'])
+            stats = self.get_driver_stats_enhanced()
             
             return {
-                'total_drivers': total_drivers,
-                'active_drivers': active_drivers,
-                'inactive_drivers': total_drivers - active_drivers
+                'total_drivers': stats['total_drivers'],
+                'active_drivers': stats['active_drivers'],
+                'inactive_drivers': stats['offline_drivers']
             }
         except Exception as e:
             logger.error(f"Error getting driver stats: {str(e)}")
@@ -174,8 +432,7 @@ class FirebaseService:
     def get_customers_stats(self) -> Dict[str, Any]:
         """Get customer statistics"""
         try:
-            customers = self.get_all_customers()
-            total_customers = len(customers)
+            total_customers = self._count_documents(self.db.collection('Customers'))
             
             return {
                 'total_customers': total_customers,
@@ -185,6 +442,7 @@ class FirebaseService:
             return {}
     
     # Add these methods to FirebaseService class
+    @memoize_read
     def get_driver_documents(self, driver_id: str) -> Optional[Dict[str, Any]]:
         """Get driver's documents"""
         try:
@@ -226,6 +484,20 @@ class FirebaseService:
             logger.error(f"Error fetching vehicle {vehicle_id}: {str(e)}")
             return None
 
+    @memoize_read
+    def get_driver_vehicle(self, driver_id: str) -> Optional[Dict[str, Any]]:
+        """Get the vehicle registered to a driver"""
+        try:
+            docs = self.db.collection('VehicleDetails').where('userID', '==', driver_id).limit(1).stream()
+            for doc in docs:
+                data = doc.to_dict()
+                data['id'] = doc.id
+                return data
+            return None
+        except Exception as e:
+            logger.error(f"Error fetching vehicle for driver {driver_id}: {str(e)}")
+            return None
+
     def update_vehicle(self, vehicle_id: str, data: Dict[str, Any]) -> bool:
         """Update vehicle information"""
         try:
@@ -244,6 +516,7 @@ class FirebaseService:
         except Exception as e:
             logger.error(f"Error deleting vehicle {vehicle_id}: {str(e)}")
             return False
+    @memoize_read
     def get_driver_trips(self, driver_id: str) -> List[Dict[str, Any]]:
         """Get all trips/delivery requests for a specific driver"""
         try:
@@ -261,6 +534,7 @@ class FirebaseService:
             logger.error(f"Error fetching trips for driver {driver_id}: {str(e)}")
             return []
 
+    @memoize_read
     def get_driver_current_trip(self, driver_id: str) -> Optional[Dict[str, Any]]:
         """Get the driver's current active trip if any.
 
@@ -268,14 +542,10 @@ class FirebaseService:
         Falls back to the most recent ended/completed trip if no active one.
         """
         try:
-            active_statuses = [
-                'pending', 'accepted', 'picked_up', 'in_progress', 'started', 'ongoing'
-            ]
-
             # First, search for an active trip
             query = (self.db.collection('DeliveryRequests')
                         .where('driverID', '==', driver_id)
-                        .where('status', 'in', active_statuses)
+                        .where('status', 'in', ACTIVE_TRIP_STATUSES)
                         .order_by('dateCreated', direction=firestore.Query.DESCENDING)
                         .limit(1))
 
@@ -303,61 +573,99 @@ class FirebaseService:
             logger.error(f"Error fetching current trip for driver {driver_id}: {str(e)}")
             return None
 
-    def get_driver_ratings(self, driver_id: str) -> List[Dict[str, Any]]:
-        """Get all ratings for a specific driver"""
+    @memoize_read
+    def get_driver_ratings(self, driver_id: str, limit: Optional[int] = None,
+                           start_after: Optional[str] = None, enrich: bool = True) -> List[Dict[str, Any]]:
+        """Get ratings for a specific driver.
+
+        With ``limit`` the newest ratings are returned first, one page at a time
+        (``start_after`` is the ID of the last rating on the previous page).
+        """
         try:
-            ratings = []
             # Query DriverRatings where driverId matches (note: it's 'driverId' not 'driverID')
-            ratings_ref = self.db.collection('DriversRatings').where('driverId', '==', driver_id).stream()
-            
-            for doc in ratings_ref:
-                rating_data = doc.to_dict()
-                rating_data['id'] = doc.id
-                
-                # Try to get customer info for this rating
-                if 'customerId' in rating_data:
-                    customer = self.get_customer_by_id(rating_data['customerId'])
-                    if customer:
-                        rating_data['customer_name'] = f"{customer.get('firstName', '')} {customer.get('lastName', '')}"
-                
-                # Try to infer trip info: use the latest DeliveryRequest for same driver and customer
-                if not rating_data.get('tripId') and not rating_data.get('link_order_id'):
-                    try:
-                        if rating_data.get('customerId'):
-                            query = (self.db.collection('DeliveryRequests')
-                                        .where('driverID', '==', driver_id)
-                                        .where('userID', '==', rating_data['customerId'])
-                                        .limit(1))
-                            trip_docs = list(query.stream())  # Avoid order_by to prevent index requirements
-                            if trip_docs:
-                                tdoc = trip_docs[0]
-                                rating_data['tripId'] = tdoc.id
-                                rating_data['link_order_id'] = tdoc.id
-                        # Fallback: latest trip for driver regardless of customer
-                        if not rating_data.get('tripId') and not rating_data.get('link_order_id'):
-                            fallback_q = (self.db.collection('DeliveryRequests')
-                                            .where('driverID', '==', driver_id)
-                                            .limit(1))
-                            fdocs = list(fallback_q.stream())  # Avoid order_by to prevent index requirements
-                            if fdocs:
-                                fdoc = fdocs[0]
-                                rating_data['link_order_id'] = fdoc.id
-                    except Exception:
-                        # Best-effort enrichment; ignore failures
-                        pass
-
-                # Unified field used by templates for linking to order detail
-                order_id = rating_data.get('tripId') or rating_data.get('link_order_id')
-                if order_id:
-                    rating_data['order_id'] = order_id
-                
-                ratings.append(rating_data)
-            
+            ratings_ref = self.db.collection('DriversRatings').where('driverId', '==', driver_id)
+            if limit:
+                ratings = self._get_ratings_page(ratings_ref, driver_id, limit, start_after)
+            else:
+                ratings = []
+                for doc in ratings_ref.stream():
+                    rating_data = doc.to_dict()
+                    rating_data['id'] = doc.id
+                    ratings.append(rating_data)
+
+            if enrich:
+                self._enrich_ratings(driver_id, ratings)
             return ratings
         except Exception as e:
             logger.error(f"Error fetching ratings for driver {driver_id}: {str(e)}")
             return []
 
+    def _get_ratings_page(self, ratings_ref, driver_id: str, limit: int, start_after: Optional[str]) -> List[Dict[str, Any]]:
+        """Newest-first page of ratings; needs a (driverId, dateCreated desc) index"""
+        try:
+            query = ratings_ref.order_by('dateCreated', direction=firestore.Query.DESCENDING)
+            if start_after:
+                cursor = self.db.collection('DriversRatings').document(start_after).get()
+                if cursor.exists:
+                    query = query.start_after(cursor)
+            ratings = []
+            for doc in query.limit(limit).stream():
+                rating_data = doc.to_dict()
+                rating_data['id'] = doc.id
+                ratings.append(rating_data)
+            return ratings
+        except Exception as e:
+            # Missing composite index: sort the driver's ratings in memory instead
+            logger.warning(f"Ordered ratings query failed for driver {driver_id}, sorting in memory: {str(e)}")
+            ratings = []
+            for doc in ratings_ref.stream():
+                rating_data = doc.to_dict()
+                rating_data['id'] = doc.id
+                ratings.append(rating_data)
+            # dateCreated may be a Timestamp or an ISO string; undated ratings sort last
+            oldest = datetime.min.replace(tzinfo=timezone.utc)
+            ratings = sorted(ratings, key=lambda x: rollups.trip_datetime(x) or oldest, reverse=True)
+            if start_after:
+                ids = [r['id'] for r in ratings]
+                ratings = ratings[ids.index(start_after) + 1:] if start_after in ids else []
+            return ratings[:limit]
+
+    def _enrich_ratings(self, driver_id: str, ratings: List[Dict[str, Any]]) -> None:
+        """Add customer_name and order links to ratings with one batch get and one trips query"""
+        customers = self.get_customers_by_ids(r.get('customerId') for r in ratings)
+
+        # Trips of this driver, indexed by customer, to infer the rated trip
+        first_trip = None
+        trips_by_customer = {}
+        if any(not r.get('tripId') and not r.get('link_order_id') for r in ratings):
+            for trip in self.get_driver_trips(driver_id):
+                if first_trip is None:
+                    first_trip = trip
+                if trip.get('userID'):
+                    trips_by_customer.setdefault(trip['userID'], trip)
+
+        for rating_data in ratings:
+            # Customer info for this rating
+            customer = customers.get(rating_data.get('customerId'))
+            if customer:
+                rating_data['customer_name'] = f"{customer.get('firstName', '')} {customer.get('lastName', '')}"
+
+            # Infer trip info: a DeliveryRequest for same driver and customer
+            if not rating_data.get('tripId') and not rating_data.get('link_order_id'):
+                trip = trips_by_customer.get(rating_data.get('customerId'))
+                if trip:
+                    rating_data['tripId'] = trip['id']
+                    rating_data['link_order_id'] = trip['id']
+                # Fallback: any trip for driver regardless of customer
+                elif first_trip:
+                    rating_data['link_order_id'] = first_trip['id']
+
+            # Unified field used by templates for linking to order detail
+            order_id = rating_data.get('tripId') or rating_data.get('link_order_id')
+            if order_id:
+                rating_data['order_id'] = order_id
+
+    @memoize_read
     def get_driver_balance(self, driver_id: str) -> Dict[str, Any]:
         """Get driver's balance information"""
         try:
@@ -370,11 +678,32 @@ class FirebaseService:
             logger.error(f"Error fetching balance for driver {driver_id}: {str(e)}")
             return {'balance': 0, 'pendingAmount': 0, 'totalEarned': 0}
 
+    @memoize_read
     def get_rating_analytics(self, driver_id: str) -> Dict[str, Any]:
         """Get comprehensive rating analytics for a driver"""
+        # Totals need every rating but none of the customer/trip enrichment
+        return self._rating_analytics(driver_id, self.get_driver_ratings(driver_id, enrich=False))
+
+    @memoize_read
+    def get_driver_rating_summary(self, driver_id: str, limit: int) -> Dict[str, Any]:
+        """The newest ``limit`` ratings, enriched, and the analytics of all of them from one read.
+
+        For pages showing both, instead of a page query next to the full read
+        get_rating_analytics makes.
+        """
+        ratings = self.get_driver_ratings(driver_id, enrich=False)
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        # Copies, since the memoized list is shared and enrichment adds fields
+        page = [dict(r) for r in sorted(ratings, key=lambda x: rollups.trip_datetime(x) or oldest, reverse=True)[:limit]]
+        try:
+            self._enrich_ratings(driver_id, page)
+        except Exception as e:
+            logger.error(f"Error enriching ratings for driver {driver_id}: {str(e)}")
+        return {'ratings': page, 'analytics': self._rating_analytics(driver_id, ratings)}
+
+    @staticmethod
+    def _rating_analytics(driver_id: str, ratings: List[Dict[str, Any]]) -> Dict[str, Any]:
         try:
-            ratings = self.get_driver_ratings(driver_id)
-            
             if not ratings:
                 return {
                     'total_ratings': 0,
@@ -453,6 +782,7 @@ class FirebaseService:
                 'recent_ratings': []
             }
 
+    @memoize_read
     def get_driver_earnings(self, driver_id: str) -> Dict[str, Any]:
         """Get comprehensive earnings information for a driver"""
         try:
@@ -501,91 +831,269 @@ class FirebaseService:
                 'total_withdrawals': 0
             }
 
-    def get_driver_location(self, driver_id: str) -> Dict[str, Any]:
+    @staticmethod
+    def _resolve_address(address: Optional[str], lat: Any, lng: Any) -> str:
+        """The stored address, else one reverse geocoded from the coordinates"""
+        if address:
+            return address
+        try:
+            lat, lng = float(lat or 0), float(lng or 0)
+            geocoder = get_geocoder()
+            if geocoder is not None and (lat or lng):
+                return geocoder.reverse(lat, lng) or 'Location not available'
+        except Exception as e:
+            logger.error(f"Error reverse geocoding {lat},{lng}: {str(e)}")
+        return 'Location not available'
+
+    @staticmethod
+    def with_address(location: Dict[str, Any]) -> Dict[str, Any]:
+        """A location payload shaped with resolve_address=False, with its address resolved"""
+        return {**location, 'address': FirebaseService._resolve_address(location.get('address'),
+                                                                        location.get('latitude'),
+                                                                        location.get('longitude'))}
+
+    @staticmethod
+    def _driver_location_payload(location_data: Optional[Dict[str, Any]], driver: Optional[Dict[str, Any]],
+                                 resolve_address: bool = True) -> Dict[str, Any]:
+        """Shape a DriverLocation document, falling back to the driver document if it has none.
+
+        With resolve_address=False the address is left as stored (possibly
+        empty) rather than reverse geocoded; see with_address.
+        """
+        if location_data is not None:
+            location = {
+                'latitude': location_data.get('latitude', 0),
+                'longitude': location_data.get('longitude', 0),
+                'address': location_data.get('address'),
+                'last_updated': location_data.get('updatedOn', ''),
+                'is_online': location_data.get('isOnline', False)
+            }
+            return FirebaseService.with_address(location) if resolve_address else location
+
+        # Fallback: check if driver is online from driver document
+        if driver and driver.get('isDriverOnline', False):
+            location = {
+                'latitude': driver.get('latitude', 0),
+                'longitude': driver.get('longitude', 0),
+                'address': driver.get('address'),
+                'last_updated': driver.get('lastLocationUpdate', ''),
+                'is_online': True
+            }
+            return FirebaseService.with_address(location) if resolve_address else location
+
+        return {
+            'latitude': 0,
+            'longitude': 0,
+            'address': 'Location not available',
+            'last_updated': '',
+            'is_online': False
+        }
+
+    @staticmethod
+    def _customer_location_payload(location_data: Optional[Dict[str, Any]], customer: Optional[Dict[str, Any]],
+                                   resolve_address: bool = True) -> Dict[str, Any]:
+        """Shape a CustomerLocation document, falling back to a location embedded on the customer
+        (see _driver_location_payload for resolve_address)"""
+        if location_data is not None:
+            location = {
+                'latitude': location_data.get('latitude', 0),
+                'longitude': location_data.get('longitude', 0),
+                'address': location_data.get('address'),
+                'last_updated': location_data.get('updatedOn', '')
+            }
+            return FirebaseService.with_address(location) if resolve_address else location
+
+        # Fallback: sometimes location may be embedded on the customer doc
+        if customer and ('latitude' in customer or 'longitude' in customer):
+            location = {
+                'latitude': customer.get('latitude', 0),
+                'longitude': customer.get('longitude', 0),
+                'address': customer.get('address'),
+                'last_updated': customer.get('lastLocationUpdate', '')
+            }
+            return FirebaseService.with_address(location) if resolve_address else location
+
+        return {
+            'latitude': 0,
+            'longitude': 0,
+            'address': 'Location not available',
+            'last_updated': ''
+        }
+
+    @memoize_read
+    def get_driver_location(self, driver_id: str, resolve_address: bool = True) -> Dict[str, Any]:
         """Get driver's current location information"""
         try:
             # Try to get location from DriverLocation collection (note: singular, not plural)
-            location_ref = self.db.collection('DriverLocation').document(driver_id)
-            location_doc = location_ref.get()
-            
+            location_doc = self.db.collection('DriverLocation').document(driver_id).get()
             if location_doc.exists:
-                location_data = location_doc.to_dict()
-                return {
-                    'latitude': location_data.get('latitude', 0),
-                    'longitude': location_data.get('longitude', 0),
-                    'address': location_data.get('address', 'Location not available'),
-                    'last_updated': location_data.get('updatedOn', ''),
-                    'is_online': location_data.get('isOnline', False)
-                }
-            
-            # Fallback: check if driver is online from driver document
-            driver = self.get_driver_by_id(driver_id)
-            if driver and driver.get('isDriverOnline', False):
-                return {
-                    'latitude': driver.get('latitude', 0),
-                    'longitude': driver.get('longitude', 0),
-                    'address': driver.get('address', 'Location not available'),
-                    'last_updated': driver.get('lastLocationUpdate', ''),
-                    'is_online': True
-                }
-            
-            return {
-                'latitude': 0,
-                'longitude': 0,
-                'address': 'Location not available',
-                'last_updated': '',
-                'is_online': False
-            }
+                return self._driver_location_payload(location_doc.to_dict(), None, resolve_address)
+            return self._driver_location_payload(None, self.get_driver_by_id(driver_id), resolve_address)
         except Exception as e:
             logger.error(f"Error getting location for driver {driver_id}: {str(e)}")
-            return {
-                'latitude': 0,
-                'longitude': 0,
-                'address': 'Location not available',
-                'last_updated': '',
-                'is_online': False
-            }
+            return self._driver_location_payload(None, None)
 
-    def get_customer_location(self, customer_id: str) -> Dict[str, Any]:
+    @memoize_read
+    def get_customer_location(self, customer_id: str, resolve_address: bool = True) -> Dict[str, Any]:
         """Get customer's current location information (if tracked)"""
         try:
             # Reuse DriverLocation collection pattern for customers if available
-            location_ref = self.db.collection('CustomerLocation').document(customer_id)
-            location_doc = location_ref.get()
+            location_doc = self.db.collection('CustomerLocation').document(customer_id).get()
             if location_doc.exists:
-                location_data = location_doc.to_dict()
-                return {
-                    'latitude': location_data.get('latitude', 0),
-                    'longitude': location_data.get('longitude', 0),
-                    'address': location_data.get('address', 'Location not available'),
-                    'last_updated': location_data.get('updatedOn', '')
-                }
+                return self._customer_location_payload(location_doc.to_dict(), None, resolve_address)
+            return self._customer_location_payload(None, self.get_customer_by_id(customer_id), resolve_address)
+        except Exception as e:
+            logger.error(f"Error getting location for customer {customer_id}: {str(e)}")
+            return self._customer_location_payload(None, None)
 
-            # Fallback: sometimes location may be embedded on the customer doc
-            customer = self.get_customer_by_id(customer_id)
-            if customer and ('latitude' in customer or 'longitude' in customer):
-                return {
-                    'latitude': customer.get('latitude', 0),
-                    'longitude': customer.get('longitude', 0),
-                    'address': customer.get('address', 'Location not available'),
-                    'last_updated': customer.get('lastLocationUpdate', '')
-                }
+    @staticmethod
+    def _first_document(docs) -> Optional[Dict[str, Any]]:
+        if not docs:
+            return None
+        data = docs[0].to_dict()
+        data['id'] = docs[0].id
+        return data
+
+    def driver_live_sources(self, driver_id: str) -> Dict[str, Any]:
+        """Listener targets and transforms behind the live driver stream.
+
+        Each entry maps a part name to (document ref or query, fn) where fn
+        turns the listener's existing documents into the part's value. fn
+        runs on the listener thread, so it never reads from Firestore: the
+        current trip (the active one, else the latest, like
+        get_driver_current_trip) is watched as two queries instead.
+        """
+        trips = (self.db.collection('DeliveryRequests')
+                 .where('driverID', '==', driver_id))
+        return {
+            'driver': (self.db.collection('Drivers').document(driver_id), self._first_document),
+            'location': (self.db.collection('DriverLocation').document(driver_id),
+                         lambda docs: docs[0].to_dict() if docs else None),
+            'active_trip': (trips.where('status', 'in', ACTIVE_TRIP_STATUSES)
+                            .order_by('dateCreated', direction=firestore.Query.DESCENDING)
+                            .limit(1), self._first_document),
+            'latest_trip': (trips.order_by('dateCreated', direction=firestore.Query.DESCENDING).limit(1),
+                            self._first_document),
+        }
+
+    def customer_live_sources(self, customer_id: str) -> Dict[str, Any]:
+        """Listener targets and transforms behind the live customer stream (see driver_live_sources)"""
+        return {
+            'customer': (self.db.collection('Customers').document(customer_id), self._first_document),
+            'location': (self.db.collection('CustomerLocation').document(customer_id),
+                         lambda docs: docs[0].to_dict() if docs else None),
+        }
+
+    @staticmethod
+    def _fleet_point(location_data: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+        """(lat, lng) of an online DriverLocation document, or None if it should not be on the map"""
+        if not location_data.get('isOnline', False):
+            return None
+        try:
+            lat = float(location_data.get('latitude') or 0)
+            lng = float(location_data.get('longitude') or 0)
+        except (TypeError, ValueError):
+            return None
+        if not lat and not lng:
+            return None
+        return lat, lng
+
+    @classmethod
+    def _index_driver_locations(cls, changes: Dict[str, Optional[Dict[str, Any]]], reset: bool) -> None:
+        """DriverLocation mirror listener keeping driver_grid in step"""
+        if reset:
+            cls.driver_grid.clear()
+        for driver_id, location_data in changes.items():
+            point = cls._fleet_point(location_data) if location_data is not None else None
+            if point is None:
+                cls.driver_grid.remove(driver_id)
+            else:
+                cls.driver_grid.upsert(driver_id, point[0], point[1],
+                                       {'last_updated': location_data.get('updatedOn', '')})
+
+    def _fleet_index_live(self) -> bool:
+        """True when the DriverLocation listener is enabled, connected and synced"""
+        if not self.db or not getattr(settings, 'FLEET_LIVE_INDEX', True):
+            return False
+        return self.driver_locations_mirror.ensure_started(self.db)
+
+    def _fleet_grid(self) -> Tuple[GridIndex, bool]:
+        """The live driver grid, or one built from a single read while the listener is down"""
+        if self._fleet_index_live():
+            return self.driver_grid, True
+
+        grid = GridIndex(cell_size=self.driver_grid.cell_size)
+        for doc in self.db.collection('DriverLocation').where('isOnline', '==', True).stream():
+            location_data = doc.to_dict()
+            point = self._fleet_point(location_data)
+            if point is not None:
+                grid.upsert(doc.id, point[0], point[1], {'last_updated': location_data.get('updatedOn', '')})
+        return grid, False
+
+    def get_fleet_in_bbox(self, south: float, west: float, north: float, east: float,
+                          limit: int = 500) -> Dict[str, Any]:
+        """Online drivers positioned inside the bounding box, at most ``limit`` of them"""
+        try:
+            grid, live = self._fleet_grid()
+            points = grid.query_bbox(south, west, north, east, limit + 1)
+            truncated = len(points) > limit
+            points = points[:limit]
 
-            return {
-                'latitude': 0,
-                'longitude': 0,
-                'address': 'Location not available',
-                'last_updated': ''
-            }
+            drivers = self.get_drivers_by_ids([point['id'] for point in points])
+            for point in points:
+                driver = drivers.get(point['id']) or {}
+                point['name'] = f"{driver.get('firstName', '')} {driver.get('lastName', '')}".strip()
+
+            return {'drivers': points, 'truncated': truncated, 'live': live}
         except Exception as e:
-            logger.error(f"Error getting location for customer {customer_id}: {str(e)}")
-            return {
-                'latitude': 0,
-                'longitude': 0,
-                'address': 'Location not available',
-                'last_updated': ''
-            }
+            logger.error(f"Error fetching fleet positions: {str(e)}")
+            return {'drivers': [], 'truncated': False, 'live': False}
+
+    def find_nearest_drivers(self, lat: float, lng: float, k: int = 5,
+                             max_km: Optional[float] = None) -> List[Dict[str, Any]]:
+        """The k online, approved drivers closest to (lat, lng), nearest first, with distance_km.
 
+        ``max_km`` defaults to NEAREST_DRIVERS_MAX_KM so a search that finds
+        fewer than k drivers still stops at city scale.
+        """
+        if max_km is None:
+            max_km = getattr(settings, 'NEAREST_DRIVERS_MAX_KM', 50)
+        try:
+            grid, _ = self._fleet_grid()
+
+            if self._drivers_mirror_live():
+                def approved(point):
+                    driver = self.drivers_mirror.get(point['id'])
+                    return bool(driver and driver.get('isApproved', False))
+
+                nearest = grid.nearest(lat, lng, k, max_km, predicate=approved)
+                drivers = {point['id']: self.drivers_mirror.get(point['id']) for point in nearest}
+            else:
+                # Without the Drivers mirror, check approval on a widening set of candidates
+                # with cached batch reads rather than one read per candidate
+                candidates = k * 2
+                while True:
+                    nearest = grid.nearest(lat, lng, candidates, max_km)
+                    drivers = self.get_drivers_by_ids([point['id'] for point in nearest])
+                    approved = [point for point in nearest
+                                if drivers.get(point['id'], {}).get('isApproved', False)]
+                    if len(approved) >= k or len(nearest) < candidates:
+                        break
+                    candidates *= 4
+                nearest = approved[:k]
+
+            for rank, point in enumerate(nearest, start=1):
+                driver = drivers.get(point['id']) or {}
+                point['rank'] = rank
+                point['distance_km'] = round(point['distance_km'], 3)
+                point['name'] = f"{driver.get('firstName', '')} {driver.get('lastName', '')}".strip()
+                point['phoneNumber'] = driver.get('phoneNumber', '')
+            return nearest
+        except Exception as e:
+            logger.error(f"Error finding nearest drivers: {str(e)}")
+            return []
+
+    @memoize_read
     def get_customer_trips(self, customer_id: str) -> List[Dict[str, Any]]:
         """Get delivery requests created by a specific customer"""
         try:
@@ -603,14 +1111,25 @@ class FirebaseService:
     def get_driver_stats_enhanced(self) -> Dict[str, Any]:
         """Get enhanced driver statistics with more detailed breakdown"""
         try:
-            drivers = self.get_all_drivers()
-            total_drivers = len(drivers)
+            if self._drivers_mirror_live():
+                counts = self.drivers_mirror.counts()
+                return {
+                    'total_drivers': counts['total'],
+                    'active_drivers': counts['online'],
+                    'offline_drivers': counts['total'] - counts['online'],
+                    'pending_drivers': counts['total'] - counts['approved'],
+                    'approved_drivers': counts['approved']
+                }
+
+            # Count on the server instead of downloading every driver
+            drivers_ref = self.db.collection('Drivers')
+            total_drivers = self._count_documents(drivers_ref)
+            active_drivers = self._count_documents(drivers_ref.where('isDriverOnline', '==', True))
+            approved_drivers = self._count_documents(drivers_ref.where('isApproved', '==', True))
             
             # Categorize drivers by status
-            active_drivers = len([d for d in drivers if d.get('isDriverOnline', False)])
             offline_drivers = total_drivers - active_drivers
-            pending_drivers = len([d for d in drivers if not d.get('isApproved', False)])
-            approved_drivers = len([d for d in drivers if d.get('isApproved', False)])
+            pending_drivers = total_drivers - approved_drivers
             
             return {
                 'total_drivers': total_drivers,
@@ -629,43 +1148,150 @@ class FirebaseService:
                 'approved_drivers': 0
             }
 
-    def get_trip_analytics(self) -> Dict[str, Any]:
-        """Get comprehensive trip analytics"""
+    # Trip Rollup Methods
+    def _increments(self, delta: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a nested dict of numeric deltas into Firestore Increment transforms"""
+        return {
+            key: self._increments(value) if isinstance(value, dict) else firestore.Increment(value)
+            for key, value in delta.items()
+        }
+
+    def _trip_stats_stream(self, start: Optional[datetime] = None, end: Optional[datetime] = None):
+        """Stream trips projected to the rollup fields, optionally within [start, end) on dateCreated"""
+        trips_ref = self.db.collection('DeliveryRequests')
+        if start is None and end is None:
+            return (doc.to_dict() for doc in trips_ref.select(rollups.TRIP_STATS_FIELDS).stream())
+        return self._ranged_trip_stats(trips_ref, start, end)
+
+    def _ranged_trip_stats(self, trips_ref, start: Optional[datetime], end: Optional[datetime]):
+        """Trips created in [start, end), whether dateCreated is a Timestamp or an ISO string.
+
+        Firestore range filters only match values of the filter's type, so the
+        string-dated trips need their own query; it is widened by a day on each
+        side for UTC offsets and the parsed date decides what is kept.
+        """
+        timestamps, strings = trips_ref, trips_ref
+        if start is not None:
+            timestamps = timestamps.where('dateCreated', '>=', start)
+            strings = strings.where('dateCreated', '>=', rollups.day_key(start - timedelta(days=1)))
+        if end is not None:
+            timestamps = timestamps.where('dateCreated', '<', end)
+            strings = strings.where('dateCreated', '<', rollups.day_key(end + timedelta(days=1)))
+
+        for doc in timestamps.select(rollups.TRIP_STATS_FIELDS).stream():
+            yield doc.to_dict()
+        for doc in strings.select(rollups.TRIP_STATS_FIELDS).stream():
+            trip = doc.to_dict()
+            created = rollups.trip_datetime(trip)
+            if created is None or (start is not None and created < start) or (end is not None and created >= end):
+                continue
+            yield trip
+
+    def _daily_rollup_ref(self, key: str):
+        return self.db.collection(rollups.DAILY_ROLLUP_COLLECTION).document(key)
+
+    def rebuild_daily_rollups(self, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        """Recompute the per-day trip rollups for the days [start, end] (all days if omitted).
+
+        With both bounds every day in the range is written, empty days as
+        zeros; otherwise day documents in the range that no longer have trips
+        are deleted. Returns the number of day documents written.
+        """
+        return len(self._rebuild_daily_rollups(start, end))
+
+    def _rebuild_daily_rollups(self, start: Optional[date], end: Optional[date]) -> Dict[str, Dict[str, Any]]:
+        since = datetime(start.year, start.month, start.day, tzinfo=timezone.utc) if start else None
+        until = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1) if end else None
+        days = rollups.build_daily_rollups(self._trip_stats_stream(since, until))
+
+        stale = []
+        if start and end:
+            for i in range((end - start).days + 1):
+                key = rollups.day_key(start + timedelta(days=i))
+                days.setdefault(key, rollups.empty_daily_rollup(key))
+        else:
+            # Only the day documents inside the range are candidates for deletion
+            existing = self.db.collection(rollups.DAILY_ROLLUP_COLLECTION)
+            if start:
+                existing = existing.where('__name__', '>=', self._daily_rollup_ref(rollups.day_key(start)))
+            if end:
+                existing = existing.where('__name__', '<=', self._daily_rollup_ref(rollups.day_key(end)))
+            stale = [doc.id for doc in existing.select([]).stream() if doc.id not in days]
+
+        batch = self.db.batch()
+        pending = 0
+        for key, data in days.items():
+            batch.set(self._daily_rollup_ref(key), dict(data, updated_at=firestore.SERVER_TIMESTAMP,
+                                                        rebuilt_at=firestore.SERVER_TIMESTAMP))
+            pending += 1
+            if pending == 500:
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        for key in stale:
+            batch.delete(self._daily_rollup_ref(key))
+            pending += 1
+            if pending == 500:
+                batch.commit()
+                batch, pending = self.db.batch(), 0
+        if pending:
+            batch.commit()
+        return days
+
+    # One series refresh at a time per process; other requests serve the stored days
+    _series_refresh_lock = threading.Lock()
+
+    def _refresh_recent_daily_rollups(self, docs: Dict[str, Dict[str, Any]], start: date, end: date) -> None:
+        """Rebuild the last TRIP_SERIES_LIVE_DAYS days of [start, end] in ``docs`` when they are stale.
+
+        Trips are created (and mostly completed) by the apps, which never
+        touch the day documents, so the recent days are recomputed from a
+        ranged scan once they are older than TRIP_SERIES_REFRESH_INTERVAL.
+        Older days catch up when rebuild_trip_series runs.
+        """
+        now = datetime.now(timezone.utc)
+        first = max(start, now.date() - timedelta(days=getattr(settings, 'TRIP_SERIES_LIVE_DAYS', 2) - 1))
+        last = min(end, now.date())
+        if first > last:
+            return
+        fresh_since = now - timedelta(seconds=getattr(settings, 'TRIP_SERIES_REFRESH_INTERVAL', 300))
+        keys = [rollups.day_key(first + timedelta(days=i)) for i in range((last - first).days + 1)]
+        if all((docs.get(key) or {}).get('rebuilt_at') and docs[key]['rebuilt_at'] >= fresh_since for key in keys):
+            return
+        if not self._series_refresh_lock.acquire(blocking=False):
+            return
         try:
-            trips = self.get_all_trips(limit=1000)  # Get more trips for better analytics
-            if not trips:
-                return {
-                    'total_trips': 0,
-                    'completed_trips': 0,
-                    'total_revenue': 0,
-                    'completion_rate': 0
-                }
-            
-            total_trips = len(trips)
-            completed_trips = [trip for trip in trips if trip.get('status') in ['completed', 'ended', 'delivered']]
-            completed_count = len(completed_trips)
-            completion_rate = (completed_count / total_trips * 100) if total_trips > 0 else 0
-            
-            # Calculate total revenue - handle multiple possible field names
-            total_revenue = 0
-            for trip in completed_trips:
-                revenue = (trip.get('totalAmount') or 
-                          trip.get('deliveryAmount') or 
-                          trip.get('amount') or 0)
-                # Convert string to float if needed
-                if isinstance(revenue, str):
-                    try:
-                        revenue = float(revenue)
-                    except (ValueError, TypeError):
-                        revenue = 0
-                total_revenue += revenue
-            
-            return {
-                'total_trips': total_trips,
-                'completed_trips': completed_count,
-                'total_revenue': total_revenue,
-                'completion_rate': round(completion_rate, 2)
-            }
+            docs.update(self._rebuild_daily_rollups(first, last))
+        except Exception as e:
+            logger.error(f"Error refreshing recent trip rollups: {str(e)}")
+        finally:
+            self._series_refresh_lock.release()
+
+    @memoize_read
+    def get_trip_series(self, start: date, end: date, resolution: str = 'day',
+                        max_points: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Trip counts by status and revenue per hour/day/week over the days [start, end].
+
+        Reads one small rollup document per day in the range; the most recent
+        days are rebuilt first when stale (see _refresh_recent_daily_rollups).
+        """
+        try:
+            keys = [rollups.day_key(start + timedelta(days=i)) for i in range((end - start).days + 1)]
+            refs = [self._daily_rollup_ref(key) for key in keys]
+            docs = {doc.id: doc.to_dict() for doc in self.db.get_all(refs) if doc.exists}
+            self._refresh_recent_daily_rollups(docs, start, end)
+            return rollups.build_trip_series(docs, start, end, resolution, max_points)
+        except Exception as e:
+            logger.error(f"Error building trip series: {str(e)}")
+            return []
+
+    def get_trip_analytics(self, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+        """Get trip analytics over all trips, or those created in [start, end).
+
+        Streams only the status, date and amount fields and accumulates in one
+        pass; no driver/customer names are resolved.
+        """
+        try:
+            return rollups.trip_totals_analytics(rollups.build_trip_totals(self._trip_stats_stream(start, end)))
         except Exception as e:
             logger.error(f"Error getting trip analytics: {str(e)}")
             return {
@@ -875,6 +1501,54 @@ class FirebaseService:
     #         return []
 
 
+    def _enrich_trips_with_names(self, trips: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Add driver_name/customer_name to trips using one batch get per collection"""
+        drivers = self.get_drivers_by_ids(trip.get('driverID') for trip in trips)
+        customers = self.get_customers_by_ids(trip.get('userID') for trip in trips)
+
+        for trip_data in trips:
+            if trip_data.get('driverID'):
+                driver = drivers.get(trip_data['driverID'])
+                if driver:
+                    # Combine first and last name
+                    first_name = driver.get('firstName', '').strip()
+                    last_name = driver.get('lastName', '').strip()
+
+                    if first_name and last_name:
+                        trip_data['driver_name'] = f"{first_name} {last_name}"
+                    elif first_name:
+                        trip_data['driver_name'] = first_name
+                    elif last_name:
+                        trip_data['driver_name'] = last_name
+                    else:
+                        trip_data['driver_name'] = "Unknown Driver"
+                else:
+                    trip_data['driver_name'] = "Driver Not Found"
+
+            # Customer name for better display
+            if trip_data.get('userID'):
+                customer = customers.get(trip_data['userID'])
+                if customer:
+                    first_name = customer.get('firstName', '').strip()
+                    last_name = customer.get('lastName', '').strip()
+
+                    if first_name and last_name:
+                        trip_data['customer_name'] = f"{first_name} {last_name}"
+                    elif first_name:
+                        trip_data['customer_name'] = first_name
+                    elif last_name:
+                        trip_data['customer_name'] = last_name
+                    else:
+                        trip_data['customer_name'] = trip_data.get('userName', 'Unknown Customer')
+                else:
+                    trip_data['customer_name'] = trip_data.get('userName', 'Customer Not Found')
+            elif trip_data.get('userName'):
+                trip_data['customer_name'] = trip_data['userName']
+            elif trip_data.get('recipientName'):
+                trip_data['customer_name'] = trip_data['recipientName']
+
+        return trips
+
     def get_all_trips(self, limit=50, status=None):
         """Get all delivery trips/requests with optional filtering and driver names"""
         try:
@@ -884,8 +1558,8 @@ class FirebaseService:
             if status:
                 trips_ref = trips_ref.where('status', '==', status)
                 
-            # Apply limit and order by date
-            trips_ref = trips_ref.limit(limit).order_by('dateCreated', direction=firestore.Query.DESCENDING)
+            # Order by date, then limit to the newest trips
+            trips_ref = trips_ref.order_by('dateCreated', direction=firestore.Query.DESCENDING).limit(limit)
             
             # Get documents
             docs = trips_ref.stream()
@@ -894,49 +1568,10 @@ class FirebaseService:
             for doc in docs:
                 trip_data = doc.to_dict()
                 trip_data['id'] = doc.id
-                
-                # Fetch driver name if driverID exists
-                if trip_data.get('driverID'):
-                    driver = self.get_driver_by_id(trip_data['driverID'])
-                    if driver:
-                        # Combine first and last name
-                        first_name = driver.get('firstName', '').strip()
-                        last_name = driver.get('lastName', '').strip()
-                        
-                        if first_name and last_name:
-                            trip_data['driver_name'] = f"{first_name} {last_name}"
-                        elif first_name:
-                            trip_data['driver_name'] = first_name
-                        elif last_name:
-                            trip_data['driver_name'] = last_name
-                        else:
-                            trip_data['driver_name'] = "Unknown Driver"
-                    else:
-                        trip_data['driver_name'] = "Driver Not Found"
-                
-                # Optionally fetch customer name as well for better display
-                if trip_data.get('userID'):
-                    customer = self.get_customer_by_id(trip_data['userID'])
-                    if customer:
-                        first_name = customer.get('firstName', '').strip()
-                        last_name = customer.get('lastName', '').strip()
-                        
-                        if first_name and last_name:
-                            trip_data['customer_name'] = f"{first_name} {last_name}"
-                        elif first_name:
-                            trip_data['customer_name'] = first_name
-                        elif last_name:
-                            trip_data['customer_name'] = last_name
-                        else:
-                            trip_data['customer_name'] = trip_data.get('userName', 'Unknown Customer')
-                    else:
-                        trip_data['customer_name'] = trip_data.get('userName', 'Customer Not Found')
-                elif trip_data.get('userName'):
-                    trip_data['customer_name'] = trip_data['userName']
-                elif trip_data.get('recipientName'):
-                    trip_data['customer_name'] = trip_data['recipientName']
-                
                 trips.append(trip_data)
+            
+            # Resolve driver and customer names with one batch get per collection
+            self._enrich_trips_with_names(trips)
                 
             logger.info(f"Found {len(trips)} trips with driver names populated")
             return trips
@@ -947,6 +1582,76 @@ class FirebaseService:
 
 
 
+    def _encode_cursor(self, doc_id: str, direction: str) -> str:
+        """Opaque page token for a document ID and paging direction"""
+        raw = json.dumps({'id': doc_id, 'dir': direction}).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def _decode_cursor(self, token: Optional[str]):
+        """Return (doc_id, direction) from a page token, or (None, 'next') if invalid"""
+        if not token:
+            return None, 'next'
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            data = json.loads(raw)
+            direction = 'prev' if data.get('dir') == 'prev' else 'next'
+            return str(data['id']), direction
+        except Exception:
+            return None, 'next'
+
+    def get_trips_page(self, limit=50, status=None, cursor=None) -> Dict[str, Any]:
+        """Get one page of trips, newest first, using dateCreated keyset cursors.
+
+        ``cursor`` is a next/prev token from a previous page; the returned
+        ``next_cursor``/``prev_cursor`` are None when there is nothing further.
+        """
+        page = {'trips': [], 'next_cursor': None, 'prev_cursor': None}
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        try:
+            trips_ref = self.db.collection('DeliveryRequests')
+            if status:
+                trips_ref = trips_ref.where('status', '==', status)
+            query = trips_ref.order_by('dateCreated', direction=firestore.Query.DESCENDING)
+
+            doc_id, direction = self._decode_cursor(cursor)
+            anchor = None
+            if doc_id:
+                anchor = self.db.collection('DeliveryRequests').document(doc_id).get()
+                if not anchor.exists:
+                    anchor = None
+
+            if anchor is not None and direction == 'prev':
+                # Walk backwards: the limit+1 trips just before the anchor
+                docs = query.end_before(anchor).limit_to_last(limit + 1).get()
+                has_before = len(docs) > limit
+                docs = docs[-limit:]
+                has_after = True
+            else:
+                if anchor is not None:
+                    query = query.start_after(anchor)
+                docs = list(query.limit(limit + 1).stream())
+                has_after = len(docs) > limit
+                docs = docs[:limit]
+                has_before = anchor is not None
+
+            trips = []
+            for doc in docs:
+                trip_data = doc.to_dict()
+                trip_data['id'] = doc.id
+                trips.append(trip_data)
+            self._enrich_trips_with_names(trips)
+
+            page['trips'] = trips
+            if trips and has_after:
+                page['next_cursor'] = self._encode_cursor(trips[-1]['id'], 'next')
+            if trips and has_before:
+                page['prev_cursor'] = self._encode_cursor(trips[0]['id'], 'prev')
+            return page
+        except Exception as e:
+            logger.error(f"Error fetching trips page: {str(e)}")
+            return page
+
     # def get_trip_by_id(self, trip_id):
     #     """Get trip details by ID"""
     #     try:
@@ -975,6 +1680,7 @@ class FirebaseService:
     #         logger.error(f"Error getting trip by ID: {str(e)}")
     #         return None
 
+    @memoize_read
     def get_trip_by_id(self, trip_id):
         """Get trip details by ID with driver and customer names"""
         try:
@@ -987,22 +1693,7 @@ class FirebaseService:
             trip_data = trip.to_dict()
             trip_data['id'] = trip.id
             
-            # Fetch driver name if driverID exists
-            if trip_data.get('driverID'):
-                driver = self.get_driver_by_id(trip_data['driverID'])
-                if driver:
-                    first_name = driver.get('firstName', '').strip()
-                    last_name = driver.get('lastName', '').strip()
-                    trip_data['driver_name'] = f"{first_name} {last_name}".strip()
-            
-            # Fetch customer name if userID exists
-            if trip_data.get('userID'):
-                customer = self.get_customer_by_id(trip_data['userID'])
-                if customer:
-                    first_name = customer.get('firstName', '').strip()
-                    last_name = customer.get('lastName', '').strip()
-                    trip_data['customer_name'] = f"{first_name} {last_name}".strip()
-                    
+            self._enrich_trips_with_names([trip_data])
             return trip_data
         except Exception as e:
             logger.error(f"Error getting trip by ID: {str(e)}")
@@ -1011,13 +1702,26 @@ class FirebaseService:
 
 
     def update_trip_status(self, trip_id, status):
-            """Update trip status"""
+            """Update trip status and move the trip between the status buckets of its day's rollup"""
             try:
                 trip_ref = self.db.collection('DeliveryRequests').document(trip_id)
-                trip_ref.update({
-                    'status': status,
-                    'dateUpdated': firestore.SERVER_TIMESTAMP
-                })
+
+                @firestore.transactional
+                def apply_status(transaction):
+                    snapshot = trip_ref.get(transaction=transaction)
+                    transaction.update(trip_ref, {
+                        'status': status,
+                        UPDATED_FIELD: firestore.SERVER_TIMESTAMP
+                    })
+                    if snapshot.exists:
+                        daily = rollups.daily_status_delta(snapshot.to_dict(), status)
+                        if daily:
+                            data = self._increments(daily['delta'])
+                            data['updated_at'] = firestore.SERVER_TIMESTAMP
+                            transaction.set(self._daily_rollup_ref(daily['day']), data, merge=True)
+
+                apply_status(self.db.transaction())
+                forget_reads()
                 return True
             except Exception as e:
                 logger.error(f"Error updating trip status: {str(e)}")
@@ -1246,4 +1950,7 @@ class FirebaseService:
             return True
         except Exception as e:
             logger.error(f"Error deleting FAQ {faq_id}: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+
+FirebaseService.driver_locations_mirror.add_listener(FirebaseService._index_driver_locations)
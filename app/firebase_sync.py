@@ -0,0 +1,548 @@
+# app/firebase_sync.py
+import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from typing import Dict, Any, Callable, Iterable, List, Optional, Tuple
+
+from django.db import connection, transaction
+from firebase_admin import firestore
+from google.cloud.firestore_v1.bulk_writer import BulkWriterOptions
+from django.utils import timezone
+
+from .firebase_service import UPDATED_FIELD
+from .models import Driver, Customer, DeliveryOrder, SyncCheckpoint
+from .rollups import trip_revenue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SYNC_BATCH_SIZE = 1000
+DEFAULT_UPDATED_FIELD = UPDATED_FIELD
+
+# gRPC status codes worth retrying a push write on: DEADLINE_EXCEEDED, RESOURCE_EXHAUSTED,
+# ABORTED (contention), INTERNAL, UNAVAILABLE
+RETRYABLE_WRITE_CODES = {4, 8, 10, 13, 14}
+
+# Characters of auto-generated document IDs (and Firebase Auth UIDs), in Firestore's sort order
+DOCUMENT_ID_ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
+
+# Model fields refreshed when a Firestore document is synced over an existing row;
+# vehicle_type, license_number, rating and address are only set when a row is created,
+# and so is created_at, which falls back to the sync time for documents without a
+# dateCreated and would otherwise move on every sync
+DRIVER_SYNC_FIELDS = [
+    'drivers_id', 'first_name', 'last_name', 'name', 'email', 'phone', 'status', 'updated_at',
+]
+CUSTOMER_SYNC_FIELDS = [
+    'customer_id', 'first_name', 'last_name', 'name', 'email', 'phone', 'status', 'updated_at',
+]
+# Document fields a push may write: the ones the local tables can change, with the
+# length of the column each is read into (longer values were truncated on the way in)
+DRIVER_PUSH_FIELDS = {'firstName': 100, 'lastName': 100, 'email': 254, 'phoneNumber': 20}
+CUSTOMER_PUSH_FIELDS = {'firstName': 100, 'lastName': 100, 'email': 254, 'phoneNumber': 20}
+
+# Documents read per get_all() when comparing rows with Firestore before a push
+PUSH_READ_CHUNK = 300
+
+ORDER_SYNC_FIELDS = [
+    'source', 'customer', 'driver', 'pickup_address', 'delivery_address', 'status', 'fare', 'updated_at',
+]
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """A Firestore timestamp, protobuf Timestamp or ISO string as an aware UTC datetime"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    elif not isinstance(value, datetime) and hasattr(value, 'seconds'):
+        value = datetime.fromtimestamp(value.seconds, tz=dt_timezone.utc)
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=dt_timezone.utc)
+    return value.astimezone(dt_timezone.utc)
+
+
+def _text(value: Any, max_length: int) -> str:
+    return str(value or '')[:max_length]
+
+
+def _full_name(first_name: str, last_name: str) -> str:
+    return f'{first_name} {last_name}'.strip()[:100]
+
+
+def driver_status(data: Dict[str, Any]) -> str:
+    """Driver.status for a Drivers document: pending until approved, then online or offline"""
+    if not data.get('isApproved', False):
+        return 'pending'
+    return 'online' if data.get('isDriverOnline', False) else 'offline'
+
+
+def driver_from_document(doc_id: str, data: Dict[str, Any]) -> Driver:
+    """Unsaved Driver for a Drivers document"""
+    first_name = _text(data.get('firstName'), 100)
+    last_name = _text(data.get('lastName'), 100)
+    return Driver(
+        firebase_id=doc_id,
+        drivers_id=_text(data.get('driversId') or doc_id, 100),
+        first_name=first_name,
+        last_name=last_name,
+        name=_full_name(first_name, last_name),
+        email=_text(data.get('email'), 254),
+        phone=_text(data.get('phoneNumber'), 20),
+        vehicle_type=_text(data.get('vehicleType'), 50),
+        license_number=_text(data.get('licenseNumber'), 50),
+        status=driver_status(data),
+        rating=float(data.get('rating') or 0),
+        created_at=parse_timestamp(data.get('dateCreated')) or timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def customer_from_document(doc_id: str, data: Dict[str, Any]) -> Customer:
+    """Unsaved Customer for a Customers document"""
+    first_name = _text(data.get('firstName'), 100)
+    last_name = _text(data.get('lastName'), 100)
+    return Customer(
+        firebase_id=doc_id,
+        customer_id=_text(data.get('customerId') or doc_id, 100),
+        first_name=first_name,
+        last_name=last_name,
+        name=_full_name(first_name, last_name),
+        email=_text(data.get('email'), 254),
+        phone=_text(data.get('phoneNumber'), 20),
+        address=str(data.get('address') or ''),
+        status='active',
+        created_at=parse_timestamp(data.get('dateCreated')) or timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def _fare(value: Any) -> Decimal:
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return Decimal('0.00')
+
+
+def order_from_request(doc_id: str, data: Dict[str, Any], customer_pk: int, driver_pk: Optional[int]) -> DeliveryOrder:
+    """Unsaved DeliveryOrder for a DeliveryRequests document whose customer and driver are resolved"""
+    return DeliveryOrder(
+        firebase_id=doc_id,
+        source='DeliveryRequests',
+        customer_id=customer_pk,
+        driver_id=driver_pk,
+        pickup_address=str(data.get('pickupAddress') or data.get('pickupLocation') or ''),
+        delivery_address=str(data.get('destinationAddress') or data.get('dropOffLocation') or ''),
+        status=_text(data.get('status') or 'pending', 20),
+        fare=_fare(trip_revenue(data)),
+        created_at=parse_timestamp(data.get('dateCreated')) or timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def order_from_document(doc_id: str, data: Dict[str, Any], customer_pk: int, driver_pk: Optional[int]) -> DeliveryOrder:
+    """Unsaved DeliveryOrder for an Orders document whose customer and driver are resolved"""
+    return DeliveryOrder(
+        firebase_id=doc_id,
+        source='Orders',
+        customer_id=customer_pk,
+        driver_id=driver_pk,
+        pickup_address=str(data.get('pickupAddress') or ''),
+        delivery_address=str(data.get('deliveryAddress') or ''),
+        status=_text(data.get('status') or 'pending', 20),
+        fare=_fare(data.get('fare')),
+        created_at=parse_timestamp(data.get('dateCreated')) or timezone.now(),
+        updated_at=timezone.now(),
+    )
+
+
+def id_lookup(model, alternate_column: str) -> Dict[str, int]:
+    """Primary key of every row keyed by both its firebase_id and ``alternate_column``.
+
+    Lets documents that refer to a row by either ID be resolved in memory;
+    a value found in both columns resolves to the firebase_id match.
+    """
+    by_firebase_id = {}
+    by_alternate = {}
+    rows = model.objects.values_list('pk', 'firebase_id', alternate_column).iterator(chunk_size=5000)
+    for pk, firebase_id, alternate in rows:
+        if firebase_id:
+            by_firebase_id[firebase_id] = pk
+        if alternate:
+            by_alternate.setdefault(alternate, pk)
+    by_alternate.update(by_firebase_id)
+    return by_alternate
+
+
+def firebase_id_map(model, firebase_ids: Iterable[str]) -> Dict[str, int]:
+    """firebase_id -> primary key for the rows of ``model`` that exist locally"""
+    ids = list(set(firebase_ids))
+    pks = {}
+    for i in range(0, len(ids), 900):  # stay under SQLite's bound-parameter limit
+        pks.update(model.objects.filter(firebase_id__in=ids[i:i + 900]).values_list('firebase_id', 'pk'))
+    return pks
+
+
+def driver_to_document(driver: Driver) -> Dict[str, Any]:
+    """The DRIVER_PUSH_FIELDS of a Driver.
+
+    isApproved and isDriverOnline (derived into status), dateCreated (defaulted
+    when missing) and driversId (defaulted to the document ID) belong to
+    Firestore and are never written back.
+    """
+    return {
+        'firstName': driver.first_name,
+        'lastName': driver.last_name,
+        'email': driver.email,
+        'phoneNumber': driver.phone,
+    }
+
+
+def customer_to_document(customer: Customer) -> Dict[str, Any]:
+    """The CUSTOMER_PUSH_FIELDS of a Customer (see driver_to_document)"""
+    return {
+        'firstName': customer.first_name,
+        'lastName': customer.last_name,
+        'email': customer.email,
+        'phoneNumber': customer.phone,
+    }
+
+
+def bulk_upsert(model, instances: List[Any], update_fields: List[str], batch_size: int = DEFAULT_SYNC_BATCH_SIZE) -> int:
+    """INSERT ... ON CONFLICT (firebase_id) DO UPDATE for a chunk of rows, in one transaction"""
+    if not instances:
+        return 0
+    with transaction.atomic():
+        model.objects.bulk_create(
+            instances,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['firebase_id'],
+            update_fields=update_fields,
+        )
+    return len(instances)
+
+
+def upsert_documents(model, build: Callable[[str, Dict[str, Any]], Any], docs: Iterable[Any],
+                     update_fields: List[str], batch_size: int = DEFAULT_SYNC_BATCH_SIZE) -> Dict[str, Any]:
+    """Stream Firestore documents into ``model`` ``batch_size`` rows per transaction.
+
+    A document the builder can't convert is logged and counted as an error
+    instead of aborting the run. Documents repeated within a chunk keep the
+    last copy, since one upsert statement can't touch a row twice.
+    """
+    result = {'synced': 0, 'errors': 0}
+    pending: Dict[str, Any] = {}
+
+    for doc in docs:
+        try:
+            pending[doc.id] = build(doc.id, doc.to_dict() or {})
+        except Exception as e:
+            result['errors'] += 1
+            logger.error(f"Error converting {model.__name__} {doc.id}: {str(e)}")
+            continue
+        if len(pending) >= batch_size:
+            result['synced'] += bulk_upsert(model, list(pending.values()), update_fields, batch_size)
+            pending = {}
+
+    result['synced'] += bulk_upsert(model, list(pending.values()), update_fields, batch_size)
+    return result
+
+
+def upsert_orders(docs: Iterable[Any], customers: Dict[str, int], drivers: Dict[str, int],
+                  missing: List[Dict[str, Any]], batch_size: int = DEFAULT_SYNC_BATCH_SIZE) -> Dict[str, Any]:
+    """Write Orders documents as DeliveryOrders, resolving references through id_lookup() maps.
+
+    Orders without a known customer are appended to ``missing`` instead of
+    written; an unknown driver leaves the order unassigned.
+    """
+    result = {'synced': 0, 'errors': 0}
+    pending: Dict[str, DeliveryOrder] = {}
+
+    for doc in docs:
+        data = doc.to_dict() or {}
+        customer_pk = customers.get(data.get('customerId'))
+        if customer_pk is None:
+            missing.append({'order_id': doc.id, 'customer_id': data.get('customerId') or '',
+                            'driver_id': data.get('driverId') or ''})
+            continue
+        try:
+            pending[doc.id] = order_from_document(doc.id, data, customer_pk, drivers.get(data.get('driverId')))
+        except Exception as e:
+            result['errors'] += 1
+            logger.error(f"Error converting order {doc.id}: {str(e)}")
+            continue
+        if len(pending) >= batch_size:
+            result['synced'] += bulk_upsert(DeliveryOrder, list(pending.values()), ORDER_SYNC_FIELDS, batch_size)
+            pending = {}
+
+    result['synced'] += bulk_upsert(DeliveryOrder, list(pending.values()), ORDER_SYNC_FIELDS, batch_size)
+    return result
+
+
+def sync_incremental(collection_ref, write: Callable[[List[Any]], Dict[str, Any]],
+                     updated_field: str = DEFAULT_UPDATED_FIELD, page_size: int = DEFAULT_SYNC_BATCH_SIZE) -> Dict[str, Any]:
+    """Pass documents changed since the collection's SyncCheckpoint to ``write``, a page at a time.
+
+    Pages are read ordered by ``updated_field`` then document ID, and the
+    checkpoint moves past a page in the same transaction as ``write``, so an
+    interrupted run resumes where it stopped. Documents without the field
+    never match the query; a full sync picks those up.
+    """
+    checkpoint, _ = SyncCheckpoint.objects.get_or_create(
+        collection=collection_ref.id, defaults={'updated_field': updated_field})
+    if checkpoint.updated_field != updated_field:
+        logger.info(f"Resetting {collection_ref.id} checkpoint: ordering field changed "
+                    f"from {checkpoint.updated_field} to {updated_field}")
+        checkpoint.reset(updated_field)
+        checkpoint.save()
+
+    query = collection_ref.order_by(updated_field).order_by('__name__')
+    cursor = None
+    if checkpoint.last_updated is not None:
+        cursor = {updated_field: checkpoint.last_updated, '__name__': checkpoint.last_doc_id}
+    result = {'synced': 0, 'errors': 0}
+    while True:
+        page_query = query.start_after(cursor) if cursor else query
+        docs = list(page_query.limit(page_size).stream())
+        if not docs:
+            break
+
+        last = docs[-1]
+        raw_updated = (last.to_dict() or {}).get(updated_field)
+        last_updated = parse_timestamp(raw_updated)
+        with transaction.atomic():
+            page = write(docs)
+            if last_updated is not None:
+                # Stored to the microsecond, so the next run may re-read the last
+                # few documents but never skips one
+                checkpoint.last_updated = last_updated
+                checkpoint.last_doc_id = last.id
+            checkpoint.synced_count += page['synced']
+            checkpoint.save()
+        result['synced'] += page['synced']
+        result['errors'] += page['errors']
+
+        if len(docs) < page_size or last_updated is None:
+            break
+        # Page on the exact stored value (nanoseconds included) within this run
+        cursor = {updated_field: raw_updated, '__name__': last.id}
+    return result
+
+
+def id_ranges(shards: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Split the document-ID keyspace into ``shards`` contiguous [start, end) ranges.
+
+    Boundaries are evenly spaced two-character prefixes over the ID
+    alphabet, so random IDs spread evenly; the first and last ranges are
+    open-ended so IDs with other characters still land in one of them.
+    """
+    base = len(DOCUMENT_ID_ALPHABET)
+    bounds = []
+    for k in range(1, shards):
+        position = k * base * base // shards
+        bound = DOCUMENT_ID_ALPHABET[position // base] + DOCUMENT_ID_ALPHABET[position % base]
+        if not bounds or bound > bounds[-1]:
+            bounds.append(bound)
+    edges = [None] + bounds + [None]
+    return list(zip(edges, edges[1:]))
+
+
+def shard_query(collection_ref, start: Optional[str], end: Optional[str]):
+    query = collection_ref.order_by('__name__')
+    if start is not None:
+        query = query.start_at({'__name__': start})
+    if end is not None:
+        query = query.end_before({'__name__': end})
+    return query
+
+
+def _sync_shard(query, write: Callable[[List[Any]], Dict[str, Any]], batch_size: int, queue_size: int) -> Dict[str, Any]:
+    """Stream one shard on a reader thread while this thread writes its chunks"""
+    chunks: 'queue.Queue[Optional[List[Any]]]' = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    failures = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read():
+        try:
+            chunk = []
+            for doc in query.stream():
+                chunk.append(doc)
+                if len(chunk) >= batch_size:
+                    if not put(chunk):
+                        return
+                    chunk = []
+            if chunk:
+                put(chunk)
+        except Exception as e:
+            failures.append(e)
+        finally:
+            put(None)
+
+    reader = threading.Thread(target=read, daemon=True)
+    reader.start()
+    result = {'synced': 0, 'errors': 0}
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            written = write(chunk)
+            result['synced'] += written['synced']
+            result['errors'] += written['errors']
+    finally:
+        stop.set()
+        reader.join()
+        # Pool threads are reused; don't leave their connections open between shards
+        connection.close()
+    if failures:
+        raise failures[0]
+    return result
+
+
+def sync_sharded(collection_ref, write: Callable[[List[Any]], Dict[str, Any]], executor, shards: int,
+                 batch_size: int = DEFAULT_SYNC_BATCH_SIZE, queue_size: int = 2) -> Dict[str, Any]:
+    """Pass a collection to ``write`` in ``shards`` document-ID ranges run on ``executor``.
+
+    Each shard reads on its own thread into a queue of at most
+    ``queue_size`` chunks of ``batch_size`` documents, and writes from the
+    executor thread with that thread's own DB connection, so network reads
+    overlap DB writes.
+    """
+    futures = [executor.submit(_sync_shard, shard_query(collection_ref, start, end), write, batch_size, queue_size)
+               for start, end in id_ranges(shards)]
+    result = {'synced': 0, 'errors': 0}
+    failure = None
+    for future in futures:
+        try:
+            shard = future.result()
+        except Exception as e:
+            failure = failure or e
+            continue
+        result['synced'] += shard['synced']
+        result['errors'] += shard['errors']
+    if failure is not None:
+        raise failure
+    return result
+
+
+def push_documents(db, collection: str, rows: Iterable[Any], to_document: Callable[[Any], Dict[str, Any]],
+                   field_lengths: Dict[str, int], max_ops_per_second: int = 500,
+                   max_retries: int = 5) -> Dict[str, Any]:
+    """Merge local changes to model rows into their Firestore documents (keyed by firebase_id).
+
+    ``to_document`` gives a row's values for the fields in ``field_lengths``.
+    The documents are read first, in chunks, and only fields whose value
+    differs from the document's (cut to the column length, so truncated
+    reads don't count as changes) are written. Rows whose document changed
+    after the row was last written are left alone, as are rows with no
+    changes; both are counted in ``skipped``. Missing documents are not
+    recreated.
+
+    A BulkWriter batches the writes and commits batches in parallel, starting
+    at and never exceeding ``max_ops_per_second``. Writes failing with a
+    transient status (contention, throttling, unavailability) are sent
+    again in up to ``max_retries`` further passes with linear backoff;
+    anything else, and rows that can't be converted, is returned in
+    ``failed``. Every write stamps UPDATED_FIELD like the admin's own writes.
+    """
+    result = {'written': 0, 'skipped': 0, 'failed': []}
+    transient = []
+    lock = threading.Lock()
+
+    def on_result(reference, write_result, bulk_writer):
+        with lock:
+            result['written'] += 1
+
+    def on_error(failure, bulk_writer) -> bool:
+        operation = failure.operation
+        with lock:
+            if failure.code in RETRYABLE_WRITE_CODES:
+                transient.append((operation.reference, operation.document_data, failure.message))
+            else:
+                logger.error(f"Error pushing {collection}/{operation.reference.id}: {failure.message}")
+                result['failed'].append({'id': operation.reference.id, 'error': failure.message})
+        # Retried by the next pass: the writer's own retry scheduling can re-enter
+        # itself and fail when many retries come due together
+        return False
+
+    def send(writes) -> None:
+        writer = db.bulk_writer(BulkWriterOptions(initial_ops_per_second=max_ops_per_second,
+                                                  max_ops_per_second=max_ops_per_second))
+        writer.on_write_result(on_result)
+        writer.on_write_error(on_error)
+        try:
+            for reference, data in writes:
+                writer.set(reference, data, merge=True)
+        finally:
+            writer.close()
+
+    def changed_writes(collection_ref, chunk):
+        references = [collection_ref.document(row.firebase_id) for row in chunk]
+        documents = {doc.id: doc for doc in db.get_all(references, field_paths=list(field_lengths))}
+        for row, reference in zip(chunk, references):
+            doc = documents.get(row.firebase_id)
+            if doc is None or not doc.exists:
+                result['failed'].append({'id': row.firebase_id, 'error': 'document not found'})
+                continue
+            changed_at = parse_timestamp(doc.update_time)
+            if changed_at is not None and row.updated_at is not None and changed_at > row.updated_at:
+                result['skipped'] += 1
+                continue
+            try:
+                local = to_document(row)
+            except Exception as e:
+                logger.error(f"Error converting {collection}/{row.firebase_id}: {str(e)}")
+                result['failed'].append({'id': row.firebase_id, 'error': str(e)})
+                continue
+            current = doc.to_dict() or {}
+            data = {field: value for field, value in local.items()
+                    if value != _text(current.get(field), field_lengths[field])}
+            if not data:
+                result['skipped'] += 1
+                continue
+            data[UPDATED_FIELD] = firestore.SERVER_TIMESTAMP
+            yield reference, data
+
+    def row_writes():
+        collection_ref = db.collection(collection)
+        chunk = []
+        for row in rows:
+            if not row.firebase_id:
+                result['failed'].append({'id': f'pk={row.pk}', 'error': 'no firebase_id'})
+                continue
+            chunk.append(row)
+            if len(chunk) == PUSH_READ_CHUNK:
+                yield from changed_writes(collection_ref, chunk)
+                chunk = []
+        if chunk:
+            yield from changed_writes(collection_ref, chunk)
+
+    send(row_writes())
+    for attempt in range(1, max_retries + 1):
+        if not transient:
+            break
+        pending = list(transient)
+        transient.clear()
+        logger.warning(f"Retrying {len(pending)} {collection} writes (attempt {attempt} of {max_retries})")
+        time.sleep(attempt)
+        send((reference, data) for reference, data, _ in pending)
+
+    for reference, _, message in transient:
+        logger.error(f"Error pushing {collection}/{reference.id} after {max_retries} retries: {message}")
+        result['failed'].append({'id': reference.id, 'error': message})
+    return result
@@ -0,0 +1,203 @@
+# app/geo_index.py
+import heapq
+import math
+import threading
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance between two points in kilometres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2 +
+         math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lng2 - lng1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+class GridIndex:
+    """In-memory spatial index of points bucketed into a uniform lat/lng grid.
+
+    Each point is stored under an ID with a small dict of extra data.
+    Bounding-box queries only visit the cells overlapping the box, so their
+    cost follows what is on screen, not the size of the fleet; nearest()
+    searches rings of cells outwards from the query point.
+    """
+
+    def __init__(self, cell_size: float = 0.01):
+        self.cell_size = cell_size
+        self._cells = {}
+        self._points = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return math.floor(lat / self.cell_size), math.floor(lng / self.cell_size)
+
+    def _remove(self, point_id: str) -> None:
+        point = self._points.pop(point_id, None)
+        if point is None:
+            return
+        cell = self._cell(point['latitude'], point['longitude'])
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(point_id)
+            if not members:
+                del self._cells[cell]
+
+    def upsert(self, point_id: str, lat: float, lng: float, data: Optional[Dict[str, Any]] = None) -> None:
+        point = dict(data or {}, id=point_id, latitude=lat, longitude=lng)
+        with self._lock:
+            self._remove(point_id)
+            self._points[point_id] = point
+            row, col = self._cell(lat, lng)
+            self._cells.setdefault((row, col), set()).add(point_id)
+
+    def remove(self, point_id: str) -> None:
+        with self._lock:
+            self._remove(point_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cells = {}
+            self._points = {}
+
+    def get(self, point_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            point = self._points.get(point_id)
+            return dict(point) if point is not None else None
+
+    def query_bbox(self, south: float, west: float, north: float, east: float,
+                   limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Points inside the box; a box with west > east crosses the antimeridian"""
+        if west > east:
+            found = self.query_bbox(south, west, north, 180.0, limit)
+            if limit is None or len(found) < limit:
+                found += self.query_bbox(south, -180.0, north, east,
+                                         None if limit is None else limit - len(found))
+            return found
+
+        def inside(point):
+            return south <= point['latitude'] <= north and west <= point['longitude'] <= east
+
+        results = []
+        with self._lock:
+            min_row, min_col = self._cell(south, west)
+            max_row, max_col = self._cell(north, east)
+            cell_count = (max_row - min_row + 1) * (max_col - min_col + 1)
+
+            if cell_count > len(self._cells):
+                # Zoomed far out: scanning the occupied cells is cheaper than walking the box
+                candidates = (self._points[point_id]
+                              for (row, col), members in self._cells.items()
+                              if min_row <= row <= max_row and min_col <= col <= max_col
+                              for point_id in members)
+            else:
+                candidates = (self._points[point_id]
+                              for row in range(min_row, max_row + 1)
+                              for col in range(min_col, max_col + 1)
+                              for point_id in self._cells.get((row, col), ()))
+
+            for point in candidates:
+                if inside(point):
+                    results.append(dict(point))
+                    if limit is not None and len(results) >= limit:
+                        break
+        return results
+
+    def _ring(self, row: int, col: int, radius: int):
+        """Cells on the square ring ``radius`` cells away from (row, col)"""
+        if radius == 0:
+            yield row, col
+            return
+        for c in range(col - radius, col + radius + 1):
+            yield row - radius, c
+            yield row + radius, c
+        for r in range(row - radius + 1, row + radius):
+            yield r, col - radius
+            yield r, col + radius
+
+    def nearest(self, lat: float, lng: float, k: int = 5, max_km: Optional[float] = None,
+                predicate: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        """The k points closest to (lat, lng), nearest first, each with ``distance_km``.
+
+        Rings of cells are searched outwards until the k-th best distance is
+        no larger than the distance to any cell not yet visited, or every
+        point has been looked at. Once the square searched would cover more
+        cells than are occupied, the occupied cells left are scanned instead,
+        so a sparse or heavily filtered index costs at most one pass over its
+        points. ``predicate`` skips points (e.g. unapproved drivers). Rings do
+        not wrap around the antimeridian.
+        """
+        best = []  # max-heap of (-distance, id) holding the k best so far
+
+        def consider(point_id):
+            point = self._points[point_id]
+            full = len(best) == k
+            # Until k points qualify every candidate gets the predicate anyway, and
+            # it rules out most of them for less than a haversine
+            if not full and predicate is not None and not predicate(point):
+                return
+            # The latitude difference alone bounds the distance; skip the
+            # haversine for points that cannot make the cut
+            limit = -best[0][0] if full else max_km
+            if limit is not None and abs(point['latitude'] - lat) * KM_PER_DEGREE > limit:
+                return
+            distance = haversine_km(lat, lng, point['latitude'], point['longitude'])
+            if max_km is not None and distance > max_km:
+                return
+            if full and distance >= -best[0][0]:
+                return
+            if full and predicate is not None and not predicate(point):
+                return
+            if full:
+                heapq.heapreplace(best, (-distance, point_id))
+            else:
+                heapq.heappush(best, (-distance, point_id))
+
+        with self._lock:
+            if not self._points or k < 1:
+                return []
+            row, col = self._cell(lat, lng)
+            remaining = len(self._points)
+
+            radius = 0
+            while remaining:
+                if (2 * radius + 1) ** 2 > len(self._cells):
+                    for (cell_row, cell_col), members in self._cells.items():
+                        if max(abs(cell_row - row), abs(cell_col - col)) >= radius:
+                            for point_id in members:
+                                consider(point_id)
+                    break
+
+                for cell in self._ring(row, col, radius):
+                    members = self._cells.get(cell)
+                    if members:
+                        remaining -= len(members)
+                        for point_id in members:
+                            consider(point_id)
+
+                # Anything outside the searched square is at least this far away
+                # (measured along the parallel, which is close enough at city scale)
+                south = (row - radius) * self.cell_size
+                north = (row + radius + 1) * self.cell_size
+                west = (col - radius) * self.cell_size
+                east = (col + radius + 1) * self.cell_size
+                lng_scale = math.cos(math.radians(min(90.0, max(abs(south), abs(north)))))
+                reach = KM_PER_DEGREE * min(lat - south, north - lat,
+                                            min(lng - west, east - lng) * lng_scale)
+                if len(best) == k and -best[0][0] <= reach:
+                    break
+                if max_km is not None and reach > max_km:
+                    break
+                radius += 1
+
+            results = []
+            for negative_distance, point_id in sorted(best, reverse=True):
+                point = dict(self._points[point_id])
+                point['distance_km'] = -negative_distance
+                results.append(point)
+        return results
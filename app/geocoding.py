@@ -0,0 +1,342 @@
+# app/geocoding.py
+import csv
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, List
+
+import requests
+from django.conf import settings
+
+from .geo_index import GridIndex
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingBackend:
+    """Resolves coordinates to an address.
+
+    reverse() returns None when the backend has no address for the point and
+    raises when it could not answer (network error, rate limit, ...), so
+    only the former is cached. Offline backends answer from local data and
+    are cheap enough to call on the request path.
+    """
+
+    name = 'backend'
+    offline = False
+
+    def reverse(self, lat: float, lng: float) -> Optional[str]:
+        raise NotImplementedError
+
+
+class GazetteerBackend(GeocodingBackend):
+    """Offline lookup of the nearest named place in a CSV gazetteer.
+
+    The file needs ``name``, ``latitude`` and ``longitude`` columns; points
+    further than ``max_km`` from any entry resolve to None.
+    """
+
+    name = 'gazetteer'
+    offline = True
+
+    def __init__(self, path: str, max_km: float = 0.5, cell_size: float = 0.01):
+        self.max_km = max_km
+        self.index = GridIndex(cell_size=cell_size)
+        with open(path, newline='', encoding='utf-8') as f:
+            for i, row in enumerate(csv.DictReader(f)):
+                try:
+                    self.index.upsert(str(i), float(row['latitude']), float(row['longitude']), {'name': row['name']})
+                except (KeyError, TypeError, ValueError):
+                    continue
+        logger.info(f"Loaded {len(self.index)} gazetteer entries from {path}")
+
+    def reverse(self, lat: float, lng: float) -> Optional[str]:
+        nearest = self.index.nearest(lat, lng, k=1, max_km=self.max_km)
+        return nearest[0]['name'] if nearest else None
+
+
+class NominatimBackend(GeocodingBackend):
+    """OpenStreetMap Nominatim reverse lookups, at most one request per min_interval seconds.
+
+    After a failed request the backend fails fast for ``backoff`` seconds
+    instead of making every live poll wait on an unreachable server.
+    """
+
+    name = 'nominatim'
+
+    def __init__(self, url: str = 'https://nominatim.openstreetmap.org/reverse', user_agent: str = 'vloxadmin',
+                 min_interval: float = 1.0, timeout: float = 5, backoff: float = 60):
+        self.url = url
+        self.user_agent = user_agent
+        self.min_interval = min_interval
+        self.timeout = timeout
+        self.backoff = backoff
+        self._lock = threading.Lock()
+        self._last_request = 0.0
+        self._failed_until = 0.0
+
+    def reverse(self, lat: float, lng: float) -> Optional[str]:
+        if time.monotonic() < self._failed_until:
+            raise RuntimeError('Nominatim unavailable, backing off')
+        try:
+            return self._reverse(lat, lng)
+        except Exception:
+            self._failed_until = time.monotonic() + self.backoff
+            raise
+
+    def _reverse(self, lat: float, lng: float) -> Optional[str]:
+        # Reserve the next free slot under the lock, then wait for it without holding it
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._last_request + self.min_interval)
+            self._last_request = slot
+        if slot > now:
+            time.sleep(slot - now)
+
+        response = requests.get(
+            self.url,
+            params={'format': 'jsonv2', 'lat': lat, 'lon': lng, 'zoom': 18},
+            headers={'User-Agent': self.user_agent, 'Accept': 'application/json'},
+            timeout=self.timeout,
+        )
+        response.raise_for_status()
+        data = response.json()
+        if not data or data.get('error'):
+            return None
+        address = data.get('address') or {}
+        return data.get('display_name') or data.get('name') or (
+            address.get('road') or address.get('neighbourhood') or address.get('suburb') or
+            address.get('village') or address.get('town') or address.get('city'))
+
+
+class GeocodeCache:
+    """Persistent LRU of resolved addresses in a SQLite file (':memory:' for a throwaway one).
+
+    An empty string records that no backend knew the point. The most recently
+    used ``memory_entries`` are also kept in process, so hits don't query
+    SQLite, and hits only note their use time in memory: the notes are written
+    in one transaction every ``touch_interval`` seconds, or with the next set().
+    """
+
+    def __init__(self, path: str = ':memory:', max_entries: int = 50000, memory_entries: int = 2048,
+                 touch_interval: float = 60):
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self.touch_interval = touch_interval
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._touched = {}
+        self._flushed_at = time.monotonic()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS geocode_cache '
+            '(key TEXT PRIMARY KEY, address TEXT NOT NULL, used_at REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS geocode_cache_used_at ON geocode_cache (used_at)')
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            address = self._memory.get(key)
+            if address is not None:
+                self._memory.move_to_end(key)
+            else:
+                row = self._conn.execute('SELECT address FROM geocode_cache WHERE key = ?', (key,)).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                address = row[0]
+                self._remember(key, address)
+            self.hits += 1
+            self._touched[key] = time.time()
+            if time.monotonic() - self._flushed_at >= self.touch_interval:
+                self._write_touches()
+                self._conn.commit()
+            return address
+
+    def set(self, key: str, address: str) -> None:
+        with self._lock:
+            self._write_touches()
+            self._touched.pop(key, None)
+            self._conn.execute('INSERT OR REPLACE INTO geocode_cache (key, address, used_at) VALUES (?, ?, ?)',
+                               (key, address, time.time()))
+            # Evict the least recently used entries beyond the limit
+            evicted = self._conn.execute(
+                'SELECT key FROM geocode_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?', (self.max_entries,)
+            ).fetchall()
+            self._conn.executemany('DELETE FROM geocode_cache WHERE key = ?', evicted)
+            self._conn.commit()
+            for (evicted_key,) in evicted:
+                self._memory.pop(evicted_key, None)
+            self._remember(key, address)
+
+    def flush(self) -> None:
+        """Write the pending use times now"""
+        with self._lock:
+            self._write_touches()
+            self._conn.commit()
+
+    def _remember(self, key: str, address: str) -> None:
+        self._memory[key] = address
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write_touches(self) -> None:
+        if self._touched:
+            self._conn.executemany('UPDATE geocode_cache SET used_at = ? WHERE key = ?',
+                                   [(used_at, key) for key, used_at in self._touched.items()])
+            self._touched = {}
+        self._flushed_at = time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM geocode_cache').fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self),
+            'max_entries': self.max_entries,
+            'in_memory': len(self._memory),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class ReverseGeocoder:
+    """Reverse geocoding through a cache keyed on coordinates rounded to ``precision`` decimals.
+
+    Backends are tried in order until one knows the point; at precision 4
+    (about 11 m) every position of a parked vehicle shares one lookup.
+
+    reverse() never waits on the network: it answers from the cache and the
+    offline backends, and hands points that need an online backend to a
+    background thread, so a later call finds them cached.
+    """
+
+    def __init__(self, backends: List[GeocodingBackend], cache: GeocodeCache, precision: int = 4,
+                 queue_size: int = 1000):
+        self.offline_backends = [backend for backend in backends if backend.offline]
+        self.online_backends = [backend for backend in backends if not backend.offline]
+        self.cache = cache
+        self.precision = precision
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker = None
+
+    def key(self, lat: float, lng: float) -> str:
+        return f'{round(lat, self.precision):.{self.precision}f},{round(lng, self.precision):.{self.precision}f}'
+
+    def reverse(self, lat: float, lng: float) -> Optional[str]:
+        """The cached or offline address of a point; None if unknown or still being resolved"""
+        key = self.key(lat, lng)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached or None
+
+        lat, lng = round(lat, self.precision), round(lng, self.precision)
+        address, failed = self._lookup(self.offline_backends, key, lat, lng)
+        if address:
+            self.cache.set(key, address)
+            return address
+        if self.online_backends:
+            self._enqueue(key, lat, lng, failed)
+        elif not failed:
+            self.cache.set(key, '')
+        return None
+
+    def join(self) -> None:
+        """Block until every queued point has been resolved"""
+        self._queue.join()
+
+    @staticmethod
+    def _lookup(backends: List[GeocodingBackend], key: str, lat: float, lng: float):
+        """(address, failed) from the first backend that knows the point"""
+        failed = False
+        for backend in backends:
+            try:
+                address = backend.reverse(lat, lng)
+            except Exception as e:
+                logger.warning(f"Reverse geocoding with {backend.name} failed for {key}: {str(e)}")
+                failed = True
+                continue
+            if address:
+                return address, failed
+        return None, failed
+
+    def _enqueue(self, key: str, lat: float, lng: float, failed: bool) -> None:
+        with self._pending_lock:
+            if key in self._pending:
+                return
+            try:
+                self._queue.put_nowait((key, lat, lng, failed))
+            except queue.Full:
+                # Dropped points are queued again by the next lookup
+                return
+            self._pending.add(key)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._resolve_queued, name='reverse-geocoder', daemon=True)
+                self._worker.start()
+
+    def _resolve_queued(self) -> None:
+        while True:
+            key, lat, lng, failed = self._queue.get()
+            try:
+                address, online_failed = self._lookup(self.online_backends, key, lat, lng)
+                if address:
+                    self.cache.set(key, address)
+                # Only remember "no address" when every backend actually answered
+                elif not (failed or online_failed):
+                    self.cache.set(key, '')
+            except Exception as e:
+                logger.error(f"Error resolving queued point {key}: {str(e)}")
+            finally:
+                with self._pending_lock:
+                    self._pending.discard(key)
+                self._queue.task_done()
+
+
+_geocoder = None
+_geocoder_lock = threading.Lock()
+
+
+def get_geocoder() -> Optional[ReverseGeocoder]:
+    """The process-wide geocoder configured by the REVERSE_GEOCODING_* settings (None if disabled)"""
+    global _geocoder
+    if _geocoder is not None or not getattr(settings, 'REVERSE_GEOCODING_BACKENDS', []):
+        return _geocoder
+    with _geocoder_lock:
+        if _geocoder is None:
+            backends = []
+            for name in settings.REVERSE_GEOCODING_BACKENDS:
+                try:
+                    if name == 'gazetteer':
+                        path = getattr(settings, 'REVERSE_GEOCODING_GAZETTEER_PATH', None)
+                        if path:
+                            backends.append(GazetteerBackend(
+                                path, max_km=getattr(settings, 'REVERSE_GEOCODING_GAZETTEER_MAX_KM', 0.5)))
+                    elif name == 'nominatim':
+                        backends.append(NominatimBackend(
+                            url=getattr(settings, 'NOMINATIM_URL', 'https://nominatim.openstreetmap.org/reverse'),
+                            user_agent=getattr(settings, 'NOMINATIM_USER_AGENT', 'vloxadmin'),
+                            min_interval=getattr(settings, 'NOMINATIM_MIN_INTERVAL', 1.0),
+                        ))
+                    else:
+                        logger.error(f"Unknown reverse geocoding backend '{name}'")
+                except Exception as e:
+                    logger.error(f"Error setting up reverse geocoding backend '{name}': {str(e)}")
+            _geocoder = ReverseGeocoder(
+                backends,
+                GeocodeCache(getattr(settings, 'REVERSE_GEOCODING_CACHE_PATH', ':memory:'),
+                             max_entries=getattr(settings, 'REVERSE_GEOCODING_CACHE_MAX_ENTRIES', 50000)),
+                precision=getattr(settings, 'REVERSE_GEOCODING_PRECISION', 4),
+            )
+    return _geocoder
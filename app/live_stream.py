@@ -0,0 +1,213 @@
+# app/live_stream.py
+import functools
+import json
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Any, Callable, Iterator, Optional, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+logger = logging.getLogger(__name__)
+
+
+class LiveChannel:
+    """One set of Firestore listeners for an entity, fanned out to any number of subscribers.
+
+    ``sources`` maps a part name to (document ref or query, transform); every
+    snapshot updates that part and rebuilds the payload with ``build(parts)``.
+    Subscribers only receive the payload when it differs from the last one,
+    and not before every source has reported at least once.
+
+    ``build`` may do network reads, so it runs outside the lock; when builds
+    overlap, only the one started from the newest parts is published.
+    """
+
+    def __init__(self, sources: Dict[str, Tuple[Any, Callable]], build: Callable[[Dict[str, Any]], Dict[str, Any]],
+                 queue_size: int = 10):
+        self.sources = sources
+        self.build = build
+        self.queue_size = queue_size
+        self._parts = {}
+        self._version = 0
+        self._published_version = 0
+        self._last = None
+        self._started = False
+        self._subscribers = set()
+        self._watches = []
+        self._lock = threading.Lock()
+
+    @property
+    def is_active(self) -> bool:
+        return bool(self._watches) and all(watch.is_active for watch in self._watches)
+
+    @property
+    def is_stale(self) -> bool:
+        """Started, but one of its listeners has stopped"""
+        return self._started and not self.is_active
+
+    @property
+    def last(self) -> Optional[str]:
+        """The last payload published to subscribers (JSON), or None before the first"""
+        with self._lock:
+            return self._last
+
+    @property
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def start(self) -> None:
+        try:
+            for name, (target, transform) in self.sources.items():
+                self._watches.append(target.on_snapshot(functools.partial(self._on_snapshot, name, transform)))
+        finally:
+            # A channel that failed to attach counts as stale and gets replaced
+            self._started = True
+
+    def stop(self) -> None:
+        watches, self._watches = self._watches, []
+        for watch in watches:
+            try:
+                watch.unsubscribe()
+            except Exception as e:
+                logger.warning(f"Error stopping live listener: {str(e)}")
+
+    def _on_snapshot(self, name: str, transform: Callable, snapshots, changes, read_time) -> None:
+        try:
+            value = transform([snapshot for snapshot in snapshots if snapshot.exists])
+            with self._lock:
+                self._parts[name] = value
+                if len(self._parts) < len(self.sources):
+                    return
+                self._version += 1
+                version = self._version
+                parts = dict(self._parts)
+
+            data = json.dumps(self.build(parts), sort_keys=True, cls=DjangoJSONEncoder)
+
+            with self._lock:
+                if version < self._published_version or data == self._last:
+                    return
+                self._published_version = version
+                self._last = data
+                subscribers = list(self._subscribers)
+            for subscriber in subscribers:
+                self._offer(subscriber, data)
+        except Exception as e:
+            logger.error(f"Error applying live snapshot for '{name}': {str(e)}")
+
+    @staticmethod
+    def _offer(subscriber: queue.Queue, data: str) -> None:
+        # A slow client only needs the latest state, so drop its oldest update
+        while True:
+            try:
+                subscriber.put_nowait(data)
+                return
+            except queue.Full:
+                try:
+                    subscriber.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def subscribe(self) -> queue.Queue:
+        subscriber = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscriber)
+            last = self._last
+        if last is not None:
+            self._offer(subscriber, last)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue) -> int:
+        """Remove a subscriber and return how many are left"""
+        with self._lock:
+            self._subscribers.discard(subscriber)
+            return len(self._subscribers)
+
+
+class LiveHub:
+    """Process-wide registry sharing one LiveChannel per key (e.g. ('driver', id)) among its viewers"""
+
+    def __init__(self):
+        self._channels = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, key, factory: Callable[[], LiveChannel]) -> Tuple[LiveChannel, queue.Queue]:
+        # Attaching and detaching listeners are network calls, so they happen
+        # outside the hub lock; viewers arriving meanwhile share the new channel
+        stale = None
+        with self._lock:
+            channel = self._channels.get(key)
+            created = channel is None or channel.is_stale
+            if created:
+                # Replace a channel whose listeners died; its viewers reconnect on their own
+                stale = channel
+                channel = factory()
+                self._channels[key] = channel
+            subscriber = channel.subscribe()
+
+        if stale is not None:
+            stale.stop()
+        if created:
+            try:
+                channel.start()
+            except Exception:
+                self.unsubscribe(key, channel, subscriber)
+                raise
+        return channel, subscriber
+
+    def unsubscribe(self, key, channel: LiveChannel, subscriber: queue.Queue) -> None:
+        with self._lock:
+            if channel.unsubscribe(subscriber) > 0:
+                return
+            if self._channels.get(key) is channel:
+                del self._channels[key]
+        channel.stop()
+
+    def latest(self, key) -> Optional[str]:
+        """Last payload of the channel for ``key`` if one is live, so polls can skip their reads"""
+        with self._lock:
+            channel = self._channels.get(key)
+        if channel is None or not channel.is_active:
+            return None
+        return channel.last
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            channels = list(self._channels.values())
+        return {
+            'channels': len(channels),
+            'subscribers': sum(channel.subscriber_count for channel in channels),
+        }
+
+
+hub = LiveHub()
+
+
+def event_stream(key, factory: Callable[[], LiveChannel], heartbeat: float = 15,
+                 max_duration: float = 300, retry_ms: int = 3000) -> Iterator[str]:
+    """Server-Sent Events body for one viewer of a shared channel.
+
+    Sends a comment every ``heartbeat`` seconds without changes and ends after
+    ``max_duration`` seconds (or when the listeners die) so the browser
+    reconnects instead of holding a worker forever. The response occupies a
+    worker (or worker thread) throughout, so ``max_duration`` must stay below
+    the server's worker timeout.
+    """
+    channel, subscriber = hub.subscribe(key, factory)
+    try:
+        yield f'retry: {retry_ms}\n\n'
+        deadline = time.monotonic() + max_duration
+        while time.monotonic() < deadline:
+            try:
+                data = subscriber.get(timeout=heartbeat)
+            except queue.Empty:
+                if channel.is_stale:
+                    break
+                yield ': keep-alive\n\n'
+                continue
+            yield f'data: {data}\n\n'
+    finally:
+        hub.unsubscribe(key, channel, subscriber)
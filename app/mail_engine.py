@@ -0,0 +1,231 @@
+# app/mail_engine.py
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, Any, List, Optional, Callable, Iterable
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import MailCampaign, MailRecipient
+
+logger = logging.getLogger(__name__)
+
+
+class BulkMailer:
+    """Sends one subject/body to many recipients over a few reused SMTP connections.
+
+    Recipients get their own message (``mode='individual'``) or share one per
+    ``bcc_chunk_size`` addresses as Bcc (``mode='bcc'``). One connection is
+    opened per ``batch_size`` messages; a message that fails closes the
+    connection and is retried on a fresh one up to ``max_retries`` times
+    before it is reported as failed, so one bad address or a dropped
+    connection doesn't stop the run.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, bcc_chunk_size: Optional[int] = None,
+                 max_retries: Optional[int] = None, from_email: Optional[str] = None,
+                 connection_factory: Optional[Callable[[], Any]] = None):
+        self.batch_size = batch_size or getattr(settings, 'BULK_MAIL_BATCH_SIZE', 100)
+        self.bcc_chunk_size = bcc_chunk_size or getattr(settings, 'BULK_MAIL_BCC_CHUNK_SIZE', 50)
+        self.max_retries = max_retries if max_retries is not None else getattr(settings, 'BULK_MAIL_MAX_RETRIES', 2)
+        self.from_email = from_email or settings.DEFAULT_FROM_EMAIL
+        self.connection_factory = connection_factory or (lambda: get_connection(fail_silently=False))
+
+    @staticmethod
+    def unique_recipients(recipients: Iterable[str]) -> List[str]:
+        """Non-empty addresses without case-insensitive duplicates, in order"""
+        seen = set()
+        unique = []
+        for email in recipients:
+            email = (email or '').strip()
+            if email and email.lower() not in seen:
+                seen.add(email.lower())
+                unique.append(email)
+        return unique
+
+    def build_messages(self, subject: str, body: str, recipients: List[str], mode: str = 'individual') -> List[EmailMessage]:
+        if mode == 'individual':
+            return [EmailMessage(subject, body, self.from_email, [email]) for email in recipients]
+        if mode == 'bcc':
+            return [
+                EmailMessage(subject, body, self.from_email, bcc=recipients[i:i + self.bcc_chunk_size],
+                             headers={'To': 'undisclosed-recipients:;'})
+                for i in range(0, len(recipients), self.bcc_chunk_size)
+            ]
+        raise ValueError(f"Unknown mail mode '{mode}'")
+
+    def send(self, subject: str, body: str, recipients: Iterable[str], mode: str = 'individual',
+             progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """Send to every recipient; returns counts of recipients sent and a list of failures.
+
+        ``progress`` is called with the running result after every batch.
+        """
+        recipients = self.unique_recipients(recipients)
+        messages = self.build_messages(subject, body, recipients, mode)
+        result = {'total': len(recipients), 'sent': 0, 'failed': [], 'messages': len(messages),
+                  'connections': 0, 'elapsed': 0.0}
+        started = time.monotonic()
+
+        for i in range(0, len(messages), self.batch_size):
+            self._send_batch(messages[i:i + self.batch_size], result)
+            result['elapsed'] = round(time.monotonic() - started, 3)
+            if progress is not None:
+                progress(result)
+
+        logger.info(f"Bulk mail '{subject}': {result['sent']}/{result['total']} recipients in "
+                    f"{result['messages']} messages over {result['connections']} connections, "
+                    f"{len(result['failed'])} failed, {result['elapsed']}s")
+        return result
+
+    def _send_batch(self, messages: List[EmailMessage], result: Dict[str, Any]) -> None:
+        connection = None
+        try:
+            for message in messages:
+                attempts = 0
+                while True:
+                    try:
+                        if connection is None:
+                            connection = self.connection_factory()
+                            connection.open()
+                            result['connections'] += 1
+                        connection.send_messages([message])
+                        result['sent'] += len(message.recipients())
+                        break
+                    except Exception as e:
+                        # Drop the connection; the retry (or the next message) reconnects
+                        self._close(connection)
+                        connection = None
+                        attempts += 1
+                        if attempts > self.max_retries:
+                            logger.error(f"Failed to send mail to {', '.join(message.recipients())}: {str(e)}")
+                            result['failed'].append({'recipients': message.recipients(), 'error': str(e)})
+                            break
+        finally:
+            self._close(connection)
+
+    @staticmethod
+    def _close(connection) -> None:
+        if connection is None:
+            return
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+def queue_campaign(subject: str, message: str, recipients: Iterable[str], audience: str = 'customers',
+                   mode: str = 'individual') -> MailCampaign:
+    """Persist a campaign and its recipients for run_mail_worker to send"""
+    emails = BulkMailer.unique_recipients(recipients)
+    with transaction.atomic():
+        campaign = MailCampaign.objects.create(subject=subject, message=message, audience=audience,
+                                               mode=mode, total=len(emails))
+        MailRecipient.objects.bulk_create(
+            [MailRecipient(campaign=campaign, email=email) for email in emails],
+            batch_size=1000,
+        )
+    logger.info(f"Queued mail campaign {campaign.pk} '{subject}' for {len(emails)} {audience}")
+    return campaign
+
+
+def claim_campaign(stale_after: float) -> Optional[MailCampaign]:
+    """Take the oldest queued campaign, or a running one whose worker stopped heartbeating.
+
+    The claim is a conditional UPDATE, so concurrent workers never share a campaign.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=stale_after)
+    candidates = (MailCampaign.objects
+                  .filter(status__in=[MailCampaign.STATUS_QUEUED, MailCampaign.STATUS_RUNNING])
+                  .order_by('created_at')
+                  .values_list('pk', 'status', 'heartbeat_at'))
+    for pk, status, heartbeat_at in candidates:
+        if status == MailCampaign.STATUS_RUNNING and heartbeat_at and heartbeat_at > stale:
+            continue
+        claimed = (MailCampaign.objects
+                   .filter(pk=pk, status=status, heartbeat_at=heartbeat_at)
+                   .update(status=MailCampaign.STATUS_RUNNING, heartbeat_at=now))
+        if claimed:
+            campaign = MailCampaign.objects.get(pk=pk)
+            if campaign.started_at is None:
+                campaign.started_at = now
+                campaign.save(update_fields=['started_at'])
+            return campaign
+    return None
+
+
+def mail_worker_missing(stale_after: Optional[float] = None, claim_after: Optional[float] = None) -> bool:
+    """True when campaigns are waiting and no run_mail_worker is working through them.
+
+    A worker claims a queued campaign within its poll interval and refreshes a
+    running one's heartbeat after every chunk, so a campaign left queued for
+    ``claim_after`` seconds, or running without a heartbeat for
+    ``stale_after``, while no other campaign has a fresh heartbeat, means
+    no worker is running.
+    """
+    if stale_after is None:
+        stale_after = getattr(settings, 'MAIL_WORKER_STALE_AFTER', 300)
+    if claim_after is None:
+        claim_after = getattr(settings, 'MAIL_WORKER_CLAIM_AFTER', 60)
+    now = timezone.now()
+    stale = now - timedelta(seconds=stale_after)
+    waiting = MailCampaign.objects.filter(status__in=[MailCampaign.STATUS_QUEUED, MailCampaign.STATUS_RUNNING])
+    stuck = waiting.filter(
+        Q(status=MailCampaign.STATUS_QUEUED, created_at__lt=now - timedelta(seconds=claim_after)) |
+        Q(status=MailCampaign.STATUS_RUNNING, heartbeat_at__lt=stale)
+    )
+    if not stuck.exists():
+        return False
+    return not waiting.filter(status=MailCampaign.STATUS_RUNNING, heartbeat_at__gte=stale).exists()
+
+
+def run_campaign(campaign: MailCampaign, mailer: Optional[BulkMailer] = None,
+                 chunk_size: Optional[int] = None) -> MailCampaign:
+    """Send the campaign's pending recipients, checkpointing after every chunk.
+
+    Recipients are marked sent/failed and the counters and heartbeat updated
+    in one transaction per chunk, so a crashed worker's successor resumes
+    from the last checkpoint and at most one chunk is sent twice.
+    """
+    mailer = mailer or BulkMailer()
+    chunk_size = chunk_size or mailer.batch_size
+
+    while True:
+        chunk = list(campaign.recipients
+                     .filter(status=MailRecipient.STATUS_PENDING)
+                     .order_by('pk')
+                     .values_list('pk', 'email')[:chunk_size])
+        if not chunk:
+            break
+
+        result = mailer.send(campaign.subject, campaign.message, [email for _, email in chunk], mode=campaign.mode)
+        errors = {email.lower(): failure['error'] for failure in result['failed'] for email in failure['recipients']}
+        failed_ids = [pk for pk, email in chunk if email.lower() in errors]
+        sent_ids = [pk for pk, email in chunk if email.lower() not in errors]
+
+        now = timezone.now()
+        with transaction.atomic():
+            MailRecipient.objects.filter(pk__in=sent_ids).update(status=MailRecipient.STATUS_SENT, sent_at=now)
+            for pk, email in chunk:
+                if email.lower() in errors:
+                    MailRecipient.objects.filter(pk=pk).update(status=MailRecipient.STATUS_FAILED,
+                                                               error=errors[email.lower()])
+            updates = {'sent_count': F('sent_count') + len(sent_ids),
+                       'failed_count': F('failed_count') + len(failed_ids),
+                       'heartbeat_at': now}
+            if errors:
+                updates['last_error'] = next(iter(errors.values()))
+            MailCampaign.objects.filter(pk=campaign.pk).update(**updates)
+
+    campaign.refresh_from_db()
+    campaign.status = (MailCampaign.STATUS_FAILED if campaign.total and not campaign.sent_count
+                       else MailCampaign.STATUS_COMPLETED)
+    campaign.finished_at = timezone.now()
+    campaign.save(update_fields=['status', 'finished_at'])
+    logger.info(f"Mail campaign {campaign.pk} {campaign.status}: "
+                f"{campaign.sent_count} sent, {campaign.failed_count} failed")
+    return campaign
@@ -0,0 +1,103 @@
+# app/management/commands/benchmark_mail.py
+import socketserver
+import threading
+import time
+
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand, CommandError
+from app.mail_engine import BulkMailer
+
+
+class _SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """Minimal SMTP conversation that accepts and discards every message"""
+
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        server = self.server
+        if server.connect_delay:
+            time.sleep(server.connect_delay)  # stand-in for TCP + TLS handshake cost
+        with server.lock:
+            server.connections += 1
+        self.reply('220 localhost benchmark sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors='replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250 localhost')
+            elif command == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                while self.rfile.readline() not in (b'.\r\n', b''):
+                    pass
+                with server.lock:
+                    server.messages += 1
+                self.reply('250 OK')
+            elif command == 'QUIT':
+                self.reply('221 Bye')
+                return
+            else:
+                # MAIL, RCPT, RSET, NOOP
+                self.reply('250 OK')
+
+
+class _SMTPSink(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, connect_delay):
+        super().__init__(('127.0.0.1', 0), _SMTPSinkHandler)
+        self.connect_delay = connect_delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+
+
+class Command(BaseCommand):
+    help = 'Measure bulk mail throughput against a local SMTP sink, compared with one connection per email'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipients', type=int, default=2000, help='Recipients for the bulk run')
+        parser.add_argument('--baseline', type=int, default=200,
+                            help='Recipients sent the old way (new connection per email); 0 to skip')
+        parser.add_argument('--mode', choices=['individual', 'bcc'], default='individual')
+        parser.add_argument('--batch-size', type=int, default=None, help='Messages per SMTP connection')
+        parser.add_argument('--connect-delay', type=float, default=50,
+                            help='Milliseconds the sink waits before greeting, to mimic an SSL handshake')
+
+    def handle(self, *args, **options):
+        sink = _SMTPSink(options['connect_delay'] / 1000)
+        threading.Thread(target=sink.serve_forever, daemon=True).start()
+        host, port = sink.server_address
+
+        def connection():
+            return get_connection('django.core.mail.backends.smtp.EmailBackend', host=host, port=port,
+                                  username='', password='', use_tls=False, use_ssl=False, fail_silently=False)
+
+        recipients = [f'user{i}@example.com' for i in range(options['recipients'])]
+        try:
+            if options['baseline']:
+                started = time.monotonic()
+                for email in recipients[:options['baseline']]:
+                    EmailMessage('Benchmark', 'Hello', 'bench@example.com', [email], connection=connection()).send()
+                self._report('One connection per email', options['baseline'], time.monotonic() - started)
+
+            connections_before = sink.connections
+            mailer = BulkMailer(batch_size=options['batch_size'], from_email='bench@example.com',
+                                connection_factory=connection)
+            result = mailer.send('Benchmark', 'Hello', recipients, mode=options['mode'])
+            self._report(f"BulkMailer ({options['mode']})", result['sent'], result['elapsed'])
+            self.stdout.write(f"  {result['messages']} messages over {sink.connections - connections_before} "
+                              f"connections, {len(result['failed'])} failed")
+        finally:
+            sink.shutdown()
+            sink.server_close()
+
+        if result['failed']:
+            raise CommandError(f"{len(result['failed'])} messages failed")
+
+    def _report(self, label, count, elapsed):
+        rate = count / elapsed * 60 if elapsed else float('inf')
+        self.stdout.write(self.style.SUCCESS(f'{label}: {count} recipients in {elapsed:.2f}s ({rate:,.0f}/min)'))
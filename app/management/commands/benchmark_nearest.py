@@ -0,0 +1,110 @@
+# app/management/commands/benchmark_nearest.py
+import heapq
+import math
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.geo_index import GridIndex, haversine_km, KM_PER_DEGREE
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the nearest-driver grid search against a brute-force scan on synthetic drivers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drivers', type=int, default=20000, help='Number of synthetic drivers')
+        parser.add_argument('--queries', type=int, default=2000, help='Number of nearest-driver queries')
+        parser.add_argument('--k', type=int, default=5, help='Drivers returned per query')
+        parser.add_argument('--spread-km', type=float, default=30, help='Radius the drivers are scattered over')
+        parser.add_argument('--cell-size', type=float, default=getattr(settings, 'FLEET_GRID_CELL_SIZE', 0.01),
+                            help='Grid cell size in degrees')
+        parser.add_argument('--verify', type=int, default=200, help='Queries checked against brute force')
+        parser.add_argument('--approved-ratio', type=float, default=0.01,
+                            help='Share of drivers the filtered scenario accepts')
+        parser.add_argument('--scenario', choices=['uniform', 'filtered', 'sparse', 'all'], default='all',
+                            help='uniform: every driver qualifies; filtered: a predicate accepts --approved-ratio '
+                                 'of them; sparse: fewer than k qualify, one of them in London')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        center_lat, center_lng = 6.5244, 3.3792  # Lagos, as on the driver map
+        spread = options['spread_km'] / KM_PER_DEGREE
+        k = options['k']
+
+        def random_point():
+            return (center_lat + rng.uniform(-spread, spread),
+                    center_lng + rng.uniform(-spread, spread) / math.cos(math.radians(center_lat)))
+
+        grid = GridIndex(cell_size=options['cell_size'])
+        points = {}
+        started = time.perf_counter()
+        for i in range(options['drivers']):
+            lat, lng = random_point()
+            points[f'driver{i}'] = (lat, lng)
+            grid.upsert(f'driver{i}', lat, lng)
+        self.stdout.write(f"Indexed {len(grid)} drivers in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        queries = [random_point() for _ in range(options['queries'])]
+        ids = sorted(points)
+        approved = set(rng.sample(ids, max(1, int(len(ids) * options['approved_ratio']))))
+        # Fewer than k qualify, so the search has to rule out every other point
+        few = set(rng.sample(ids, max(0, k - 2))) | {'london'}
+
+        scenarios = ['uniform', 'filtered', 'sparse'] if options['scenario'] == 'all' else [options['scenario']]
+        failed = False
+        for scenario in scenarios:
+            if scenario == 'uniform':
+                failed |= self._run('Uniform', grid, points, queries, k, None, options['verify'])
+            elif scenario == 'filtered':
+                failed |= self._run(f'Filtered ({len(approved)} qualify)', grid, points, queries, k,
+                                    lambda point: point['id'] in approved, options['verify'])
+            else:
+                points['london'] = (51.5074, -0.1278)
+                grid.upsert('london', *points['london'])
+                failed |= self._run('Sparse, one driver in London', grid, points, queries, k,
+                                    lambda point: point['id'] in few, options['verify'])
+                del points['london']
+                grid.remove('london')
+                failed |= self._run('Sparse, London driver removed', grid, points, queries, k,
+                                    lambda point: point['id'] in few, options['verify'])
+        if failed:
+            raise CommandError('Grid results differ from brute force')
+
+    def _run(self, label, grid, points, queries, k, predicate, verify):
+        grid_times = []
+        for lat, lng in queries:
+            started = time.perf_counter()
+            grid.nearest(lat, lng, k, predicate=predicate)
+            grid_times.append((time.perf_counter() - started) * 1e6)
+
+        brute_times = []
+        mismatches = 0
+        for lat, lng in queries[:verify]:
+            started = time.perf_counter()
+            candidates = [pid for pid in points if predicate is None or predicate({'id': pid})]
+            expected = heapq.nsmallest(k, candidates, key=lambda pid: haversine_km(lat, lng, *points[pid]))
+            brute_times.append((time.perf_counter() - started) * 1e6)
+            if [point['id'] for point in grid.nearest(lat, lng, k, predicate=predicate)] != expected:
+                mismatches += 1
+
+        self.stdout.write(label)
+        self.stdout.write(self._summary('  Grid search', grid_times))
+        self.stdout.write(self._summary('  Brute force', brute_times))
+        if mismatches:
+            self.stdout.write(self.style.ERROR(
+                f"  {mismatches} of {len(brute_times)} verified queries differ from brute force"))
+            return True
+        self.stdout.write(self.style.SUCCESS(
+            f"  Results match brute force on {len(brute_times)} queries; "
+            f"brute force / grid time {statistics.mean(brute_times) / statistics.mean(grid_times):.1f}x"
+        ))
+        return False
+
+    def _summary(self, label, times):
+        ordered = sorted(times)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return (f"{label}: mean {statistics.mean(times):.1f} us, "
+                f"p50 {statistics.median(times):.1f} us, p99 {p99:.1f} us over {len(times)} queries")
@@ -0,0 +1,40 @@
+# app/management/commands/rebuild_trip_series.py
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from app.firebase_service import FirebaseService
+
+
+class Command(BaseCommand):
+    help = ('Backfill the per-day trip rollup documents used by the trip series charts. '
+            'Trips changed by the apps reach days older than TRIP_SERIES_LIVE_DAYS only through this '
+            'command, so run it daily (e.g. from cron) with --days 7')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--days', type=int, help='Rebuild only the last N days (including today)')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            raise CommandError('--start and --end must be dates in YYYY-MM-DD format')
+        if options['days']:
+            end = date.today()
+            start = end - timedelta(days=options['days'] - 1)
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        firebase_service = FirebaseService()
+        if not firebase_service.db:
+            raise CommandError('Firebase not connected')
+
+        self.stdout.write(f"Rebuilding trip series for {start or 'the beginning'} to {end or 'today'}...")
+        try:
+            written = firebase_service.rebuild_daily_rollups(start, end)
+        except Exception as e:
+            raise CommandError(f'Trip series rebuild failed: {str(e)}')
+
+        self.stdout.write(self.style.SUCCESS(f'Trip series rebuilt: {written} day documents written'))
@@ -0,0 +1,70 @@
+# app/management/commands/replicate_firebase.py
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from firebase_admin import firestore
+from app.firebase_replica import FirestoreReplicator, default_replicas
+
+
+class Command(BaseCommand):
+    help = ('Keep the local Driver, Customer and DeliveryOrder tables in step with Firestore '
+            'using collection listeners (runs until interrupted)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--collections', nargs='+', choices=['Customers', 'Drivers', 'DeliveryRequests'],
+                            help='Collections to replicate (default: all three)')
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, 'FIREBASE_REPLICA_BATCH_SIZE', 500),
+                            help='Most listener events applied per transaction')
+        parser.add_argument('--flush-interval', type=float, default=getattr(settings, 'FIREBASE_REPLICA_FLUSH_INTERVAL', 0.5),
+                            help='Seconds to gather events before writing them')
+        parser.add_argument('--queue-size', type=int, default=getattr(settings, 'FIREBASE_REPLICA_QUEUE_SIZE', 1000),
+                            help='Events buffered before listeners are made to wait')
+        parser.add_argument('--retry-interval', type=float, default=30,
+                            help='Seconds between attempts to reattach a stopped listener')
+        parser.add_argument('--report-interval', type=float, default=30,
+                            help='Seconds between lag reports')
+        parser.add_argument('--max-duration', type=float, default=None,
+                            help='Stop after this many seconds (default: run until interrupted)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1 or options['queue_size'] < 1:
+            raise CommandError('--batch-size and --queue-size must be at least 1')
+        try:
+            db = firestore.client()
+        except Exception as e:
+            raise CommandError(f"Firebase connection failed: {str(e)}")
+
+        replicas = default_replicas()
+        if options['collections']:
+            replicas = [replica for replica in replicas if replica.collection in options['collections']]
+
+        replicator = FirestoreReplicator(
+            db, replicas,
+            batch_size=options['batch_size'],
+            flush_interval=options['flush_interval'],
+            queue_size=options['queue_size'],
+            retry_interval=options['retry_interval'],
+        )
+        signal.signal(signal.SIGTERM, lambda signum, frame: replicator.stop())
+
+        self.stdout.write(f"Replicating {', '.join(replica.collection for replica in replicas)}")
+        try:
+            replicator.run(max_duration=options['max_duration'], report_interval=options['report_interval'],
+                           on_report=self._report)
+        except KeyboardInterrupt:
+            pass
+        self._report(replicator.report())
+        self.stdout.write(self.style.SUCCESS('Replication stopped'))
+
+    def _report(self, report):
+        queue = report.pop('queue')
+        for collection, stats in report.items():
+            lag = f"{stats['lag']:.1f}s" if stats['lag'] is not None else 'n/a'
+            style = self.style.SUCCESS if stats['live'] else self.style.WARNING
+            self.stdout.write(style(
+                f"{collection}: lag {lag} (max {stats['max_lag']:.1f}s), {stats['upserted']} upserted, "
+                f"{stats['deleted']} deleted, {stats['deferred']} deferred, {stats['errors']} errors, "
+                f"{stats['reconnects']} reconnects{'' if stats['live'] else ', not listening'}"
+            ))
+        self.stdout.write(f"Queue: {queue['depth']}/{queue['capacity']}")
@@ -0,0 +1,48 @@
+# app/management/commands/run_mail_worker.py
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.mail_engine import BulkMailer, claim_campaign, run_campaign
+
+
+class Command(BaseCommand):
+    """Long-running sender for the campaigns the mailing pages queue.
+
+    Run it as a separate process alongside the web server; without one the
+    campaigns stay queued and the mailing pages say no worker is running.
+    Several workers may run at once.
+    """
+
+    help = 'Send queued mail campaigns, resuming any whose worker stopped mid-way (run as a background process)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no campaign is waiting')
+        parser.add_argument('--poll-interval', type=float, default=5, help='Seconds between checks for new campaigns')
+        parser.add_argument('--chunk-size', type=int, default=None, help='Recipients per checkpoint')
+        parser.add_argument('--stale-after', type=float, default=getattr(settings, 'MAIL_WORKER_STALE_AFTER', 300),
+                            help='Seconds without a heartbeat before a running campaign is taken over')
+
+    def handle(self, *args, **options):
+        mailer = BulkMailer()
+        self.stdout.write('Mail worker started')
+        while True:
+            campaign = claim_campaign(options['stale_after'])
+            if campaign is None:
+                if options['once']:
+                    break
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f'Sending campaign {campaign.pk} "{campaign.subject}": '
+                              f'{campaign.remaining} of {campaign.total} recipients left')
+            try:
+                campaign = run_campaign(campaign, mailer=mailer, chunk_size=options['chunk_size'])
+            except Exception as e:
+                # Leave it running; another pass resumes from the last checkpoint once it goes stale
+                self.stderr.write(self.style.ERROR(f'Campaign {campaign.pk} interrupted: {str(e)}'))
+                continue
+
+            style = self.style.SUCCESS if campaign.status == campaign.STATUS_COMPLETED else self.style.ERROR
+            self.stdout.write(style(f'Campaign {campaign.pk} {campaign.status}: '
+                                    f'{campaign.sent_count} sent, {campaign.failed_count} failed'))
@@ -1,5 +1,11 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from firebase_admin import firestore
 from app.models import Driver
+from app.firebase_sync import (
+    push_documents, upsert_documents, driver_from_document, driver_to_document,
+    DRIVER_SYNC_FIELDS, DRIVER_PUSH_FIELDS, DEFAULT_SYNC_BATCH_SIZE,
+)
 
 class Command(BaseCommand):
     help = 'Sync only drivers between Django and Firebase'
@@ -18,17 +24,32 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         if options['from_firebase']:
-            Driver.sync_from_firebase()
+            result = upsert_documents(
+                Driver, driver_from_document, firestore.client().collection('Drivers').stream(), DRIVER_SYNC_FIELDS,
+                getattr(settings, 'FIREBASE_SYNC_BATCH_SIZE', DEFAULT_SYNC_BATCH_SIZE),
+            )
+            if result['errors']:
+                self.stdout.write(
+                    self.style.ERROR(f"Failed to sync {result['errors']} drivers (see the log)")
+                )
             self.stdout.write(
-                self.style.SUCCESS('Successfully synced drivers from Firebase')
+                self.style.SUCCESS(f"Successfully synced {result['synced']} drivers from Firebase")
             )
         
         if options['to_firebase']:
-            drivers = Driver.objects.all()
-            for driver in drivers:
-                driver.save_to_firebase()
+            result = push_documents(
+                firestore.client(), 'Drivers', Driver.objects.iterator(chunk_size=2000),
+                driver_to_document, DRIVER_PUSH_FIELDS,
+                max_ops_per_second=getattr(settings, 'FIREBASE_PUSH_MAX_OPS_PER_SECOND', 500),
+                max_retries=getattr(settings, 'FIREBASE_PUSH_MAX_RETRIES', 5),
+            )
+            for failure in result['failed']:
+                self.stdout.write(
+                    self.style.ERROR(f"Failed to sync driver {failure['id']}: {failure['error']}")
+                )
             self.stdout.write(
-                self.style.SUCCESS(f'Successfully synced {drivers.count()} drivers to Firebase')
+                self.style.SUCCESS(f"Successfully synced {result['written']} drivers to Firebase "
+                                   f"({result['skipped']} unchanged or newer in Firebase)")
             )
         
         if not options['from_firebase'] and not options['to_firebase']:
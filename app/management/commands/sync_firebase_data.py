@@ -1,11 +1,18 @@
 # app/management/commands/sync_firebase_data.py
 from django.core.management.base import BaseCommand, CommandError
-from django.core.exceptions import ObjectDoesNotExist
 from firebase_admin import firestore
-from django.utils import timezone
-from datetime import datetime
+from django.conf import settings
+from django.db import connection
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import logging
-from app.models import Driver, Customer, DeliveryOrder
+from app.models import Driver, Customer
+from app.firebase_sync import (
+    upsert_documents, upsert_orders, sync_incremental, sync_sharded, id_lookup, push_documents,
+    driver_from_document, customer_from_document, driver_to_document, customer_to_document,
+    DRIVER_SYNC_FIELDS, CUSTOMER_SYNC_FIELDS, DRIVER_PUSH_FIELDS, CUSTOMER_PUSH_FIELDS,
+    DEFAULT_SYNC_BATCH_SIZE, DEFAULT_UPDATED_FIELD,
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -33,24 +40,68 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be synced without actually doing it'
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=getattr(settings, 'FIREBASE_SYNC_BATCH_SIZE', DEFAULT_SYNC_BATCH_SIZE),
+            help='Rows written per transaction when syncing from Firebase'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Only read documents changed since the last incremental run (from_firebase only)'
+        )
+        parser.add_argument(
+            '--updated-field',
+            type=str,
+            default=DEFAULT_UPDATED_FIELD,
+            help='Timestamp field that --incremental orders and filters documents by; the admin stamps '
+                 f'{DEFAULT_UPDATED_FIELD} on every write, documents the apps write without it need a full sync'
+        )
+        parser.add_argument(
+            '--missing-report',
+            type=str,
+            default=None,
+            help='CSV file listing orders skipped because their customer is not in Django'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Sync drivers and customers concurrently and read each collection in this many '
+                 'document-ID shards in parallel (full syncs from Firebase only)'
+        )
 
     def handle(self, *args, **options):
         model = options['model']
         direction = options['direction']
         dry_run = options['dry_run']
+        self.batch_size = options['batch_size']
+        if self.batch_size < 1:
+            raise CommandError('--batch-size must be at least 1')
+        self.incremental = options['incremental']
+        self.updated_field = options['updated_field']
+        self.workers = options['workers']
+        self.missing_report = options['missing_report']
+        if self.workers < 1:
+            raise CommandError('--workers must be at least 1')
         
         if dry_run:
             self.stdout.write(self.style.WARNING('DRY RUN MODE - No changes will be made'))
         
+        self._shard_pool = ThreadPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
         try:
             # Test Firebase connection first
             self._test_firebase_connection()
             
+            # Drivers and customers are independent; orders refer to both so they go last
+            independent = []
             if model == 'drivers' or model == 'all':
-                self._sync_drivers(direction, dry_run)
+                independent.append(lambda: self._sync_drivers(direction, dry_run))
                 
             if model == 'customers' or model == 'all':
-                self._sync_customers(direction, dry_run)
+                independent.append(lambda: self._sync_customers(direction, dry_run))
+            self._run_concurrently(independent)
                 
             if model == 'orders' or model == 'all':
                 self._sync_orders(direction, dry_run)
@@ -62,6 +113,27 @@ class Command(BaseCommand):
         except Exception as e:
             logger.error(f'Error during sync: {str(e)}')
             raise CommandError(f'Sync failed: {str(e)}')
+        finally:
+            if self._shard_pool is not None:
+                self._shard_pool.shutdown()
+
+    def _run_concurrently(self, tasks):
+        """Run the tasks on their own threads with --workers > 1, otherwise in order"""
+        if self.workers == 1 or len(tasks) < 2:
+            for task in tasks:
+                task()
+            return
+
+        def run(task):
+            try:
+                task()
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=len(tasks)) as executor:
+            futures = [executor.submit(run, task) for task in tasks]
+        for future in futures:
+            future.result()
 
     def _test_firebase_connection(self):
         """Test Firebase connection"""
@@ -156,255 +228,116 @@ class Command(BaseCommand):
         docs = list(orders_ref.stream())
         return len(docs)
 
+    def _read_from_firebase(self, collection_ref, write):
+        """Pass the collection's documents to ``write``: all of them, or with
+        --incremental only those changed since the stored checkpoint"""
+        if self.incremental:
+            return sync_incremental(collection_ref, write, self.updated_field, self.batch_size)
+        if self._shard_pool is not None:
+            return sync_sharded(collection_ref, write, self._shard_pool, self.workers, self.batch_size)
+        return write(collection_ref.stream())
+
     def _sync_drivers_from_firebase(self):
         """Sync drivers from Firebase to Django"""
         db = firestore.client()
-        drivers_ref = db.collection('Drivers')
-        docs = drivers_ref.stream()
-        
-        count = 0
-        errors = 0
-        
-        for doc in docs:
-            try:
-                data = doc.to_dict()
-                
-                # Parse dateCreated - handle different formats
-                date_created = timezone.now()
-                if data.get('dateCreated'):
-                    try:
-                        # Try ISO format first
-                        date_created = datetime.fromisoformat(
-                            data['dateCreated'].replace('Z', '+00:00')
-                        )
-                    except (ValueError, AttributeError):
-                        try:
-                            # Try timestamp format
-                            if hasattr(data['dateCreated'], 'seconds'):
-                                date_created = datetime.fromtimestamp(
-                                    data['dateCreated'].seconds
-                                )
-                            else:
-                                date_created = timezone.now()
-                        except:
-                            date_created = timezone.now()
-                
-                # Extract geo position
-                geo_position = data.get('geoPosition')
-                latitude = None
-                longitude = None
-                if geo_position and isinstance(geo_position, dict):
-                    latitude = geo_position.get('latitude')
-                    longitude = geo_position.get('longitude')
-                
-                # Create or update driver
-                driver, created = Driver.objects.update_or_create(
-                    firebase_id=doc.id,
-                    defaults={
-                        'drivers_id': data.get('driversId', doc.id),
-                        'first_name': data.get('firstName', ''),
-                        'last_name': data.get('lastName', ''),
-                        'email': data.get('email', ''),
-                        'phone_number': data.get('phoneNumber', ''),
-                        'profile_pic': data.get('profilePic'),
-                        'is_approved': data.get('isApproved', False),
-                        'is_driver_online': data.get('isDriverOnline', False),
-                        'user_token': data.get('userToken', ''),
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'date_created': date_created,
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f"Created new driver: {driver.full_name}")
-                else:
-                    self.stdout.write(f"Updated driver: {driver.full_name}")
-                
-                count += 1
-                
-            except Exception as e:
-                errors += 1
-                logger.error(f"Error syncing driver {doc.id}: {str(e)}")
-                self.stdout.write(
-                    self.style.ERROR(f"Error syncing driver {doc.id}: {str(e)}")
-                )
-                continue
-        
-        if errors > 0:
-            self.stdout.write(
-                self.style.WARNING(f"Completed with {errors} errors out of {count + errors} drivers")
-            )
-        
-        return count
+        result = self._read_from_firebase(
+            db.collection('Drivers'),
+            lambda docs: upsert_documents(Driver, driver_from_document, docs, DRIVER_SYNC_FIELDS, self.batch_size),
+        )
+        self._report_errors(result, 'drivers')
+        return result['synced']
 
     def _sync_customers_from_firebase(self):
         """Sync customers from Firebase to Django"""
         db = firestore.client()
-        
-        # Try to get customers collection
         try:
-            customers_ref = db.collection('Customers')
-            docs = list(customers_ref.stream())
-            if not docs:
-                self.stdout.write(self.style.WARNING("No customers found in Firebase"))
-                return 0
+            result = self._read_from_firebase(
+                db.collection('Customers'),
+                lambda docs: upsert_documents(Customer, customer_from_document, docs, CUSTOMER_SYNC_FIELDS, self.batch_size),
+            )
         except Exception as e:
             self.stdout.write(self.style.WARNING(f"Customers collection not found: {str(e)}"))
             return 0
-        
-        count = 0
-        errors = 0
-        
-        for doc in docs:
-            try:
-                data = doc.to_dict()
-                
-                # Parse dateCreated
-                date_created = timezone.now()
-                if data.get('dateCreated'):
-                    try:
-                        date_created = datetime.fromisoformat(
-                            data['dateCreated'].replace('Z', '+00:00')
-                        )
-                    except:
-                        try:
-                            if hasattr(data['dateCreated'], 'seconds'):
-                                date_created = datetime.fromtimestamp(
-                                    data['dateCreated'].seconds
-                                )
-                        except:
-                            date_created = timezone.now()
-                
-                # Extract geo position
-                geo_position = data.get('geoPosition')
-                latitude = None
-                longitude = None
-                if geo_position and isinstance(geo_position, dict):
-                    latitude = geo_position.get('latitude')
-                    longitude = geo_position.get('longitude')
-                
-                customer, created = Customer.objects.update_or_create(
-                    firebase_id=doc.id,
-                    defaults={
-                        'customer_id': data.get('customerId', doc.id),
-                        'first_name': data.get('firstName', ''),
-                        'last_name': data.get('lastName', ''),
-                        'email': data.get('email', ''),
-                        'phone_number': data.get('phoneNumber', ''),
-                        'profile_pic': data.get('profilePic'),
-                        'user_token': data.get('userToken', ''),
-                        'latitude': latitude,
-                        'longitude': longitude,
-                        'date_created': date_created,
-                    }
-                )
-                
-                if created:
-                    self.stdout.write(f"Created new customer: {customer.full_name}")
-                else:
-                    self.stdout.write(f"Updated customer: {customer.full_name}")
-                
-                count += 1
-                
-            except Exception as e:
-                errors += 1
-                logger.error(f"Error syncing customer {doc.id}: {str(e)}")
-                continue
-        
-        return count
+        if not result['synced'] and not result['errors'] and not self.incremental:
+            self.stdout.write(self.style.WARNING("No customers found in Firebase"))
+        self._report_errors(result, 'customers')
+        return result['synced']
+
+    def _report_errors(self, result, label):
+        if result['errors'] > 0:
+            self.stdout.write(
+                self.style.WARNING(f"Completed with {result['errors']} errors out of "
+                                   f"{result['synced'] + result['errors']} {label}")
+            )
 
     def _sync_orders_from_firebase(self):
         """Sync orders from Firebase to Django (if Orders collection exists)"""
         db = firestore.client()
         
+        # Resolve references in memory: one pass over each table instead of two queries per order
+        customers = id_lookup(Customer, 'customer_id')
+        drivers = id_lookup(Driver, 'drivers_id')
+        missing = []
         try:
-            orders_ref = db.collection('Orders')
-            docs = list(orders_ref.stream())
-            if not docs:
-                self.stdout.write(self.style.WARNING("No orders found in Firebase"))
-                return 0
+            result = self._read_from_firebase(
+                db.collection('Orders'),
+                lambda docs: upsert_orders(docs, customers, drivers, missing, self.batch_size),
+            )
         except Exception as e:
             self.stdout.write(self.style.WARNING(f"Orders collection not found: {str(e)}"))
             return 0
-        
-        count = 0
-        for doc in docs:
-            try:
-                data = doc.to_dict()
-                
-                # Find customer and driver by firebase_id or other identifiers
-                customer = None
-                driver = None
-                
-                if data.get('customerId'):
-                    try:
-                        customer = Customer.objects.get(
-                            models.Q(firebase_id=data['customerId']) | 
-                            models.Q(customer_id=data['customerId'])
-                        )
-                    except Customer.DoesNotExist:
-                        continue
-                
-                if data.get('driverId'):
-                    try:
-                        driver = Driver.objects.get(
-                            models.Q(firebase_id=data['driverId']) | 
-                            models.Q(drivers_id=data['driverId'])
-                        )
-                    except Driver.DoesNotExist:
-                        pass  # Driver is optional
-                
-                if customer:
-                    order, created = DeliveryOrder.objects.update_or_create(
-                        firebase_id=doc.id,
-                        defaults={
-                            'customer': customer,
-                            'driver': driver,
-                            'pickup_address': data.get('pickupAddress', ''),
-                            'delivery_address': data.get('deliveryAddress', ''),
-                            'pickup_latitude': data.get('pickupLatitude'),
-                            'pickup_longitude': data.get('pickupLongitude'),
-                            'delivery_latitude': data.get('deliveryLatitude'),
-                            'delivery_longitude': data.get('deliveryLongitude'),
-                            'status': data.get('status', 'pending'),
-                            'fare': float(data.get('fare', 0)),
-                        }
-                    )
-                    count += 1
-                
-            except Exception as e:
-                logger.error(f"Error syncing order {doc.id}: {str(e)}")
-                continue
-                
-        return count
+        if not result['synced'] and not result['errors'] and not missing and not self.incremental:
+            self.stdout.write(self.style.WARNING("No orders found in Firebase"))
+        self._report_errors(result, 'orders')
+        if missing:
+            self._report_missing_customers(missing)
+        return result['synced']
+
+    def _report_missing_customers(self, missing):
+        missing.sort(key=lambda row: row['order_id'])
+        self.stdout.write(
+            self.style.WARNING(f"Skipped {len(missing)} orders whose customer is not in Django")
+        )
+        if self.missing_report:
+            with open(self.missing_report, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=['order_id', 'customer_id', 'driver_id'])
+                writer.writeheader()
+                writer.writerows(missing)
+            self.stdout.write(f"Wrote skipped orders to {self.missing_report}")
+        else:
+            for row in missing[:10]:
+                self.stdout.write(f"  order {row['order_id']}: customer '{row['customer_id']}' not found")
+            if len(missing) > 10:
+                self.stdout.write(f"  ... and {len(missing) - 10} more (use --missing-report to list them all)")
 
     def _sync_drivers_to_firebase(self):
         """Sync drivers from Django to Firebase"""
-        drivers = Driver.objects.all()
-        count = 0
-        
-        for driver in drivers:
-            try:
-                driver.save_to_firebase()
-                count += 1
-            except Exception as e:
-                logger.error(f"Error syncing driver {driver.id} to Firebase: {str(e)}")
-                continue
-            
-        return count
+        result = push_documents(firestore.client(), 'Drivers', Driver.objects.iterator(chunk_size=2000),
+                                driver_to_document, DRIVER_PUSH_FIELDS, **self._push_options())
+        self._report_push_failures(result, 'drivers')
+        return result['written']
 
     def _sync_customers_to_firebase(self):
         """Sync customers from Django to Firebase"""
-        customers = Customer.objects.all()
-        count = 0
-        
-        for customer in customers:
-            try:
-                customer.save_to_firebase()
-                count += 1
-            except Exception as e:
-                logger.error(f"Error syncing customer {customer.id} to Firebase: {str(e)}")
-                continue
-            
-        return count
\ No newline at end of file
+        result = push_documents(firestore.client(), 'Customers', Customer.objects.iterator(chunk_size=2000),
+                                customer_to_document, CUSTOMER_PUSH_FIELDS, **self._push_options())
+        self._report_push_failures(result, 'customers')
+        return result['written']
+
+    def _push_options(self):
+        return {
+            'max_ops_per_second': getattr(settings, 'FIREBASE_PUSH_MAX_OPS_PER_SECOND', 500),
+            'max_retries': getattr(settings, 'FIREBASE_PUSH_MAX_RETRIES', 5),
+        }
+
+    def _report_push_failures(self, result, label):
+        failed = result['failed']
+        if not failed:
+            return
+        self.stdout.write(
+            self.style.WARNING(f"Failed to push {len(failed)} of {result['written'] + result['skipped'] + len(failed)} {label}")
+        )
+        for failure in failed[:10]:
+            self.stdout.write(f"  {failure['id']}: {failure['error']}")
+        if len(failed) > 10:
+            self.stdout.write(f"  ... and {len(failed) - 10} more (see the log)")
@@ -0,0 +1,23 @@
+# app/middleware.py
+import logging
+
+from .request_cache import request_read_cache
+
+logger = logging.getLogger(__name__)
+
+
+class RequestReadCacheMiddleware:
+    """Scope FirebaseService read memoization to a single request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with request_read_cache() as cache:
+            response = self.get_response(request)
+
+        if cache.saved:
+            logger.debug(f"{request.path}: {cache.reads} Firestore reads, {cache.saved} duplicates saved")
+        response['X-Firebase-Reads'] = str(cache.reads)
+        response['X-Firebase-Reads-Saved'] = str(cache.saved)
+        return response
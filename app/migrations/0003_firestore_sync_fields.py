@@ -0,0 +1,43 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_mail_campaigns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customer',
+            name='customer_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='first_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='drivers_id',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='first_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='driver',
+            name='last_name',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
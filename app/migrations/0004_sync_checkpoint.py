@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 21:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_firestore_sync_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('collection', models.CharField(max_length=100, unique=True)),
+                ('updated_field', models.CharField(max_length=100)),
+                ('last_updated', models.DateTimeField(blank=True, null=True)),
+                ('last_doc_id', models.CharField(blank=True, max_length=1500)),
+                ('synced_count', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 22:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_sync_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliveryorder',
+            name='source',
+            field=models.CharField(blank=True, db_index=True, max_length=100),
+        ),
+    ]
@@ -0,0 +1,177 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Customer(models.Model):
+    """Local copy of a Firestore Customers document"""
+
+    firebase_id = models.CharField(max_length=100, unique=True)
+    customer_id = models.CharField(max_length=100, blank=True, db_index=True)  # the document's customerId
+    first_name = models.CharField(max_length=100, blank=True)
+    last_name = models.CharField(max_length=100, blank=True)
+    name = models.CharField(max_length=100)
+    email = models.EmailField(blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    address = models.TextField(blank=True)
+    status = models.CharField(max_length=20, default='active')
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'customers'
+
+    def __str__(self):
+        return self.name or self.firebase_id
+
+
+class Driver(models.Model):
+    """Local copy of a Firestore Drivers document.
+
+    ``status`` is pending until the driver is approved, then online or offline.
+    """
+
+    firebase_id = models.CharField(max_length=100, unique=True)
+    drivers_id = models.CharField(max_length=100, blank=True, db_index=True)  # the document's driversId
+    first_name = models.CharField(max_length=100, blank=True)
+    last_name = models.CharField(max_length=100, blank=True)
+    name = models.CharField(max_length=100)
+    email = models.EmailField(blank=True)
+    phone = models.CharField(max_length=20, blank=True)
+    vehicle_type = models.CharField(max_length=50, blank=True)
+    license_number = models.CharField(max_length=50, blank=True)
+    status = models.CharField(max_length=20, default='pending')
+    rating = models.FloatField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'drivers'
+
+    def __str__(self):
+        return self.name or self.firebase_id
+
+
+class DeliveryOrder(models.Model):
+    """Local copy of a Firestore DeliveryRequests (or Orders) document"""
+
+    firebase_id = models.CharField(max_length=100, unique=True)
+    source = models.CharField(max_length=100, blank=True, db_index=True)  # Firestore collection the row came from
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='orders')
+    driver = models.ForeignKey(Driver, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders')
+    pickup_address = models.TextField(blank=True)
+    delivery_address = models.TextField(blank=True)
+    status = models.CharField(max_length=20, default='pending')
+    fare = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.firebase_id} ({self.status})'
+
+
+class MailCampaign(models.Model):
+    """A bulk email queued from the mailing pages and sent by the run_mail_worker command"""
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_COMPLETED = 'completed'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_COMPLETED, 'Completed'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    audience = models.CharField(max_length=20, default='customers')
+    mode = models.CharField(max_length=20, default='individual')  # BulkMailer mode: individual or bcc
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_QUEUED, db_index=True)
+
+    # Counters updated with every checkpoint so progress needs no aggregate query
+    total = models.PositiveIntegerField(default=0)
+    sent_count = models.PositiveIntegerField(default=0)
+    failed_count = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the worker after every chunk; a stale heartbeat means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f'{self.subject} ({self.status})'
+
+    @property
+    def remaining(self) -> int:
+        return max(self.total - self.sent_count - self.failed_count, 0)
+
+    def progress(self) -> dict:
+        return {
+            'id': self.pk,
+            'status': self.status,
+            'total': self.total,
+            'sent': self.sent_count,
+            'failed': self.failed_count,
+            'remaining': self.remaining,
+            'last_error': self.last_error,
+        }
+
+
+class MailRecipient(models.Model):
+    """Delivery state of one address in a MailCampaign"""
+
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    campaign = models.ForeignKey(MailCampaign, on_delete=models.CASCADE, related_name='recipients')
+    email = models.CharField(max_length=254)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    error = models.TextField(blank=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'email'], name='unique_campaign_recipient'),
+        ]
+        indexes = [
+            models.Index(fields=['campaign', 'status'], name='mailrecipient_campaign_status'),
+        ]
+
+    def __str__(self):
+        return f'{self.email} ({self.status})'
+
+
+class SyncCheckpoint(models.Model):
+    """How far sync_firebase_data --incremental has read a Firestore collection.
+
+    Documents are read in (updated_field, document ID) order, so the next run
+    starts after the last document written here.
+    """
+
+    collection = models.CharField(max_length=100, unique=True)
+    updated_field = models.CharField(max_length=100)
+    last_updated = models.DateTimeField(null=True, blank=True)
+    last_doc_id = models.CharField(max_length=1500, blank=True)
+    synced_count = models.PositiveIntegerField(default=0)  # documents written since the checkpoint was created
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f'{self.collection} @ {self.last_updated} / {self.last_doc_id}'
+
+    def reset(self, updated_field: str) -> None:
+        self.updated_field = updated_field
+        self.last_updated = None
+        self.last_doc_id = ''
+        self.synced_count = 0
@@ -0,0 +1,107 @@
+# app/request_cache.py
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('firebase_request_cache', default=None)
+_deadline = ContextVar('firebase_read_deadline', default=None)
+
+
+class RequestReadCache:
+    """Deduplicates identical FirebaseService reads within one request.
+
+    Concurrent callers of the same read (e.g. from FanOutLoader threads) wait
+    for the first call instead of issuing their own, so a read runs at most
+    once per request. Results are shared and must be treated as read-only.
+    Waiting callers give up at the deadline set by run_with_deadline (a
+    FanOutLoader's), raising TimeoutError, rather than waiting on a read
+    that hangs.
+    """
+
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+        self.reads = 0
+        self.saved = 0
+
+    def call(self, key, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._futures[key] = future
+                self.reads += 1
+            else:
+                self.saved += 1
+
+        if owner:
+            try:
+                future.set_result(fn())
+            except BaseException as e:
+                future.set_exception(e)
+                # Let a later call retry instead of replaying the failure
+                with self._lock:
+                    self._futures.pop(key, None)
+                raise
+        deadline = _deadline.get()
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        return future.result(timeout=timeout)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._futures.clear()
+
+
+@contextmanager
+def request_read_cache():
+    """Activate a read cache for the enclosed block (one request)"""
+    cache = RequestReadCache()
+    token = _current.set(cache)
+    try:
+        yield cache
+    finally:
+        _current.reset(token)
+
+
+def run_with_deadline(deadline: float, fn: Callable, *args, **kwargs) -> Any:
+    """Call ``fn`` with waits on shared reads bounded by ``deadline`` (a time.monotonic() value).
+
+    Sets the deadline in the current context, so run it in a copy of one.
+    """
+    _deadline.set(deadline)
+    return fn(*args, **kwargs)
+
+
+def current_read_cache() -> Optional[RequestReadCache]:
+    return _current.get()
+
+
+def forget_reads() -> None:
+    """Drop memoized reads after a write so the request sees its own changes"""
+    cache = _current.get()
+    if cache is not None:
+        cache.clear()
+
+
+def memoize_read(method):
+    """Memoize a FirebaseService read method for the duration of the current request"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        cache = _current.get()
+        if cache is None:
+            return method(self, *args, **kwargs)
+        key = (method.__name__, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return method(self, *args, **kwargs)
+        return cache.call(key, lambda: method(self, *args, **kwargs))
+    return wrapper
@@ -0,0 +1,246 @@
+# app/rollups.py
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Any, Iterable, Optional, List
+
+# Statuses counted as completed (and as revenue) across the dashboard
+COMPLETED_STATUSES = ['completed', 'ended', 'delivered']
+
+# Fields holding a trip's amount, in the order trip_revenue() tries them
+REVENUE_FIELDS = ['totalAmount', 'deliveryAmount', 'amount']
+
+# Only the fields the rollups need when scanning DeliveryRequests
+TRIP_STATS_FIELDS = ['status', 'dateCreated'] + REVENUE_FIELDS
+
+# One document per UTC day, keyed YYYY-MM-DD, with the day's totals and an hours map
+DAILY_ROLLUP_COLLECTION = 'TripStatsDaily'
+
+SERIES_RESOLUTIONS = ['hour', 'day', 'week']
+
+
+def trip_revenue(trip: Dict[str, Any]) -> float:
+    """Revenue of a trip - handle multiple possible field names"""
+    revenue = (trip.get('totalAmount') or
+               trip.get('deliveryAmount') or
+               trip.get('amount') or 0)
+    # Convert string to float if needed
+    if isinstance(revenue, str):
+        try:
+            revenue = float(revenue)
+        except (ValueError, TypeError):
+            revenue = 0
+    return revenue
+
+
+def status_key(status: Optional[str]) -> str:
+    """Map a trip status to the key used in rollup maps"""
+    return str(status) if status else 'unknown'
+
+
+def build_trip_totals(trips: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trip totals by status, completed count and revenue, in one pass over the trips"""
+    trips_by_status = {}
+    trips_total = 0
+    completed_trips = 0
+    revenue_total = 0
+
+    for trip in trips:
+        status = trip.get('status')
+        key = status_key(status)
+        trips_by_status[key] = trips_by_status.get(key, 0) + 1
+        trips_total += 1
+        if status in COMPLETED_STATUSES:
+            completed_trips += 1
+            revenue_total += trip_revenue(trip)
+
+    return {
+        'trips_total': trips_total,
+        'trips_by_status': trips_by_status,
+        'completed_trips': completed_trips,
+        'revenue_total': revenue_total,
+    }
+
+
+def trip_status_delta(trip: Dict[str, Any], new_status: str) -> Dict[str, Any]:
+    """Trip total increments for moving an existing trip to new_status"""
+    old_status = trip.get('status')
+    if old_status == new_status:
+        return {}
+
+    delta = {
+        'trips_by_status': {
+            status_key(old_status): -1,
+            status_key(new_status): 1,
+        }
+    }
+
+    was_completed = old_status in COMPLETED_STATUSES
+    is_completed = new_status in COMPLETED_STATUSES
+    if was_completed != is_completed:
+        sign = 1 if is_completed else -1
+        delta['completed_trips'] = sign
+        delta['revenue_total'] = sign * trip_revenue(trip)
+
+    return delta
+
+
+def trip_totals_analytics(totals: Dict[str, Any]) -> Dict[str, Any]:
+    """Shape trip totals like get_trip_analytics()"""
+    total_trips = totals.get('trips_total', 0)
+    completed_count = totals.get('completed_trips', 0)
+    completion_rate = (completed_count / total_trips * 100) if total_trips > 0 else 0
+
+    return {
+        'total_trips': total_trips,
+        'completed_trips': completed_count,
+        'total_revenue': totals.get('revenue_total', 0),
+        'completion_rate': round(completion_rate, 2)
+    }
+
+
+def trip_datetime(trip: Dict[str, Any]) -> Optional[datetime]:
+    """dateCreated of a trip as an aware UTC datetime (Firestore timestamp or ISO string)"""
+    value = trip.get('dateCreated')
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def day_key(day: date) -> str:
+    return day.strftime('%Y-%m-%d')
+
+
+def _empty_bucket() -> Dict[str, Any]:
+    return {'trips': 0, 'completed': 0, 'revenue': 0, 'by_status': {}}
+
+
+def _add_trip(bucket: Dict[str, Any], trip: Dict[str, Any]) -> None:
+    status = trip.get('status')
+    key = status_key(status)
+    bucket['trips'] += 1
+    bucket['by_status'][key] = bucket['by_status'].get(key, 0) + 1
+    if status in COMPLETED_STATUSES:
+        bucket['completed'] += 1
+        bucket['revenue'] += trip_revenue(trip)
+
+
+def empty_daily_rollup(key: str) -> Dict[str, Any]:
+    """Day document for a day without trips"""
+    return dict(_empty_bucket(), date=key, hours={})
+
+
+def build_daily_rollups(trips: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Per-day rollup documents keyed by YYYY-MM-DD, computed in one pass over the trips.
+
+    Each document holds the day's bucket (trips, completed, revenue, by_status)
+    at the top level plus the same bucket per hour under ``hours``.
+    Trips without a usable dateCreated are skipped.
+    """
+    days = {}
+    for trip in trips:
+        created = trip_datetime(trip)
+        if created is None:
+            continue
+        key = day_key(created)
+        doc = days.get(key)
+        if doc is None:
+            doc = days[key] = empty_daily_rollup(key)
+        _add_trip(doc, trip)
+        hour = doc['hours'].setdefault(f'{created.hour:02d}', _empty_bucket())
+        _add_trip(hour, trip)
+    return days
+
+
+def daily_status_delta(trip: Dict[str, Any], new_status: str) -> Dict[str, Any]:
+    """Day-document increments for moving an existing trip to new_status.
+
+    Returns {} when the status is unchanged or the trip has no dateCreated;
+    otherwise a dict with the target ``day`` key and the nested ``delta``.
+    """
+    created = trip_datetime(trip)
+    delta = trip_status_delta(trip, new_status)
+    if created is None or not delta:
+        return {}
+
+    bucket = {'by_status': delta['trips_by_status']}
+    if 'completed_trips' in delta:
+        bucket['completed'] = delta['completed_trips']
+        bucket['revenue'] = delta['revenue_total']
+
+    return {
+        'day': day_key(created),
+        'delta': dict(bucket, hours={f'{created.hour:02d}': bucket}),
+    }
+
+
+def _bucket_start(moment: datetime, resolution: str) -> datetime:
+    if resolution == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == 'week':
+        start -= timedelta(days=start.weekday())
+    return start
+
+
+def _merge_bucket(target: Dict[str, Any], bucket: Dict[str, Any]) -> None:
+    target['trips'] += bucket.get('trips', 0)
+    target['completed'] += bucket.get('completed', 0)
+    target['revenue'] += bucket.get('revenue', 0)
+    for status, count in (bucket.get('by_status') or {}).items():
+        target['by_status'][status] = target['by_status'].get(status, 0) + count
+
+
+def build_trip_series(daily_docs: Dict[str, Dict[str, Any]], start: date, end: date,
+                      resolution: str = 'day', max_points: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Turn day documents into a gap-free series over the days [start, end].
+
+    Buckets are hours, days or ISO weeks (starting Monday). When there are
+    more than max_points buckets, consecutive buckets are summed so the
+    series fits; every point carries its ``start`` and ``end`` (exclusive).
+    """
+    step = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}[resolution]
+    first = datetime(start.year, start.month, start.day, tzinfo=timezone.utc)
+    last = datetime(end.year, end.month, end.day, tzinfo=timezone.utc) + timedelta(days=1)
+
+    points = []
+    index = {}
+    moment = _bucket_start(first, resolution)
+    while moment < last:
+        index[moment] = len(points)
+        points.append(dict(_empty_bucket(), start=moment, end=moment + step))
+        moment += step
+
+    for key, doc in daily_docs.items():
+        day = datetime.strptime(key, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+        if resolution == 'hour':
+            for hour, bucket in (doc.get('hours') or {}).items():
+                point = index.get(day.replace(hour=int(hour)))
+                if point is not None:
+                    _merge_bucket(points[point], bucket)
+        else:
+            point = index.get(_bucket_start(day, resolution))
+            if point is not None:
+                _merge_bucket(points[point], doc)
+
+    if max_points and len(points) > max_points:
+        group = math.ceil(len(points) / max_points)
+        merged = []
+        for i in range(0, len(points), group):
+            chunk = points[i:i + group]
+            point = dict(_empty_bucket(), start=chunk[0]['start'], end=chunk[-1]['end'])
+            for bucket in chunk:
+                _merge_bucket(point, bucket)
+            merged.append(point)
+        points = merged
+
+    for point in points:
+        point['start'] = point['start'].isoformat()
+        point['end'] = point['end'].isoformat()
+    return points
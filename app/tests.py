@@ -1,3 +1,1355 @@
-from django.test import TestCase
+import contextvars
+import csv
+import heapq
+import io
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TestCase
+from django.utils import timezone as dj_timezone
+from google.auth.credentials import AnonymousCredentials
+from google.cloud import firestore as gcloud_firestore
+from google.cloud.firestore_v1.types import BatchWriteResponse, WriteResult
+from google.cloud.firestore_v1 import SERVER_TIMESTAMP
+from google.rpc import status_pb2
+from rest_framework.test import APIRequestFactory
+
+from . import views
+from .fanout import FanOutLoader
+from .firebase_cache import DocumentCache
+from .firebase_mirror import CollectionMirror
+from .firebase_replica import default_replicas
+from .firebase_service import FirebaseService, UPDATED_FIELD
+from .firebase_sync import push_documents, sync_sharded
+from .geo_index import GridIndex, haversine_km
+from .geocoding import GeocodeCache, GeocodingBackend, ReverseGeocoder
+from .live_stream import LiveChannel, LiveHub
+from .mail_engine import BulkMailer, claim_campaign, mail_worker_missing, queue_campaign, run_campaign
+from .models import Customer, DeliveryOrder, Driver, MailCampaign, MailRecipient, SyncCheckpoint
+from .request_cache import RequestReadCache, current_read_cache, forget_reads, request_read_cache, run_with_deadline
+from .rollups import (
+    COMPLETED_STATUSES, TRIP_STATS_FIELDS, build_daily_rollups, build_trip_series, daily_status_delta, trip_revenue,
+)
+
+
+class FakeDocument:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class FakeQuery:
+    """Filters, projections, ordering, cursors and count()/sum() aggregations over in-memory documents"""
+
+    def __init__(self, documents, aggregations=(), orders=()):
+        self.documents = documents
+        self.aggregations = list(aggregations)
+        self.orders = list(orders)
+
+    def _with(self, documents, **kwargs):
+        return FakeQuery(documents, kwargs.get('aggregations', self.aggregations), kwargs.get('orders', self.orders))
+
+    def where(self, field, op, value):
+        def matches(data):
+            current = data.get(field)
+            if op == '==':
+                return current == value
+            if op == 'in':
+                return current in value
+            if op == '!=':
+                return current is not None and current != value
+            # Range filters only match values of the filter's type
+            if isinstance(value, str) != isinstance(current, str) or current is None:
+                return False
+            return current >= value if op == '>=' else current < value
+        return self._with({doc_id: data for doc_id, data in self.documents.items() if matches(data)})
+
+    def select(self, fields):
+        return self._with({doc_id: {f: data[f] for f in fields if f in data}
+                           for doc_id, data in self.documents.items()})
+
+    def _ordered(self, items):
+        descending = bool(self.orders) and self.orders[-1][1]
+        items = sorted(items, key=lambda item: item[0], reverse=descending)
+        for field, reverse in reversed(self.orders):
+            if field != '__name__':
+                items = sorted(items, key=lambda item: item[1].get(field), reverse=reverse)
+        return items
+
+    def order_by(self, field, direction='ASCENDING'):
+        orders = self.orders + [(field, direction == 'DESCENDING')]
+        query = self._with({}, orders=orders)
+        return self._with(dict(query._ordered(self.documents.items())), orders=orders)
+
+    def _split(self, cursor):
+        """Documents before and after ``cursor`` (a snapshot or {'__name__': id}) in query order"""
+        if isinstance(cursor, dict):
+            cursor_id, cursor_data = cursor['__name__'], {}
+        else:
+            cursor_id, cursor_data = cursor.id, cursor.to_dict()
+        items = [(doc_id, data) for doc_id, data in self.documents.items() if doc_id != cursor_id]
+        ordered = self._ordered(items + [(cursor_id, cursor_data)])
+        position = [doc_id for doc_id, _ in ordered].index(cursor_id)
+        return dict(ordered[:position]), dict(ordered[position + 1:])
+
+    def start_after(self, cursor):
+        return self._with(self._split(cursor)[1])
+
+    def start_at(self, cursor):
+        before, _ = self._split(cursor)
+        return self._with({k: v for k, v in self.documents.items() if k not in before})
+
+    def end_before(self, cursor):
+        return self._with(self._split(cursor)[0])
+
+    def limit(self, count):
+        return self._with(dict(list(self.documents.items())[:count]))
+
+    def limit_to_last(self, count):
+        return self._with(dict(list(self.documents.items())[-count:]))
+
+    def stream(self):
+        return iter([FakeDocument(doc_id, data) for doc_id, data in self.documents.items()])
+
+    def count(self, alias):
+        return self._with(self.documents, aggregations=self.aggregations + [(alias, None)])
+
+    def sum(self, field, alias):
+        return self._with(self.documents, aggregations=self.aggregations + [(alias, field)])
+
+    def get(self):
+        if not self.aggregations:
+            return list(self.stream())
+        results = []
+        for alias, field in self.aggregations:
+            if field is None:
+                value = len(self.documents)
+            else:
+                value = sum(data[field] for data in self.documents.values()
+                            if isinstance(data.get(field), (int, float)) and not isinstance(data.get(field), bool))
+            results.append(SimpleNamespace(alias=alias, value=value))
+        return [results]
+
+
+class FakeDocumentRef:
+    def __init__(self, documents, doc_id):
+        self.documents = documents
+        self.id = doc_id
+
+    def get(self):
+        data = self.documents.get(self.id)
+        return SimpleNamespace(id=self.id, exists=data is not None, to_dict=lambda: dict(data or {}))
+
+    def update(self, data):
+        if self.id not in self.documents:
+            raise KeyError(self.id)
+        self.documents[self.id].update(data)
+
+
+class FakeCollectionRef(FakeQuery):
+    def document(self, doc_id):
+        return FakeDocumentRef(self.documents, doc_id)
+
+
+class FakeBatch:
+    def __init__(self):
+        self.writes = []
+
+    def set(self, ref, data):
+        self.writes.append((ref, data))
+
+    def delete(self, ref):
+        self.writes.append((ref, None))
+
+    def commit(self):
+        for ref, data in self.writes:
+            if data is None:
+                ref.documents.pop(ref.id, None)
+            else:
+                ref.documents[ref.id] = {key: datetime.now(timezone.utc) if value is SERVER_TIMESTAMP else value
+                                         for key, value in data.items()}
+
+
+class FakeAnalyticsDb:
+    def __init__(self, collections):
+        self.collections = collections
+
+    def collection(self, name):
+        return FakeCollectionRef(self.collections.setdefault(name, {}))
+
+    def get_all(self, refs):
+        for ref in refs:
+            data = ref.documents.get(ref.id)
+            yield SimpleNamespace(id=ref.id, exists=data is not None, to_dict=lambda data=data: dict(data))
+
+    def batch(self):
+        return FakeBatch()
+
+
+def days_ago(days):
+    return datetime(2025, 3, 10, 12, tzinfo=timezone.utc) - timedelta(days=days)
+
+
+class ServiceTestCase(SimpleTestCase):
+    """A FirebaseService over in-memory collections, with empty process-wide caches"""
+
+    collections = {}
+
+    def setUp(self):
+        self.service = FirebaseService()
+        self.db = FakeAnalyticsDb({name: {doc_id: dict(data) for doc_id, data in documents.items()}
+                                   for name, documents in self.collections.items()})
+        self.service.db = self.db
+        for cache in (FirebaseService.driver_cache, FirebaseService.customer_cache):
+            cache.clear()
+            self.addCleanup(cache.clear)
+
+    def fetched_ids(self, get_all):
+        return [ref.id for call in get_all.call_args_list for ref in call.args[0]]
+
+
+class TripNamesTests(ServiceTestCase):
+    collections = {
+        'Drivers': {'d1': {'firstName': 'Ada', 'lastName': 'Obi'}, 'd2': {'firstName': 'Ben'}},
+        'Customers': {'c1': {'firstName': 'Chi', 'lastName': 'Nwa'}},
+        'DeliveryRequests': {
+            't1': {'driverID': 'd1', 'userID': 'c1', 'dateCreated': days_ago(0)},
+            't2': {'driverID': 'd1', 'userID': 'c1', 'dateCreated': days_ago(1)},
+            't3': {'driverID': 'd2', 'userID': 'gone', 'userName': 'Walk-in', 'dateCreated': days_ago(2)},
+            't4': {'driverID': 'gone', 'recipientName': 'Dee', 'dateCreated': days_ago(3)},
+        },
+    }
+
+    def test_names_come_from_one_batch_get_per_collection(self):
+        with mock.patch.object(self.db, 'get_all', wraps=self.db.get_all) as get_all:
+            trips = self.service.get_all_trips()
+        self.assertEqual([(trip['id'], trip.get('driver_name'), trip.get('customer_name')) for trip in trips], [
+            ('t1', 'Ada Obi', 'Chi Nwa'),
+            ('t2', 'Ada Obi', 'Chi Nwa'),
+            ('t3', 'Ben', 'Walk-in'),
+            ('t4', 'Driver Not Found', 'Dee'),
+        ])
+        self.assertEqual(get_all.call_count, 2)
+        self.assertCountEqual(self.fetched_ids(get_all), ['d1', 'd2', 'gone', 'c1', 'gone'])
+
+    def test_cached_documents_are_not_fetched_again(self):
+        self.service.get_all_trips()
+        with mock.patch.object(self.db, 'get_all', wraps=self.db.get_all) as get_all:
+            self.service.get_all_trips(status=None)
+        self.assertCountEqual(self.fetched_ids(get_all), ['gone', 'gone'])
+
+
+class DocumentCacheTests(ServiceTestCase):
+    collections = {'Drivers': {'d1': {'firstName': 'Ada'}}}
+
+    def test_entries_expire_and_the_least_recently_used_is_evicted(self):
+        cache = DocumentCache(max_entries=2, ttl=10)
+        with mock.patch('app.firebase_cache.time.monotonic', return_value=100):
+            cache.set('a', {'n': 1})
+            cache.set('b', {'n': 2})
+            cache.get('a')
+            cache.set('c', {'n': 3})
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual(cache.get('a'), {'n': 1})
+        with mock.patch('app.firebase_cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        stats = cache.stats()
+        self.assertEqual((stats['size'], stats['evictions'], stats['expirations']), (1, 1, 1))
+
+    def test_callers_get_copies(self):
+        cache = DocumentCache()
+        cache.set('a', {'n': 1})
+        cache.get('a')['n'] = 2
+        self.assertEqual(cache.get('a'), {'n': 1})
+
+    def test_writes_invalidate_the_cached_document(self):
+        self.assertEqual(self.service.get_driver_by_id('d1')['firstName'], 'Ada')
+        self.db.collections['Drivers']['d1']['firstName'] = 'Changed elsewhere'
+        self.assertEqual(self.service.get_driver_by_id('d1')['firstName'], 'Ada')
+
+        self.assertTrue(self.service.update_driver('d1', {'firstName': 'Adaeze'}))
+        self.assertEqual(self.service.get_driver_by_id('d1')['firstName'], 'Adaeze')
+        self.assertEqual(FirebaseService.driver_cache.stats()['invalidations'], 1)
+
+
+class FakeWatchTarget:
+    """Document ref or query whose on_snapshot callback the test fires by hand"""
+
+    def __init__(self):
+        self.callback = None
+
+    def on_snapshot(self, callback):
+        self.callback = callback
+        return SimpleNamespace(is_active=True, unsubscribe=lambda: None)
+
+    def fire(self, *documents):
+        snapshots = [SimpleNamespace(exists=True, **document) for document in documents]
+        self.callback(snapshots, [], None)
+
+
+class CollectionMirrorTests(ServiceTestCase):
+    @staticmethod
+    def document(doc_id, **data):
+        return SimpleNamespace(id=doc_id, to_dict=lambda: dict(data))
+
+    @staticmethod
+    def change(kind, document):
+        return SimpleNamespace(type=SimpleNamespace(name=kind), document=document)
+
+    def setUp(self):
+        super().setUp()
+        self.target = FakeWatchTarget()
+        self.mirror = CollectionMirror('Drivers', counters={
+            'online': lambda d: d.get('isDriverOnline', False),
+            'approved': lambda d: d.get('isApproved', False),
+        })
+        self.mirror.start(SimpleNamespace(collection=lambda name: self.target))
+
+    def test_counts_follow_the_change_events(self):
+        applied = []
+        self.mirror.add_listener(lambda changes, reset: applied.append((changes, reset)))
+        self.assertFalse(self.mirror.is_live)
+
+        self.target.callback([self.document('d1', isDriverOnline=True, isApproved=True), self.document('d2')],
+                             [], None)
+        self.assertTrue(self.mirror.is_live)
+        self.assertEqual(self.mirror.counts(), {'online': 1, 'approved': 1, 'total': 2})
+
+        self.target.callback([], [self.change('MODIFIED', self.document('d2', isDriverOnline=True)),
+                                  self.change('REMOVED', self.document('d1'))], None)
+        self.assertEqual(self.mirror.counts(), {'online': 1, 'approved': 0, 'total': 1})
+        self.assertEqual(self.mirror.get('d2'), {'id': 'd2', 'isDriverOnline': True})
+        self.assertEqual(applied[1], ({'d2': {'id': 'd2', 'isDriverOnline': True}, 'd1': None}, False))
+        self.assertTrue(applied[0][1])
+
+    def test_service_reads_drivers_from_a_live_mirror(self):
+        self.target.callback([self.document('d1', isDriverOnline=True, isApproved=True), self.document('d2')],
+                             [], None)
+        with mock.patch.object(FirebaseService, 'drivers_mirror', self.mirror), \
+                self.settings(FIREBASE_DRIVERS_MIRROR=True):
+            self.assertEqual([driver['id'] for driver in self.service.get_all_drivers()], ['d1', 'd2'])
+            self.assertEqual(self.service.get_driver_stats_enhanced(), {
+                'total_drivers': 2, 'active_drivers': 1, 'offline_drivers': 1,
+                'pending_drivers': 1, 'approved_drivers': 1,
+            })
+
+
+class DashboardCountsTests(ServiceTestCase):
+    collections = {
+        'Drivers': {
+            'd1': {'isDriverOnline': True, 'isApproved': True},
+            'd2': {'isDriverOnline': False, 'isApproved': True},
+            'd3': {'isApproved': False},
+        },
+        'Customers': {'c1': {}, 'c2': {}},
+    }
+
+    def test_counts_are_aggregated_on_the_server(self):
+        with mock.patch.object(FakeQuery, 'stream', side_effect=AssertionError('documents downloaded')):
+            self.assertEqual(self.service.get_driver_stats_enhanced(), {
+                'total_drivers': 3, 'active_drivers': 1, 'offline_drivers': 2,
+                'pending_drivers': 1, 'approved_drivers': 2,
+            })
+            self.assertEqual(self.service.get_customers_stats(), {'total_customers': 2})
+
+
+class TripTotalsTests(SimpleTestCase):
+    TRIPS = {
+        't1': {'status': 'completed', 'totalAmount': 100},
+        't2': {'status': 'completed', 'totalAmount': '50', 'deliveryAmount': 7},
+        't3': {'status': 'completed', 'deliveryAmount': 30},
+        't4': {'status': 'delivered', 'deliveryAmount': '20.5', 'amount': 3},
+        't5': {'status': 'ended', 'amount': 5},
+        't6': {'status': 'completed'},
+        't7': {'status': 'pending', 'totalAmount': 1000},
+        't8': {'status': 'completed', 'totalAmount': None, 'deliveryAmount': 9},
+        't9': {'status': 'ended', 'totalAmount': 'n/a'},
+    }
+
+    def setUp(self):
+        self.service = FirebaseService()
+        self.service.db = FakeAnalyticsDb({'DeliveryRequests': self.TRIPS})
+
+    def test_totals_match_a_full_scan(self):
+        completed = [trip for trip in self.TRIPS.values() if trip['status'] in COMPLETED_STATUSES]
+        totals = self.service.get_trip_totals()
+        self.assertEqual(totals['total_trips'], 9)
+        self.assertEqual(totals['completed_trips'], 8)
+        self.assertEqual(totals['total_revenue'], sum(trip_revenue(trip) for trip in completed))
+        self.assertEqual(totals['total_revenue'], 214.5)
+        self.assertEqual(totals['completion_rate'], round(8 / 9 * 100, 2))
+
+    def test_no_trips(self):
+        self.service.db = FakeAnalyticsDb({})
+        self.assertEqual(self.service.get_trip_totals(),
+                         {'total_trips': 0, 'completed_trips': 0, 'total_revenue': 0, 'completion_rate': 0})
+
+
+class FanOutLoaderTests(SimpleTestCase):
+    def test_failures_and_missed_deadlines_fall_back_to_defaults(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def broken():
+            raise RuntimeError('down')
+
+        loader = (FanOutLoader(timeout=0.1)
+                  .add('fast', lambda value: value * 2, 21)
+                  .add('slow', release.wait, 5, default='late')
+                  .add('broken', broken, default=[]))
+        self.assertEqual(loader.run(), {'fast': 42, 'slow': 'late', 'broken': []})
+        self.assertCountEqual(loader.failed, ['slow', 'broken'])
+
+    def test_calls_run_concurrently(self):
+        barrier = threading.Barrier(3, timeout=5)
+        loader = FanOutLoader(timeout=5)
+        for name in 'abc':
+            loader.add(name, barrier.wait)
+        self.assertCountEqual(loader.run().values(), [0, 1, 2])
+        self.assertEqual(loader.failed, [])
+
+
+class RequestReadCacheTests(SimpleTestCase):
+    def test_waiters_give_up_at_the_deadline(self):
+        cache = RequestReadCache()
+        started, release = threading.Event(), threading.Event()
+
+        def slow_read():
+            started.set()
+            release.wait(5)
+            return 'ratings'
+
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            owner = pool.submit(cache.call, 'key', slow_read)
+            started.wait(5)
+            deadline = time.monotonic() + 0.05
+            with self.assertRaises(TimeoutError):
+                contextvars.copy_context().run(run_with_deadline, deadline, cache.call, 'key', slow_read)
+            release.set()
+            self.assertEqual(owner.result(), 'ratings')
+        self.assertEqual((cache.reads, cache.saved), (1, 1))
+
+    def test_fan_out_calls_share_one_read(self):
+        reads = []
+
+        def read(name):
+            reads.append(name)
+            return name.upper()
+
+        service = SimpleNamespace(read=lambda name: current_read_cache().call(('read', name), lambda: read(name)))
+        with request_read_cache():
+            results = FanOutLoader().add('a', service.read, 'x').add('b', service.read, 'x').run()
+        self.assertEqual(results, {'a': 'X', 'b': 'X'})
+        self.assertEqual(reads, ['x'])
+
+    def test_reads_are_memoized_per_request_and_dropped_after_writes(self):
+        service = FirebaseService()
+        service.db = FakeAnalyticsDb({'DeliveryRequests': {'t1': {'driverID': 'd1'}}})
+        with mock.patch.object(FakeQuery, 'stream', autospec=True, side_effect=FakeQuery.stream) as stream:
+            with request_read_cache() as cache:
+                service.get_driver_trips('d1')
+                self.assertEqual(service.get_driver_trips('d1')[0]['id'], 't1')
+                self.assertEqual((stream.call_count, cache.saved), (1, 1))
+                forget_reads()
+                service.get_driver_trips('d1')
+                self.assertEqual(stream.call_count, 2)
+            service.get_driver_trips('d1')
+            self.assertEqual(stream.call_count, 3)
+
+
+class DriverRatingsTests(ServiceTestCase):
+    collections = {
+        'Customers': {'c1': {'firstName': 'Chi', 'lastName': 'Nwa'}, 'c2': {'firstName': 'Dayo', 'lastName': 'Ade'}},
+        'DeliveryRequests': {'t1': {'driverID': 'd1', 'userID': 'c1'}, 't2': {'driverID': 'd2', 'userID': 'c2'}},
+        'DriversRatings': {
+            f'r{i}': {'driverId': 'd1', 'customerId': 'c1' if i % 2 else 'c2', 'rating': i,
+                      'dateCreated': days_ago(5 - i)}
+            for i in range(1, 6)
+        },
+    }
+
+    def test_ratings_are_enriched_with_one_batch_get(self):
+        self.db.collections['DriversRatings']['r5']['tripId'] = 't9'
+        with mock.patch.object(self.db, 'get_all', wraps=self.db.get_all) as get_all:
+            ratings = {rating['id']: rating for rating in self.service.get_driver_ratings('d1')}
+        self.assertEqual(get_all.call_count, 1)
+        self.assertEqual(ratings['r1']['customer_name'], 'Chi Nwa')
+        self.assertEqual(ratings['r1']['order_id'], 't1')
+        # No trip with this customer: linked to any trip of the driver
+        self.assertEqual((ratings['r2']['customer_name'], ratings['r2']['order_id']), ('Dayo Ade', 't1'))
+        self.assertNotIn('link_order_id', ratings['r5'])
+        self.assertEqual(ratings['r5']['order_id'], 't9')
+
+    def test_pages_run_newest_first(self):
+        first = self.service.get_driver_ratings('d1', limit=2, enrich=False)
+        self.assertEqual([rating['id'] for rating in first], ['r5', 'r4'])
+        second = self.service.get_driver_ratings('d1', limit=2, start_after='r4', enrich=False)
+        self.assertEqual([rating['id'] for rating in second], ['r3', 'r2'])
+
+    def test_pages_are_sorted_in_memory_without_the_index(self):
+        with mock.patch.object(FakeQuery, 'order_by', side_effect=RuntimeError('index required')):
+            page = self.service.get_driver_ratings('d1', limit=2, start_after='r4', enrich=False)
+        self.assertEqual([rating['id'] for rating in page], ['r3', 'r2'])
+
+
+class RatingSummaryTests(SimpleTestCase):
+    def test_page_and_analytics_come_from_one_read(self):
+        service = FirebaseService()
+        ratings = [{'id': f'r{day}', 'rating': day % 5 + 1, 'dateCreated': datetime(2025, 1, day, tzinfo=timezone.utc)}
+                   for day in range(1, 8)]
+        with mock.patch.object(service, 'get_driver_ratings', return_value=ratings) as get_ratings, \
+                mock.patch.object(service, '_enrich_ratings') as enrich:
+            summary = service.get_driver_rating_summary('d1', limit=3)
+        get_ratings.assert_called_once_with('d1', enrich=False)
+        self.assertEqual([r['id'] for r in summary['ratings']], ['r7', 'r6', 'r5'])
+        enrich.assert_called_once_with('d1', summary['ratings'])
+        self.assertEqual(summary['analytics']['total_ratings'], 7)
+        # Enriched copies, leaving the shared memoized list alone
+        self.assertIsNot(summary['ratings'][0], ratings[-1])
+
+
+class TripsPageTests(ServiceTestCase):
+    collections = {
+        'Drivers': {'d1': {'firstName': 'Ada'}},
+        'DeliveryRequests': {
+            f't{i}': {'driverID': 'd1', 'status': 'completed' if i % 2 else 'pending', 'dateCreated': days_ago(i)}
+            for i in range(1, 8)
+        },
+    }
+
+    def ids(self, page):
+        return [trip['id'] for trip in page['trips']]
+
+    def test_cursors_walk_forwards_and_back(self):
+        first = self.service.get_trips_page(limit=3)
+        self.assertEqual(self.ids(first), ['t1', 't2', 't3'])
+        self.assertIsNone(first['prev_cursor'])
+        self.assertEqual(first['trips'][0]['driver_name'], 'Ada')
+
+        second = self.service.get_trips_page(limit=3, cursor=first['next_cursor'])
+        self.assertEqual(self.ids(second), ['t4', 't5', 't6'])
+        last = self.service.get_trips_page(limit=3, cursor=second['next_cursor'])
+        self.assertEqual(self.ids(last), ['t7'])
+        self.assertIsNone(last['next_cursor'])
+
+        back = self.service.get_trips_page(limit=3, cursor=last['prev_cursor'])
+        self.assertEqual(self.ids(back), ['t4', 't5', 't6'])
+        self.assertEqual(self.ids(self.service.get_trips_page(limit=3, cursor=back['prev_cursor'])),
+                         ['t1', 't2', 't3'])
+
+    def test_status_filter_and_bad_cursors(self):
+        page = self.service.get_trips_page(limit=2, status='completed')
+        self.assertEqual(self.ids(page), ['t1', 't3'])
+        self.assertEqual(self.ids(self.service.get_trips_page(limit=2, status='completed',
+                                                              cursor=page['next_cursor'])), ['t5', 't7'])
+        self.assertEqual(self.ids(self.service.get_trips_page(limit=2, cursor='not-a-cursor')), ['t1', 't2'])
+        with self.assertRaises(ValueError):
+            self.service.get_trips_page(limit=0)
+
+
+class ListApiTests(ServiceTestCase):
+    collections = {
+        'Drivers': {
+            f'd{i}': {'firstName': f'Driver {i}', 'email': f'd{i}@example.com', 'isApproved': i != 2}
+            for i in range(1, 6)
+        },
+    }
+
+    def get(self, **params):
+        with mock.patch.object(views.firebase_service, 'db', self.db):
+            return views.drivers_list_api(APIRequestFactory().get('/api/drivers/', params))
+
+    def test_pages_are_projected_and_filtered(self):
+        first = self.get(page_size=2, fields='firstName', isApproved='true')
+        self.assertEqual(first.data['data'], [{'firstName': 'Driver 1', 'id': 'd1'},
+                                              {'firstName': 'Driver 3', 'id': 'd3'}])
+        second = self.get(page_size=2, fields='firstName', isApproved='true', cursor=first.data['next_cursor'])
+        self.assertEqual([driver['id'] for driver in second.data['data']], ['d4', 'd5'])
+        self.assertIsNone(second.data['next_cursor'])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({'page_size': 0}, {'page_size': 'x'}, {'fields': 'name;drop'}, {'isApproved': 'maybe'}):
+            self.assertEqual(self.get(**params).status_code, 400, params)
+
+
+class TripAnalyticsTests(ServiceTestCase):
+    collections = {
+        'DeliveryRequests': {
+            't1': {'status': 'completed', 'deliveryAmount': 10, 'dateCreated': days_ago(1), 'notes': 'x' * 1000},
+            't2': {'status': 'pending', 'dateCreated': days_ago(1).isoformat()},
+            't3': {'status': 'delivered', 'totalAmount': '7.5', 'dateCreated': days_ago(10).isoformat()},
+            't4': {'status': 'completed', 'amount': 3, 'dateCreated': days_ago(20)},
+        },
+    }
+
+    def test_all_trips_and_a_range_mixing_timestamp_and_string_dates(self):
+        self.assertEqual(self.service.get_trip_analytics(), {
+            'total_trips': 4, 'completed_trips': 3, 'total_revenue': 20.5, 'completion_rate': 75.0,
+        })
+        self.assertEqual(self.service.get_trip_analytics(days_ago(15), days_ago(0)), {
+            'total_trips': 3, 'completed_trips': 2, 'total_revenue': 17.5, 'completion_rate': 66.67,
+        })
+
+    def test_only_the_rollup_fields_are_read(self):
+        with mock.patch.object(FakeQuery, 'select', autospec=True, side_effect=FakeQuery.select) as select:
+            self.service.get_trip_analytics()
+        self.assertEqual(select.call_args.args[1], TRIP_STATS_FIELDS)
+
+
+class RollupTests(SimpleTestCase):
+    def test_status_changes_move_the_day_and_hour_buckets(self):
+        trip = {'status': 'accepted', 'deliveryAmount': '12.5', 'dateCreated': '2025-03-10T08:30:00Z'}
+        change = daily_status_delta(trip, 'completed')
+        bucket = {'by_status': {'accepted': -1, 'completed': 1}, 'completed': 1, 'revenue': 12.5}
+        self.assertEqual(change, {'day': '2025-03-10', 'delta': dict(bucket, hours={'08': bucket})})
+        self.assertEqual(daily_status_delta(trip, 'accepted'), {})
+        self.assertEqual(daily_status_delta({'status': 'accepted'}, 'completed'), {})
+
+    def test_series_buckets_days_into_weeks_and_hours(self):
+        days = build_daily_rollups([
+            {'status': 'completed', 'amount': 5, 'dateCreated': datetime(2025, 3, 10, 9, tzinfo=timezone.utc)},
+            {'status': 'pending', 'dateCreated': '2025-03-12T23:00:00Z'},
+            {'status': 'completed', 'amount': 2, 'dateCreated': datetime(2025, 3, 17, 1, tzinfo=timezone.utc)},
+            {'status': 'completed', 'amount': 100},
+        ])
+        weeks = build_trip_series(days, date(2025, 3, 10), date(2025, 3, 17), 'week')
+        self.assertEqual([(point['trips'], point['revenue']) for point in weeks], [(2, 5), (1, 2)])
+
+        hours = build_trip_series(days, date(2025, 3, 10), date(2025, 3, 10), 'hour')
+        self.assertEqual(len(hours), 24)
+        self.assertEqual(hours[9]['completed'], 1)
+
+        merged = build_trip_series(days, date(2025, 3, 10), date(2025, 3, 17), 'day', max_points=4)
+        self.assertEqual([point['trips'] for point in merged], [1, 1, 0, 1])
+        self.assertEqual(merged[-1]['end'], '2025-03-18T00:00:00+00:00')
+
+
+class TripSeriesTests(SimpleTestCase):
+    def setUp(self):
+        self.now = datetime.now(timezone.utc)
+        self.today = self.now.date()
+        self.trips = {
+            't1': {'status': 'completed', 'deliveryAmount': 10, 'dateCreated': self.now},
+            't2': {'status': 'pending', 'dateCreated': self.now.isoformat()},
+            't3': {'status': 'completed', 'deliveryAmount': 4, 'dateCreated': self.now - timedelta(days=5)},
+        }
+        self.service = FirebaseService()
+        self.service.db = FakeAnalyticsDb({'DeliveryRequests': self.trips})
+
+    def series(self):
+        return self.service.get_trip_series(self.today - timedelta(days=6), self.today)
+
+    def test_recent_days_include_trips_created_by_the_apps(self):
+        series = self.series()
+        self.assertEqual((series[-1]['trips'], series[-1]['completed'], series[-1]['revenue']), (2, 1, 10))
+        # Days older than TRIP_SERIES_LIVE_DAYS wait for rebuild_trip_series
+        self.assertEqual(series[1]['trips'], 0)
+
+        self.service.rebuild_daily_rollups(self.today - timedelta(days=6), self.today)
+        self.assertEqual(self.series()[1]['trips'], 1)
+
+    def test_recent_days_are_rebuilt_only_when_stale(self):
+        self.series()
+        self.trips['t4'] = {'status': 'pending', 'dateCreated': self.now}
+        self.assertEqual(self.series()[-1]['trips'], 2)
+        with self.settings(TRIP_SERIES_REFRESH_INTERVAL=0):
+            self.assertEqual(self.series()[-1]['trips'], 3)
+
+
+class LiveStreamTests(SimpleTestCase):
+    def test_streams_are_off_by_default(self):
+        response = views.driver_live_stream(RequestFactory().get('/api/drivers/d1/stream/'), 'd1')
+        self.assertEqual(response.status_code, 404)
+
+    def test_driver_channel_never_reads_from_the_listener_thread(self):
+        service = FirebaseService()
+        service.db = mock.MagicMock()
+        targets = {}
+        sources = {}
+        for name, (_, transform) in service.driver_live_sources('d1').items():
+            targets[name] = FakeWatchTarget()
+            sources[name] = (targets[name], transform)
+        channel = LiveChannel(sources, lambda parts: {'trip': (parts['active_trip'] or parts['latest_trip'] or {}).get('id')})
+        channel.start()
+
+        with mock.patch.object(service, 'get_driver_current_trip', side_effect=AssertionError('network read')):
+            targets['driver'].fire({'id': 'd1', 'to_dict': lambda: {'firstName': 'Ada'}})
+            targets['location'].fire()
+            targets['active_trip'].fire()
+            targets['latest_trip'].fire({'id': 't1', 'to_dict': lambda: {'status': 'completed'}})
+            self.assertEqual(json.loads(channel.last), {'trip': 't1'})
+            targets['active_trip'].fire({'id': 't2', 'to_dict': lambda: {'status': 'accepted'}})
+            self.assertEqual(json.loads(channel.last), {'trip': 't2'})
+
+
+class LiveHubTests(SimpleTestCase):
+    def channel(self, *names):
+        targets = {name: FakeWatchTarget() for name in names}
+        sources = {name: (target, lambda snapshots: [s.id for s in snapshots]) for name, target in targets.items()}
+        return LiveChannel(sources, lambda parts: parts), targets
+
+    def test_viewers_share_one_channel_until_the_last_leaves(self):
+        hub = LiveHub()
+        channel, targets = self.channel('driver')
+        factory = mock.Mock(return_value=channel)
+        first_channel, first = hub.subscribe('d1', factory)
+        second_channel, second = hub.subscribe('d1', factory)
+        self.assertIs(first_channel, second_channel)
+        self.assertEqual(factory.call_count, 1)
+        self.assertEqual(hub.stats(), {'channels': 1, 'subscribers': 2})
+
+        targets['driver'].fire({'id': 'd1'})
+        self.assertEqual(hub.latest('d1'), '{"driver": ["d1"]}')
+        self.assertEqual((first.get_nowait(), second.get_nowait()), (hub.latest('d1'),) * 2)
+
+        with mock.patch.object(channel, 'stop', wraps=channel.stop) as stop:
+            hub.unsubscribe('d1', channel, first)
+            stop.assert_not_called()
+            hub.unsubscribe('d1', channel, second)
+            stop.assert_called_once()
+        self.assertEqual(hub.stats(), {'channels': 0, 'subscribers': 0})
+        self.assertIsNone(hub.latest('d1'))
+
+    def test_a_channel_whose_listeners_died_is_replaced(self):
+        hub = LiveHub()
+        stale, _ = self.channel('driver')
+        hub.subscribe('d1', lambda: stale)
+        stale._watches[0].is_active = False
+        fresh, _ = self.channel('driver')
+        channel, _ = hub.subscribe('d1', lambda: fresh)
+        self.assertIs(channel, fresh)
+        self.assertEqual(stale._watches, [])
+
+    def test_payloads_wait_for_every_source_and_skip_repeats(self):
+        channel, targets = self.channel('driver', 'location')
+        channel.start()
+        subscriber = channel.subscribe()
+        targets['driver'].fire({'id': 'd1'})
+        self.assertTrue(subscriber.empty())
+        targets['location'].fire()
+        targets['location'].fire()
+        self.assertEqual(subscriber.get_nowait(), '{"driver": ["d1"], "location": []}')
+        self.assertTrue(subscriber.empty())
+        # A late viewer starts from the last payload
+        self.assertEqual(channel.subscribe().get_nowait(), channel.last)
+
+
+class FleetMapTests(ServiceTestCase):
+    collections = {
+        'Drivers': {'d1': {'firstName': 'Ada', 'lastName': 'Obi'}},
+        'DriverLocation': {
+            'd1': {'isOnline': True, 'latitude': 6.52, 'longitude': 3.37, 'updatedOn': 'now'},
+            'd2': {'isOnline': True, 'latitude': 6.60, 'longitude': 3.35},
+            'd3': {'isOnline': False, 'latitude': 6.53, 'longitude': 3.38},
+            'd4': {'isOnline': True, 'latitude': 0, 'longitude': 0},
+            'd5': {'isOnline': True, 'latitude': 9.07, 'longitude': 7.49},
+        },
+    }
+
+    def test_viewport_is_answered_from_one_read_without_the_listener(self):
+        with self.settings(FLEET_LIVE_INDEX=False):
+            fleet = self.service.get_fleet_in_bbox(6.4, 3.3, 6.7, 3.5)
+        self.assertFalse(fleet['live'])
+        self.assertEqual(sorted((point['id'], point['name']) for point in fleet['drivers']),
+                         [('d1', 'Ada Obi'), ('d2', '')])
+        with self.settings(FLEET_LIVE_INDEX=False):
+            self.assertTrue(self.service.get_fleet_in_bbox(6.4, 3.3, 6.7, 3.5, limit=1)['truncated'])
+
+    def test_boxes_across_the_antimeridian(self):
+        grid = GridIndex(cell_size=1)
+        grid.upsert('fiji', -17.7, 178.0)
+        grid.upsert('samoa', -13.8, -171.8)
+        grid.upsert('greenwich', 51.5, 0.0)
+        self.assertCountEqual([point['id'] for point in grid.query_bbox(-20, 170, -10, -170)], ['fiji', 'samoa'])
+        self.assertEqual(len(grid.query_bbox(-20, 170, -10, -170, limit=1)), 1)
+
+
+class GridIndexTests(SimpleTestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.grid = GridIndex(cell_size=0.01)
+        self.points = {}
+        for i in range(2000):
+            point = (6.4 + rng.random() * 0.3, 3.2 + rng.random() * 0.3)
+            self.points[f'd{i}'] = point
+            self.grid.upsert(f'd{i}', *point)
+
+    def brute_force(self, lat, lng, k, ids=None):
+        ids = self.points if ids is None else ids
+        return heapq.nsmallest(k, ids, key=lambda pid: haversine_km(lat, lng, *self.points[pid]))
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lng in [(6.5, 3.3), (6.41, 3.49), (6.0, 3.0)]:
+            found = self.grid.nearest(lat, lng, 5)
+            self.assertEqual([point['id'] for point in found], self.brute_force(lat, lng, 5))
+            self.assertEqual([point['distance_km'] for point in found],
+                             sorted(point['distance_km'] for point in found))
+
+    def test_query_bbox_and_moves(self):
+        self.grid.upsert('d0', 7.0, 4.0)
+        self.assertEqual([point['id'] for point in self.grid.query_bbox(6.95, 3.95, 7.05, 4.05)], ['d0'])
+        self.grid.remove('d0')
+        self.assertEqual(self.grid.query_bbox(6.95, 3.95, 7.05, 4.05), [])
+        self.assertIsNone(self.grid.get('d0'))
+
+    def test_filtered_search_matches_brute_force(self):
+        approved = {pid for i, pid in enumerate(sorted(self.points)) if i % 97 == 0}
+        found = self.grid.nearest(6.5, 3.3, 5, predicate=lambda point: point['id'] in approved)
+        self.assertEqual([point['id'] for point in found], self.brute_force(6.5, 3.3, 5, approved))
+
+    def test_sparse_search_looks_at_each_point_once(self):
+        # A lone driver in London and fewer than k qualifying drivers: the search
+        # has to rule out every point, but must not walk the rings in between
+        self.grid.upsert('london', 51.5074, -0.1278)
+        self.points['london'] = (51.5074, -0.1278)
+        qualifying = {'d1', 'd2', 'london'}
+        checked = []
+
+        def predicate(point):
+            checked.append(point['id'])
+            return point['id'] in qualifying
+
+        found = self.grid.nearest(6.5, 3.3, 5, predicate=predicate)
+        self.assertEqual([point['id'] for point in found], self.brute_force(6.5, 3.3, 5, qualifying))
+        self.assertEqual(len(checked), len(self.points))
+
+        self.grid.remove('london')
+        checked.clear()
+        found = self.grid.nearest(6.5, 3.3, 5, predicate=predicate)
+        self.assertEqual({point['id'] for point in found}, {'d1', 'd2'})
+        self.assertEqual(len(checked), len(self.points) - 1)
+
+    def test_max_km_bounds_the_search(self):
+        self.grid.upsert('london', 51.5074, -0.1278)
+        found = self.grid.nearest(51.5, -0.13, 5, max_km=50)
+        self.assertEqual([point['id'] for point in found], ['london'])
+        self.assertEqual(self.grid.nearest(51.5, -0.13, 5, max_km=0.1), [])
+
+
+class StubBackend(GeocodingBackend):
+    """Answers from a dict of rounded points; raises for points in ``failing``"""
+
+    def __init__(self, addresses=None, failing=(), offline=False, gate=None):
+        self.addresses = addresses or {}
+        self.failing = set(failing)
+        self.offline = offline
+        self.gate = gate
+        self.calls = []
+
+    def reverse(self, lat, lng):
+        self.calls.append((lat, lng))
+        if self.gate is not None:
+            self.gate.wait(5)
+        if (lat, lng) in self.failing:
+            raise RuntimeError('unavailable')
+        return self.addresses.get((lat, lng))
+
+
+class GeocodeCacheTests(SimpleTestCase):
+    def test_get_set_and_empty_address(self):
+        cache = GeocodeCache()
+        self.assertIsNone(cache.get('1.0000,2.0000'))
+        cache.set('1.0000,2.0000', 'Main Street')
+        cache.set('3.0000,4.0000', '')
+        self.assertEqual(cache.get('1.0000,2.0000'), 'Main Street')
+        self.assertEqual(cache.get('3.0000,4.0000'), '')
+        self.assertEqual(cache.stats()['hits'], 2)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = GeocodeCache(max_entries=2)
+        cache.set('a', 'A')
+        cache.set('b', 'B')
+        cache.get('a')
+        cache.set('c', 'C')
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'A')
+
+    def test_hits_write_their_use_time_in_batches(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'geocode.sqlite3')
+            cache = GeocodeCache(path, touch_interval=3600)
+            cache.set('a', 'A')
+            used_at = lambda: sqlite3.connect(path).execute('SELECT used_at FROM geocode_cache').fetchone()[0]
+            stored = used_at()
+            self.assertEqual(cache.get('a'), 'A')
+            self.assertEqual(used_at(), stored)
+            cache.flush()
+            self.assertGreater(used_at(), stored)
+            # A fresh process reads the entry back from the file
+            self.assertEqual(GeocodeCache(path).get('a'), 'A')
+
+
+class ReverseGeocoderTests(SimpleTestCase):
+    def test_offline_backend_answers_inline_and_is_cached(self):
+        gazetteer = StubBackend({(6.5244, 3.3792): 'Lagos Island'}, offline=True)
+        geocoder = ReverseGeocoder([gazetteer], GeocodeCache())
+        self.assertEqual(geocoder.reverse(6.52441, 3.37921), 'Lagos Island')
+        self.assertEqual(geocoder.reverse(6.52439, 3.37919), 'Lagos Island')
+        self.assertEqual(len(gazetteer.calls), 1)
+
+    def test_online_backend_resolves_misses_in_the_background(self):
+        gate = threading.Event()
+        online = StubBackend({(6.5244, 3.3792): 'Broad Street'}, gate=gate)
+        geocoder = ReverseGeocoder([online], GeocodeCache())
+        self.assertIsNone(geocoder.reverse(6.5244, 3.3792))
+        # Repeated misses while the lookup is pending do not queue it again
+        self.assertIsNone(geocoder.reverse(6.5244, 3.3792))
+        gate.set()
+        geocoder.join()
+        self.assertEqual(geocoder.reverse(6.5244, 3.3792), 'Broad Street')
+        self.assertEqual(len(online.calls), 1)
+
+    def test_unknown_point_is_remembered_only_when_every_backend_answered(self):
+        online = StubBackend()
+        geocoder = ReverseGeocoder([StubBackend(offline=True), online], GeocodeCache())
+        self.assertIsNone(geocoder.reverse(1, 2))
+        geocoder.join()
+        self.assertEqual(geocoder.cache.get(geocoder.key(1, 2)), '')
+        self.assertIsNone(geocoder.reverse(1, 2))
+        self.assertEqual(len(online.calls), 1)
+
+    def test_failed_lookup_is_not_cached(self):
+        online = StubBackend(failing=[(1.0, 2.0)])
+        geocoder = ReverseGeocoder([online], GeocodeCache())
+        geocoder.reverse(1, 2)
+        geocoder.join()
+        self.assertIsNone(geocoder.cache.get(geocoder.key(1, 2)))
+        online.failing.clear()
+        online.addresses[(1.0, 2.0)] = 'Ikeja'
+        geocoder.reverse(1, 2)
+        geocoder.join()
+        self.assertEqual(geocoder.reverse(1, 2), 'Ikeja')
+
+
+class LiveStatusTests(SimpleTestCase):
+    def setUp(self):
+        self.location = {'latitude': 6.5, 'longitude': 3.4, 'address': None,
+                         'last_updated': '2025-01-01T10:00:00Z', 'is_online': True}
+        service = mock.Mock()
+        service.get_driver_by_id.return_value = {'id': 'd1', 'firstName': 'Ada', 'isDriverOnline': True}
+        service.get_driver_location.side_effect = lambda driver_id, resolve_address: dict(self.location)
+        service.get_driver_current_trip.return_value = {'id': 't1', 'status': 'accepted'}
+        service.with_address.side_effect = lambda location: {**location, 'address': 'Broad Street'}
+        self.service = service
+        patchers = [mock.patch('app.views.firebase_service', service),
+                    mock.patch('app.views.live_hub.latest', return_value=None)]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return views.driver_live_status(RequestFactory().get('/api/drivers/d1/live/', **headers), 'd1')
+
+    def test_unchanged_status_is_not_rebuilt(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)['location']['address'], 'Broad Street')
+        self.service.get_driver_location.assert_called_with('d1', resolve_address=False)
+
+        self.service.with_address.reset_mock()
+        again = self.get(response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        self.assertEqual(again['ETag'], response['ETag'])
+        self.service.with_address.assert_not_called()
+
+    def test_moved_driver_gets_a_new_payload(self):
+        etag = self.get()['ETag']
+        self.location.update(latitude=6.6, last_updated='2025-01-01T10:00:05Z')
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class FakeConnection:
+    """Mail connection recording opens and sends; rejects ``log['reject']`` addresses while ``log['rejections']`` lasts"""
+
+    def __init__(self, log):
+        self.log = log
+
+    def open(self):
+        self.log['opened'] += 1
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        recipients = messages[0].recipients()
+        if set(recipients) & self.log['reject'] and self.log['rejections']:
+            self.log['rejections'] -= 1
+            raise OSError('rejected')
+        self.log['sent'].append(recipients)
+        return 1
+
+
+class BulkMailerTests(SimpleTestCase):
+    def mailer(self, reject=(), rejections=0, **kwargs):
+        self.log = {'opened': 0, 'sent': [], 'reject': set(reject), 'rejections': rejections}
+        return BulkMailer(from_email='ops@example.com', max_retries=1,
+                          connection_factory=lambda: FakeConnection(self.log), **kwargs)
+
+    def test_connections_are_reused_per_batch(self):
+        result = self.mailer(batch_size=2).send('Hi', 'Body', ['a@x.io', 'b@x.io', 'A@x.io', '', 'c@x.io'])
+        self.assertEqual(self.log['sent'], [['a@x.io'], ['b@x.io'], ['c@x.io']])
+        self.assertEqual((result['total'], result['sent'], result['messages'], result['connections']), (3, 3, 3, 2))
+        self.assertEqual(self.log['opened'], 2)
+
+    def test_bcc_mode_sends_chunks(self):
+        result = self.mailer(bcc_chunk_size=2).send('Hi', 'Body', ['a@x.io', 'b@x.io', 'c@x.io'], mode='bcc')
+        self.assertEqual(self.log['sent'], [['a@x.io', 'b@x.io'], ['c@x.io']])
+        self.assertEqual((result['sent'], result['messages']), (3, 2))
+        with self.assertRaises(ValueError):
+            self.mailer().send('Hi', 'Body', ['a@x.io'], mode='cc')
+
+    def test_failures_are_retried_on_a_fresh_connection_then_reported(self):
+        result = self.mailer(reject=['b@x.io'], rejections=1).send('Hi', 'Body', ['a@x.io', 'b@x.io', 'c@x.io'])
+        self.assertEqual((result['sent'], result['failed'], result['connections']), (3, [], 2))
+
+        result = self.mailer(reject=['b@x.io'], rejections=2).send('Hi', 'Body', ['a@x.io', 'b@x.io', 'c@x.io'])
+        self.assertEqual(result['sent'], 2)
+        self.assertEqual(result['failed'], [{'recipients': ['b@x.io'], 'error': 'rejected'}])
+        self.assertEqual(self.log['sent'], [['a@x.io'], ['c@x.io']])
+
+
+class MailCampaignTests(TestCase):
+    def test_campaigns_are_claimed_once_and_taken_over_when_stale(self):
+        campaign = queue_campaign('Hi', 'Body', ['a@x.io', 'A@x.io', 'b@x.io'])
+        self.assertEqual((campaign.total, campaign.recipients.count()), (2, 2))
+
+        claimed = claim_campaign(stale_after=300)
+        self.assertEqual((claimed.pk, claimed.status), (campaign.pk, MailCampaign.STATUS_RUNNING))
+        self.assertIsNotNone(claimed.started_at)
+        self.assertIsNone(claim_campaign(stale_after=300))
+
+        MailCampaign.objects.filter(pk=campaign.pk).update(heartbeat_at=dj_timezone.now() - timedelta(minutes=10))
+        self.assertEqual(claim_campaign(stale_after=300).pk, campaign.pk)
+
+    def test_runs_resume_from_the_last_checkpoint(self):
+        campaign = queue_campaign('Hi', 'Body', ['a@x.io', 'b@x.io', 'c@x.io', 'd@x.io'])
+        first = campaign.recipients.order_by('pk').first()
+        first.status, first.sent_at = MailRecipient.STATUS_SENT, dj_timezone.now()
+        first.save()
+        MailCampaign.objects.filter(pk=campaign.pk).update(sent_count=1)
+
+        sent = []
+        mailer = mock.Mock(spec=BulkMailer)
+        mailer.batch_size = 2
+
+        def send(subject, body, recipients, mode):
+            sent.append(recipients)
+            failed = [{'recipients': ['c@x.io'], 'error': 'rejected'}] if 'c@x.io' in recipients else []
+            return {'failed': failed}
+        mailer.send.side_effect = send
+
+        campaign = run_campaign(claim_campaign(stale_after=300), mailer)
+        self.assertEqual(sent, [['b@x.io', 'c@x.io'], ['d@x.io']])
+        self.assertEqual((campaign.status, campaign.sent_count, campaign.failed_count, campaign.last_error),
+                         (MailCampaign.STATUS_COMPLETED, 3, 1, 'rejected'))
+        self.assertEqual(campaign.recipients.get(email='c@x.io').status, MailRecipient.STATUS_FAILED)
+        self.assertEqual(campaign.remaining, 0)
+
+    def test_a_campaign_that_sent_nothing_failed(self):
+        campaign = queue_campaign('Hi', 'Body', ['a@x.io'])
+        mailer = mock.Mock(spec=BulkMailer, batch_size=10)
+        mailer.send.return_value = {'failed': [{'recipients': ['a@x.io'], 'error': 'rejected'}]}
+        self.assertEqual(run_campaign(campaign, mailer).status, MailCampaign.STATUS_FAILED)
+
+
+class MailWorkerMissingTests(TestCase):
+    def campaign(self, status, age, heartbeat_age=None):
+        now = dj_timezone.now()
+        campaign = MailCampaign.objects.create(subject='Hello', message='Hi', status=status)
+        MailCampaign.objects.filter(pk=campaign.pk).update(
+            created_at=now - timedelta(seconds=age),
+            heartbeat_at=None if heartbeat_age is None else now - timedelta(seconds=heartbeat_age))
+        return campaign
+
+    def test_nothing_waiting(self):
+        self.campaign(MailCampaign.STATUS_COMPLETED, age=3600)
+        self.assertFalse(mail_worker_missing(stale_after=300, claim_after=60))
+
+    def test_unclaimed_campaign_means_no_worker(self):
+        self.campaign(MailCampaign.STATUS_QUEUED, age=10)
+        self.assertFalse(mail_worker_missing(stale_after=300, claim_after=60))
+        self.campaign(MailCampaign.STATUS_QUEUED, age=120)
+        self.assertTrue(mail_worker_missing(stale_after=300, claim_after=60))
+
+    def test_busy_worker_is_running(self):
+        self.campaign(MailCampaign.STATUS_QUEUED, age=120)
+        running = self.campaign(MailCampaign.STATUS_RUNNING, age=600, heartbeat_age=5)
+        self.assertFalse(mail_worker_missing(stale_after=300, claim_after=60))
+        MailCampaign.objects.filter(pk=running.pk).update(heartbeat_at=dj_timezone.now() - timedelta(seconds=900))
+        self.assertTrue(mail_worker_missing(stale_after=300, claim_after=60))
+
+
+class FakeCollection:
+    def __init__(self, name, documents):
+        self.id = name
+        self.documents = documents
+
+    def stream(self):
+        return iter([FakeDocument(doc_id, data) for doc_id, data in self.documents.items()])
+
+    def order_by(self, field):
+        return FakeCollection(self.id, dict(sorted(self.documents.items())))
+
+    def start_at(self, cursor):
+        start = cursor['__name__']
+        return FakeCollection(self.id, {k: v for k, v in self.documents.items() if k >= start})
+
+    def end_before(self, cursor):
+        end = cursor['__name__']
+        return FakeCollection(self.id, {k: v for k, v in self.documents.items() if k < end})
+
+
+class FakeFirestore:
+    """Just enough of a Firestore client for a full sync_firebase_data run"""
+
+    def __init__(self, collections):
+        self.data = collections
+
+    def collections(self):
+        return [FakeCollection(name, documents) for name, documents in self.data.items()]
+
+    def collection(self, name):
+        return FakeCollection(name, self.data.get(name, {}))
+
+
+class SyncFirebaseDataTests(TestCase):
+    def setUp(self):
+        created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        self.firestore = FakeFirestore({
+            'Drivers': {
+                'd1': {'firstName': 'Ada', 'lastName': 'Obi', 'email': 'ada@example.com', 'phoneNumber': '0800',
+                       'isApproved': True, 'isDriverOnline': True, 'dateCreated': created},
+                'd2': {'firstName': 'Ben', 'lastName': 'Eze', 'isApproved': False},
+            },
+            'Customers': {
+                'c1': {'firstName': 'Chi', 'lastName': 'Nwa', 'customerId': 'CUST-1',
+                       'dateCreated': '2024-02-01T00:00:00Z'},
+            },
+            'Orders': {
+                'o1': {'customerId': 'CUST-1', 'driverId': 'd1', 'fare': '1500.5', 'status': 'completed'},
+                'o2': {'customerId': 'unknown', 'fare': 10},
+            },
+        })
+
+    def sync(self, *args):
+        with mock.patch('app.management.commands.sync_firebase_data.firestore.client', return_value=self.firestore):
+            call_command('sync_firebase_data', *args, stdout=io.StringIO())
+
+    def test_full_sync_writes_the_legacy_tables(self):
+        self.sync()
+        ada = Driver.objects.get(firebase_id='d1')
+        self.assertEqual((ada.name, ada.phone, ada.status), ('Ada Obi', '0800', 'online'))
+        self.assertEqual(ada.created_at, datetime(2024, 1, 1, tzinfo=timezone.utc))
+        self.assertEqual(Driver.objects.get(firebase_id='d2').status, 'pending')
+        self.assertEqual(Customer.objects.get(firebase_id='c1').customer_id, 'CUST-1')
+
+        order = DeliveryOrder.objects.get()
+        self.assertEqual((order.firebase_id, order.customer.firebase_id, order.driver.firebase_id),
+                         ('o1', 'c1', 'd1'))
+        self.assertEqual(order.fare, Decimal('1500.50'))
+
+    def test_resync_updates_rows_in_place(self):
+        self.sync()
+        self.firestore.data['Drivers']['d2'].update(firstName='Benedict', isApproved=True)
+        self.sync('--model', 'drivers', '--batch-size', '1')
+        self.assertEqual(Driver.objects.count(), 2)
+        ben = Driver.objects.get(firebase_id='d2')
+        self.assertEqual((ben.name, ben.status), ('Benedict Eze', 'offline'))
+
+    def test_resync_keeps_the_creation_date_of_undated_documents(self):
+        self.sync()
+        created = Driver.objects.get(firebase_id='d2').created_at
+        self.sync('--model', 'drivers')
+        self.assertEqual(Driver.objects.get(firebase_id='d2').created_at, created)
+
+    def test_orders_without_a_local_customer_are_reported(self):
+        self.firestore.data['Orders']['o3'] = {'customerId': 'c1', 'driverId': 'missing-driver'}
+        self.sync()
+        self.assertIsNone(DeliveryOrder.objects.get(firebase_id='o3').driver)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'missing.csv')
+            self.sync('--model', 'orders', '--missing-report', path)
+            with open(path, newline='', encoding='utf-8') as f:
+                rows = list(csv.DictReader(f))
+        self.assertEqual(rows, [{'order_id': 'o2', 'customer_id': 'unknown', 'driver_id': ''}])
+
+
+class CollectionReplicaTests(TestCase):
+    def setUp(self):
+        self.customers, self.drivers, self.orders = default_replicas()
+
+    def test_order_waits_for_its_customer(self):
+        self.orders.apply({'t1': {'userID': 'c1', 'driverID': 'd1', 'deliveryAmount': '12.5'}}, set())
+        self.assertFalse(DeliveryOrder.objects.exists())
+        self.assertIn('t1', self.orders.deferred)
+
+        self.customers.apply({'c1': {'firstName': 'Chi'}}, set())
+        self.drivers.apply({'d1': {'firstName': 'Ada', 'isApproved': True}}, set())
+        self.orders.apply({}, set(), retry_deferred=True)
+        order = DeliveryOrder.objects.get(firebase_id='t1')
+        self.assertEqual((order.customer.name, order.driver.name, order.fare), ('Chi', 'Ada', Decimal('12.50')))
+        self.assertEqual(self.orders.deferred, {})
+
+    def test_snapshot_removes_rows_missing_from_the_collection(self):
+        self.drivers.apply({'d1': {'firstName': 'Ada'}, 'd2': {'firstName': 'Ben'}}, set())
+        self.drivers.apply({'d1': {'firstName': 'Adaeze'}}, set(), snapshot_ids={'d1'})
+        self.assertEqual(list(Driver.objects.values_list('firebase_id', 'name')), [('d1', 'Adaeze')])
+        self.assertEqual(self.drivers.stats['deleted'], 1)
+
+    def test_snapshot_leaves_rows_synced_from_orders(self):
+        self.customers.apply({'c1': {'firstName': 'Chi'}}, set())
+        customer = Customer.objects.get()
+        DeliveryOrder.objects.create(firebase_id='o1', source='Orders', customer=customer)
+        self.orders.apply({'t1': {'userID': 'c1'}}, set(), snapshot_ids={'t1'})
+        self.assertEqual(sorted(DeliveryOrder.objects.values_list('firebase_id', 'source')),
+                         [('o1', 'Orders'), ('t1', 'DeliveryRequests')])
+        self.orders.apply({}, set(), snapshot_ids=set())
+        self.assertEqual(list(DeliveryOrder.objects.values_list('firebase_id', flat=True)), ['o1'])
+
+    def test_checkpoint_waits_for_deferred_documents(self):
+        first, second, third = (datetime(2024, 1, day, tzinfo=timezone.utc) for day in (1, 2, 3))
+        self.orders.save_checkpoint(first, 0)
+        self.orders.apply({'t1': {'userID': 'c1'}}, set())
+        self.orders.save_checkpoint(second, 1)
+        self.assertEqual(self.orders.checkpoint, first)
+
+        self.customers.apply({'c1': {'firstName': 'Chi'}}, set())
+        self.orders.apply({}, set(), retry_deferred=True)
+        self.orders.save_checkpoint(third, 0)
+        self.assertEqual(SyncCheckpoint.objects.get(collection='replica:DeliveryRequests').last_updated, third)
+
+    def test_dropped_documents_hold_the_checkpoint_until_the_next_snapshot(self):
+        first, second = (datetime(2024, 1, day, tzinfo=timezone.utc) for day in (1, 2))
+        self.orders.max_deferred = 0
+        self.orders.save_checkpoint(first, 0)
+        self.orders.apply({'t1': {'userID': 'c1'}, 't2': {'userID': 'c2'}}, set())
+        self.assertEqual(self.orders.deferred, {})
+        self.orders.save_checkpoint(second, 2)
+        self.assertEqual(self.orders.checkpoint, first)
+
+        self.orders.apply({}, set(), snapshot_ids=set())
+        self.orders.save_checkpoint(second, 0)
+        self.assertEqual(self.orders.checkpoint, second)
+
+
+class SyncShardedTests(SimpleTestCase):
+    def test_every_document_is_written_by_exactly_one_shard(self):
+        ids = ['0a', '9z', 'AB', 'Mq', 'Zz', 'ab', 'mm', 'zz', '_x', '~y'] + [f'K{i:03d}' for i in range(50)]
+        collection = FakeCollection('Orders', {doc_id: {} for doc_id in ids})
+        written = []
+        lock = threading.Lock()
+
+        def write(docs):
+            with lock:
+                written.extend(doc.id for doc in docs)
+            return {'synced': len(docs), 'errors': 0}
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            result = sync_sharded(collection, write, executor, 4, batch_size=7)
+        self.assertEqual(result, {'synced': len(ids), 'errors': 0})
+        self.assertCountEqual(written, ids)
+
+
+class StubBatchWriteApi:
+    """Answers BatchWrite RPCs with a status code per document ID (0 once ``codes`` runs out)"""
+
+    def __init__(self, codes):
+        self.codes = codes
+        self.attempts = {}
+        self.written = {}
+        self.lock = threading.Lock()
+
+    def batch_write(self, request=None, **kwargs):
+        statuses = []
+        with self.lock:
+            for write in request['writes']:
+                doc_id = write.update.name.rsplit('/', 1)[1]
+                attempt = self.attempts.get(doc_id, 0)
+                self.attempts[doc_id] = attempt + 1
+                codes = self.codes.get(doc_id, [])
+                code = codes[attempt] if attempt < len(codes) else 0
+                if code == 0:
+                    # SERVER_TIMESTAMP fields travel as transforms, not values
+                    self.written[doc_id] = set(write.update.fields) | {t.field_path for t in write.update_transforms}
+                statuses.append(status_pb2.Status(code=code, message=f'code {code}' if code else ''))
+        return BatchWriteResponse(write_results=[WriteResult() for _ in statuses], status=statuses)
+
+
+class PushDocumentsTests(SimpleTestCase):
+    ABORTED, PERMISSION_DENIED = 10, 7
+    SYNCED_AT = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+    def push(self, codes, rows, remote=None, max_retries=3):
+        """Push ``rows`` (firebase_id -> name) over documents in ``remote`` (firebase_id -> (name, update_time))"""
+        client = gcloud_firestore.Client(project='test', credentials=AnonymousCredentials())
+        api = StubBatchWriteApi(codes)
+        client._firestore_api_internal = api
+        if remote is None:
+            remote = {doc_id: ('old', self.SYNCED_AT) for doc_id in rows if doc_id}
+        rows = [SimpleNamespace(pk=i, firebase_id=doc_id, name=name, updated_at=self.SYNCED_AT + timedelta(hours=1))
+                for i, (doc_id, name) in enumerate(rows.items())]
+
+        def get_all(references, field_paths=None):
+            for reference in references:
+                name, update_time = remote.get(reference.id, (None, None))
+                yield SimpleNamespace(id=reference.id, exists=reference.id in remote, update_time=update_time,
+                                      to_dict=lambda name=name: {'name': name})
+
+        with mock.patch.object(client, 'get_all', side_effect=get_all), \
+                mock.patch('app.firebase_sync.time.sleep') as sleep:
+            result = push_documents(client, 'Drivers', rows, lambda row: {'name': row.name}, {'name': 5},
+                                    max_retries=max_retries)
+        return result, api, sleep
+
+    def test_transient_failures_are_sent_again(self):
+        result, api, sleep = self.push({'d2': [self.ABORTED, self.ABORTED]}, {'d1': 'a', 'd2': 'b', 'd3': 'c'})
+        self.assertEqual(result, {'written': 3, 'skipped': 0, 'failed': []})
+        self.assertEqual(api.attempts, {'d1': 1, 'd2': 3, 'd3': 1})
+        self.assertEqual(api.written['d2'], {'name', UPDATED_FIELD})
+        self.assertEqual([c.args for c in sleep.call_args_list], [(1,), (2,)])
+
+    def test_permanent_failures_are_reported_without_retrying(self):
+        result, api, sleep = self.push({'d2': [self.PERMISSION_DENIED]}, {'d1': 'a', 'd2': 'b', '': 'c'})
+        self.assertEqual(result['written'], 1)
+        self.assertEqual(result['failed'], [{'id': 'pk=2', 'error': 'no firebase_id'},
+                                            {'id': 'd2', 'error': 'code 7'}])
+        self.assertEqual(api.attempts, {'d1': 1, 'd2': 1})
+        sleep.assert_not_called()
+
+    def test_writes_still_failing_after_the_last_pass_are_reported(self):
+        result, api, _ = self.push({'d1': [self.ABORTED] * 5}, {'d1': 'a'}, max_retries=2)
+        self.assertEqual(result, {'written': 0, 'skipped': 0, 'failed': [{'id': 'd1', 'error': 'code 10'}]})
+        self.assertEqual(api.attempts, {'d1': 3})
+
+    def test_only_changed_rows_older_than_the_row_are_written(self):
+        result, api, _ = self.push({}, {'same': 'abcde', 'cut': 'abcde', 'newer': 'x', 'gone': 'y', 'edited': 'z'}, {
+            'same': ('abcde', self.SYNCED_AT),
+            # Read into a 5 character column, so unchanged
+            'cut': ('abcdefgh', self.SYNCED_AT),
+            # Edited in the app after the row was last written
+            'newer': ('app', self.SYNCED_AT + timedelta(days=1)),
+            'edited': ('old', self.SYNCED_AT),
+        })
+        self.assertEqual(result, {'written': 1, 'skipped': 3,
+                                  'failed': [{'id': 'gone', 'error': 'document not found'}]})
+        self.assertEqual(api.attempts, {'edited': 1})
@@ -1,7 +1,7 @@
 # logistics_app/urls.py - Updated URLs
 from django.urls import path
 from . import views
-from .views_mailing import customer_mailing, driver_mailing, customer_mailing_ajax
+from .views_mailing import customer_mailing, driver_mailing, customer_mailing_ajax, mail_campaign_progress
 from .views_faqs import faqs_list, faq_create, faq_edit, faq_delete
 from django.views.generic import TemplateView
 from django.contrib.auth import views as auth_views
@@ -67,19 +67,29 @@ urlpatterns = [
 
     # Live driver status endpoint
     path('api/drivers/<str:driver_id>/live/', views.driver_live_status, name='driver_live_status'),
+    path('api/drivers/<str:driver_id>/stream/', views.driver_live_stream, name='driver_live_stream'),
 
     # API endpoints
     path('api/test-firebase/', views.test_firebase_connection, name='test_firebase'),
     path('api/drivers/', views.drivers_list_api, name='drivers_list_api'),
+    path('api/drivers/nearest/', views.nearest_drivers_api, name='nearest_drivers_api'),
     path('api/drivers/<str:driver_id>/', views.driver_detail_api, name='driver_detail_api'),
+    path('api/drivers/<str:driver_id>/ratings/', views.driver_ratings_api, name='driver_ratings_api'),
     path('api/customers/', views.customers_list_api, name='customers_list_api'),
     path('api/customers/<str:customer_id>/', views.customer_detail_api, name='customer_detail_api'),
     path('api/dashboard/stats/', views.dashboard_stats_api, name='dashboard_stats_api'),
+    path('api/orders/', views.orders_list_api, name='orders_list_api'),
+    path('api/fleet/', views.fleet_map_api, name='fleet_map_api'),
+    path('api/analytics/trips/', views.trip_analytics_api, name='trip_analytics_api'),
+    path('api/analytics/trips/series/', views.trip_series_api, name='trip_series_api'),
+    path('api/cache/stats/', views.cache_stats_api, name='cache_stats_api'),
     path('api/customers/<str:customer_id>/live/', views.customer_live_status, name='customer_live_status'),
+    path('api/customers/<str:customer_id>/stream/', views.customer_live_stream, name='customer_live_stream'),
 
 
     path('mailing/customers/', customer_mailing, name='customer_mailing'),
     path('mailing/customers/ajax/', customer_mailing_ajax, name='customer_mailing_ajax'),
+    path('mailing/campaigns/<int:campaign_id>/progress/', mail_campaign_progress, name='mail_campaign_progress'),
     path('mailing/drivers/', driver_mailing, name='driver_mailing'),
     path('faqs/', faqs_list, name='faqs'),  # Use faqs_list for /faqs/
     path('faqs/manage/', faqs_list, name='faqs_manage'),
@@ -3,12 +3,21 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse, HttpResponseNotModified
+from django.utils.http import parse_etags
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from .firebase_service import FirebaseService
+from django.conf import settings
+from .fanout import FanOutLoader
+from .firebase_service import FirebaseService, ACTIVE_TRIP_STATUSES
+from .live_stream import LiveChannel, event_stream, hub as live_hub
+from .rollups import SERIES_RESOLUTIONS
+from datetime import date, datetime, time, timedelta, timezone
+import hashlib
 import json
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 firebase_service = FirebaseService()
@@ -38,8 +47,11 @@ def home(request):
     try:
         # Get enhanced statistics
         driver_stats = firebase_service.get_driver_stats_enhanced()
+
+        # Customers and trips are mostly written by the apps, so their totals
+        # come from server-side aggregations rather than anything kept here
         customer_stats = firebase_service.get_customers_stats()
-        trip_analytics = firebase_service.get_trip_analytics()
+        trip_analytics = firebase_service.get_trip_totals()
         
         # Get recent orders for real-time updates
         recent_orders = firebase_service.get_all_trips(limit=10)
@@ -125,32 +137,38 @@ def driver_detail(request, driver_id):
     """Driver detail page with comprehensive information including trips, ratings, balance, and analytics"""
     logger.info(f"Loading driver detail for driver_id: {driver_id}")
     try:
-        driver = firebase_service.get_driver_by_id(driver_id)
+        # Independent reads run concurrently; latency follows the slowest one
+        results = (FanOutLoader()
+                   .add('driver', firebase_service.get_driver_by_id, driver_id)
+                   .add('driver_documents', firebase_service.get_driver_documents, driver_id)
+                   .add('vehicle', firebase_service.get_driver_vehicle, driver_id)
+                   .add('trips', firebase_service.get_driver_trips, driver_id, default=[])
+                   .add('ratings', firebase_service.get_driver_rating_summary, driver_id,
+                        limit=getattr(settings, 'DRIVER_DETAIL_RATINGS_LIMIT', 50),
+                        default={'ratings': [], 'analytics': None})
+                   .add('earnings_info', firebase_service.get_driver_earnings, driver_id)
+                   .add('balance_info', firebase_service.get_driver_balance, driver_id,
+                        default={'balance': 0, 'pendingAmount': 0, 'totalEarned': 0})
+                   .add('location_info', firebase_service.get_driver_location, driver_id)
+                   .run())
+
+        driver = results['driver']
         if not driver:
             messages.error(request, "Driver not found")
             return redirect('drivers_management')
 
-        # Fetch driver documents
-        driver_documents = firebase_service.get_driver_documents(driver_id)
-
-        # Fetch vehicle
-        vehicle = None
-        vehicles_ref = firebase_service.db.collection('VehicleDetails').where('userID', '==', driver['id']).stream()
-        for doc in vehicles_ref:
-            vehicle_data = doc.to_dict()
-            vehicle_data['id'] = doc.id
-            vehicle = vehicle_data
-            break
+        driver_documents = results['driver_documents']
+        vehicle = results['vehicle']
             
-        # Fetch driver trips with enhanced data
-        trips = firebase_service.get_driver_trips(driver_id)
+        # Driver trips with enhanced data
+        trips = results['trips']
         completed_trips = [trip for trip in trips if trip.get('status') in ['completed', 'ended', 'delivered']]
         ongoing_trips = [trip for trip in trips if trip.get('status') in ['pending', 'accepted', 'picked_up', 'in_progress']]
         cancelled_trips = [trip for trip in trips if trip.get('status') in ['cancelled', 'cancelled_by_driver', 'cancelled_by_customer']]
         
-        # Fetch enhanced driver ratings with trip context
-        ratings = firebase_service.get_driver_ratings(driver_id)
-        rating_analytics = firebase_service.get_rating_analytics(driver_id)
+        # Enhanced driver ratings with trip context
+        ratings = results['ratings']['ratings']
+        rating_analytics = results['ratings']['analytics']
         if not rating_analytics:
             rating_analytics = {
                 'total_ratings': 0,
@@ -159,8 +177,8 @@ def driver_detail(request, driver_id):
                 'recent_ratings': []
             }
         
-        # Fetch comprehensive earnings and balance info
-        earnings_info = firebase_service.get_driver_earnings(driver_id)
+        # Comprehensive earnings and balance info
+        earnings_info = results['earnings_info']
         if not earnings_info:
             earnings_info = {
                 'total_earnings': 0,
@@ -170,10 +188,10 @@ def driver_detail(request, driver_id):
                 'pending_amount': 0,
                 'total_withdrawals': 0
             }
-        balance_info = firebase_service.get_driver_balance(driver_id)
+        balance_info = results['balance_info']
         
-        # Fetch driver location
-        location_info = firebase_service.get_driver_location(driver_id)
+        # Driver location
+        location_info = results['location_info']
         
         # Debug logging
         logger.info(f"Driver {driver_id} data summary:")
@@ -213,11 +231,12 @@ def driver_detail(request, driver_id):
             'completed_trips_count': len(completed_trips),
             'ratings': ratings,
             'rating_analytics': rating_analytics,
-            'ratings_count': len(ratings),
+            'ratings_count': rating_analytics.get('total_ratings', len(ratings)),
             'avg_rating': rating_analytics.get('average_rating', 0),
             'balance_info': balance_info,
             'earnings_info': earnings_info,
             'location_info': location_info,
+            'live_streams': getattr(settings, 'LIVE_STREAMS_ENABLED', False),
             'page_title': f'Driver Details - {driver.get("firstName", "")} {driver.get("lastName", "")}'
         }
         return render(request, "drivers/driver_detail.html", context)
@@ -231,13 +250,19 @@ def driver_detail(request, driver_id):
 def customer_detail(request, customer_id):
     """Customer detail page"""
     try:
-        customer = firebase_service.get_customer_by_id(customer_id)
+        # Fetch customer, location and orders concurrently
+        results = (FanOutLoader()
+                   .add('customer', firebase_service.get_customer_by_id, customer_id)
+                   .add('customer_location', firebase_service.get_customer_location, customer_id)
+                   .add('customer_trips', firebase_service.get_customer_trips, customer_id, default=[])
+                   .run())
+
+        customer = results['customer']
         if not customer:
             messages.error(request, "Customer not found")
             return redirect('customers_management')
-        # Fetch location and orders
-        customer_location = firebase_service.get_customer_location(customer_id)
-        customer_trips = firebase_service.get_customer_trips(customer_id)
+        customer_location = results['customer_location']
+        customer_trips = results['customer_trips']
 
         # Group orders by status
         completed = [t for t in customer_trips if t.get('status') in ['completed', 'ended', 'delivered']]
@@ -253,6 +278,7 @@ def customer_detail(request, customer_id):
             'in_transit_trips': in_transit,
             'pending_trips': pending,
             'cancelled_trips': cancelled,
+            'live_streams': getattr(settings, 'LIVE_STREAMS_ENABLED', False),
             'page_title': f'Customer Details - {customer.get("firstName", "")} {customer.get("lastName", "")}'
         }
         return render(request, "customers/customer_detail.html", context)
@@ -263,23 +289,109 @@ def customer_detail(request, customer_id):
 def customer_live_status(request, customer_id: str):
     """Return JSON with customer's current location for live tracking."""
     try:
-        customer = firebase_service.get_customer_by_id(customer_id)
-        if not customer:
-            return JsonResponse({'success': False, 'message': 'Customer not found'}, status=404)
-        location = firebase_service.get_customer_location(customer_id)
-        return JsonResponse({
-            'success': True,
-            'customer': {
-                'id': customer.get('id'),
-                'firstName': customer.get('firstName'),
-                'lastName': customer.get('lastName')
-            },
-            'location': location
-        })
+        payload = _shared_live_payload(('customer', customer_id))
+        if payload is not None:
+            customer, location = payload['customer'], payload['location']
+            build = lambda: payload
+        else:
+            results = (FanOutLoader()
+                       .add('customer', firebase_service.get_customer_by_id, customer_id)
+                       .add('location', firebase_service.get_customer_location, customer_id, resolve_address=False,
+                            default=firebase_service._customer_location_payload(None, None))
+                       .run())
+            customer, location = results['customer'], results['location']
+            if not customer:
+                return JsonResponse({'success': False, 'message': 'Customer not found'}, status=404)
+            build = lambda: _customer_live_payload(customer, firebase_service.with_address(location))
+
+        intervals = settings.LIVE_POLL_INTERVALS
+        poll_interval = intervals['online'] if location.get('latitude') or location.get('longitude') else intervals['offline']
+        version = [customer.get('id'), customer.get('firstName'), customer.get('lastName'),
+                   location.get('latitude'), location.get('longitude'), location.get('last_updated')]
+        return _conditional_live_response(request, version, poll_interval, build)
     except Exception as e:
         logger.error(f"customer_live_status error for {customer_id}: {str(e)}")
         return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
+def _shared_live_payload(key):
+    """The payload a live stream for ``key`` last pushed, when one is running in this process.
+
+    Polls for an entity someone is already streaming then cost no Firestore reads.
+    """
+    data = live_hub.latest(key)
+    if data is None:
+        return None
+    payload = json.loads(data)
+    return payload if payload.get('success') else None
+
+def _conditional_live_response(request, version, poll_interval, build):
+    """JSON live status with an ETag over ``version``; 304 when the client already has it.
+
+    ``version`` lists the few fields that change whenever the payload does
+    (names, online flag, coordinates and their timestamp, trip status), so
+    a client that is up to date gets its 304 before ``build()`` reverse
+    geocodes the address and the payload is serialized. Every response
+    suggests when to poll next in X-Poll-Interval (seconds).
+    """
+    stamp = json.dumps([version, poll_interval], cls=DjangoJSONEncoder)
+    etag = '"%s"' % hashlib.sha1(stamp.encode()).hexdigest()[:20]
+    if etag in parse_etags(request.headers.get('If-None-Match', '')):
+        response = HttpResponseNotModified()
+    else:
+        payload = build()
+        payload['poll_interval'] = poll_interval
+        response = HttpResponse(json.dumps(payload, cls=DjangoJSONEncoder), content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = 'no-cache'  # always revalidate, never serve stale
+    response['X-Poll-Interval'] = str(poll_interval)
+    return response
+
+def _customer_live_payload(customer, location):
+    return {
+        'success': True,
+        'customer': {
+            'id': customer.get('id'),
+            'firstName': customer.get('firstName'),
+            'lastName': customer.get('lastName')
+        },
+        'location': location
+    }
+
+def _live_stream_response(key, sources, build):
+    """Server-Sent Events response for one viewer of a shared live channel.
+
+    404 unless LIVE_STREAMS_ENABLED, so the pages poll instead.
+    """
+    if not getattr(settings, 'LIVE_STREAMS_ENABLED', False):
+        return JsonResponse({'success': False, 'message': 'Live streams are disabled'}, status=404)
+    response = StreamingHttpResponse(
+        event_stream(
+            key,
+            lambda: LiveChannel(sources(), build),
+            heartbeat=settings.LIVE_STREAM_HEARTBEAT,
+            max_duration=settings.LIVE_STREAM_MAX_DURATION,
+        ),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let a proxy buffer the stream
+    return response
+
+def customer_live_stream(request, customer_id: str):
+    """Push the customer's live status whenever its customer or location document changes"""
+    def build(parts):
+        customer = parts['customer']
+        if not customer:
+            return {'success': False, 'message': 'Customer not found'}
+        location = firebase_service._customer_location_payload(parts['location'], customer)
+        return _customer_live_payload(customer, location)
+
+    return _live_stream_response(
+        ('customer', customer_id),
+        lambda: firebase_service.customer_live_sources(customer_id),
+        build
+    )
+
 def update_driver_status(request):
     """AJAX endpoint to update driver status"""
     if request.method == 'POST':
@@ -507,7 +619,8 @@ def delete_payment_setting(request, setting_id):
 def orders_management(request):
     try:
         status_filter = request.GET.get('status', None)
-        trips = firebase_service.get_all_trips(limit=50, status=status_filter)
+        page = firebase_service.get_trips_page(limit=50, status=status_filter, cursor=request.GET.get('cursor'))
+        trips = page['trips']
         
         # Calculate statistics
         pending_count = len([t for t in trips if t.get('status') == 'pending'])
@@ -520,6 +633,8 @@ def orders_management(request):
             'pending_count': pending_count,
             'completed_count': completed_count,
             'total_revenue': total_revenue,
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor'],
             'page_title': 'Orders Management'
         }
         return render(request, "orders/orders_list.html", context)
@@ -757,15 +872,59 @@ def delete_customer_ajax(request):
             return JsonResponse({'success': False, 'message': str(e)})
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
+FIELD_NAME_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_.]*$')
+
+def _list_page_params(request, allowed_filters):
+    """Parse page_size/cursor/fields and boolean filters for the list APIs.
+
+    Returns (params, error_message).
+    """
+    default_size = settings.REST_FRAMEWORK.get('PAGE_SIZE', 20)
+    try:
+        page_size = int(request.GET.get('page_size', default_size))
+    except ValueError:
+        return None, 'page_size must be an integer'
+    if page_size < 1:
+        return None, 'page_size must be positive'
+
+    fields = None
+    if request.GET.get('fields'):
+        fields = [f.strip() for f in request.GET['fields'].split(',') if f.strip()]
+        if not all(FIELD_NAME_RE.match(f) for f in fields):
+            return None, 'fields must be a comma-separated list of field names'
+
+    filters = {}
+    for name in allowed_filters:
+        value = request.GET.get(name)
+        if value is None:
+            continue
+        if value.lower() in ('true', '1'):
+            filters[name] = True
+        elif value.lower() in ('false', '0'):
+            filters[name] = False
+        else:
+            return None, f'{name} must be true or false'
+
+    return {
+        'limit': min(page_size, 100),
+        'cursor': request.GET.get('cursor'),
+        'fields': fields,
+        'filters': filters,
+    }, None
+
 # Keep the existing API views for external access
 @api_view(['GET', 'POST'])
 def drivers_list_api(request):
     if request.method == 'GET':
-        drivers = firebase_service.get_all_drivers()
+        params, error = _list_page_params(request, ['isApproved', 'isDriverOnline'])
+        if error:
+            return Response({'success': False, 'message': error}, status=status.HTTP_400_BAD_REQUEST)
+        page = firebase_service.get_drivers_page(**params)
         return Response({
             'success': True,
-            'data': drivers,
-            'count': len(drivers)
+            'data': page['data'],
+            'count': len(page['data']),
+            'next_cursor': page['next_cursor']
         })
     elif request.method == 'POST':
         data = request.data
@@ -813,14 +972,41 @@ def driver_detail_api(request, driver_id):
                 'message': 'Failed to delete driver'
             }, status=status.HTTP_400_BAD_REQUEST)
 
+@api_view(['GET'])
+def driver_ratings_api(request, driver_id):
+    try:
+        limit = int(request.GET.get('limit', 20))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({
+            'success': False,
+            'message': 'limit must be positive'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(limit, 100)
+    ratings = firebase_service.get_driver_ratings(driver_id, limit=limit, start_after=request.GET.get('cursor'))
+    return Response({
+        'success': True,
+        'data': ratings,
+        'count': len(ratings),
+        'next_cursor': ratings[-1]['id'] if ratings and len(ratings) == limit else None
+    })
+
 @api_view(['GET', 'POST'])
 def customers_list_api(request):
     if request.method == 'GET':
-        customers = firebase_service.get_all_customers()
+        params, error = _list_page_params(request, [])
+        if error:
+            return Response({'success': False, 'message': error}, status=status.HTTP_400_BAD_REQUEST)
+        page = firebase_service.get_customers_page(**params)
         return Response({
             'success': True,
-            'data': customers,
-            'count': len(customers)
+            'data': page['data'],
+            'count': len(page['data']),
+            'next_cursor': page['next_cursor']
         })
     elif request.method == 'POST':
         data = request.data
@@ -877,6 +1063,156 @@ def dashboard_stats_api(request):
         'data': {'drivers': driver_stats, 'customers': customer_stats}
     })
 
+@api_view(['GET'])
+def orders_list_api(request):
+    try:
+        limit = int(request.GET.get('limit', 50))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'limit must be an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if limit < 1:
+        return Response({
+            'success': False,
+            'message': 'limit must be positive'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    limit = min(limit, 100)
+    page = firebase_service.get_trips_page(
+        limit=limit,
+        status=request.GET.get('status'),
+        cursor=request.GET.get('cursor')
+    )
+    return Response({
+        'success': True,
+        'data': page['trips'],
+        'count': len(page['trips']),
+        'next_cursor': page['next_cursor'],
+        'prev_cursor': page['prev_cursor']
+    })
+
+@api_view(['GET'])
+def fleet_map_api(request):
+    """Online drivers inside the map viewport; bbox is west,south,east,north like Leaflet's toBBoxString()"""
+    try:
+        west, south, east, north = [float(value) for value in request.GET.get('bbox', '').split(',')]
+        limit = min(int(request.GET.get('limit', settings.FLEET_MAP_MAX_DRIVERS)), settings.FLEET_MAP_MAX_DRIVERS)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'bbox must be west,south,east,north and limit an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= south <= north <= 90 and -180 <= west <= 180 and -180 <= east <= 180) or limit < 1:
+        return Response({
+            'success': False,
+            'message': 'bbox is out of range'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    fleet = firebase_service.get_fleet_in_bbox(south, west, north, east, limit)
+    return Response({
+        'success': True,
+        'data': fleet['drivers'],
+        'count': len(fleet['drivers']),
+        'truncated': fleet['truncated'],
+        'live': fleet['live']
+    })
+
+@api_view(['GET'])
+def nearest_drivers_api(request):
+    """Online, approved drivers ranked by distance from lat/lng"""
+    try:
+        lat = float(request.GET['lat'])
+        lng = float(request.GET['lng'])
+        k = min(int(request.GET.get('k', 5)), settings.NEAREST_DRIVERS_MAX_K)
+        max_km = float(request.GET['max_km']) if request.GET.get('max_km') else settings.NEAREST_DRIVERS_MAX_KM
+    except (KeyError, ValueError):
+        return Response({
+            'success': False,
+            'message': 'lat and lng are required numbers, k an integer and max_km a number'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or k < 1 or max_km <= 0:
+        return Response({
+            'success': False,
+            'message': 'lat/lng are out of range or k/max_km are not positive'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    drivers = firebase_service.find_nearest_drivers(lat, lng, k, max_km)
+    return Response({
+        'success': True,
+        'data': drivers,
+        'count': len(drivers)
+    })
+
+@api_view(['GET'])
+def trip_series_api(request):
+    """Trip counts by status and revenue per hour/day/week, from the per-day rollups"""
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else date.today()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+        max_points = int(request.GET.get('max_points', settings.TRIP_SERIES_MAX_POINTS))
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'start/end must be YYYY-MM-DD and max_points an integer'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    resolution = request.GET.get('resolution', 'day')
+    if resolution not in SERIES_RESOLUTIONS:
+        return Response({
+            'success': False,
+            'message': f"resolution must be one of {', '.join(SERIES_RESOLUTIONS)}"
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if start > end or (end - start).days >= settings.TRIP_SERIES_MAX_DAYS or max_points < 1:
+        return Response({
+            'success': False,
+            'message': f'start must not be after end, the range is limited to {settings.TRIP_SERIES_MAX_DAYS} days '
+                       f'and max_points must be positive'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    series = firebase_service.get_trip_series(start, end, resolution, max_points)
+    return Response({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'resolution': resolution,
+        'data': series,
+        'count': len(series)
+    })
+
+@api_view(['GET'])
+def trip_analytics_api(request):
+    """Trip totals, completion rate and revenue for trips created in the days [start, end]"""
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else date.today()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else end - timedelta(days=29)
+    except ValueError:
+        return Response({
+            'success': False,
+            'message': 'start/end must be YYYY-MM-DD'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if start > end or (end - start).days >= settings.TRIP_ANALYTICS_MAX_DAYS:
+        return Response({
+            'success': False,
+            'message': f'start must not be after end and the range is limited to '
+                       f'{settings.TRIP_ANALYTICS_MAX_DAYS} days'
+        }, status=status.HTTP_400_BAD_REQUEST)
+
+    since = datetime.combine(start, time.min, tzinfo=timezone.utc)
+    until = datetime.combine(end + timedelta(days=1), time.min, tzinfo=timezone.utc)
+    return Response({
+        'success': True,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'data': firebase_service.get_trip_analytics(since, until)
+    })
+
+@api_view(['GET'])
+def cache_stats_api(request):
+    return Response({
+        'success': True,
+        'data': firebase_service.get_cache_stats()
+    })
+
 @api_view(['GET'])
 def test_firebase_connection(request):
     try:
@@ -1053,39 +1389,75 @@ def delete_vehicle(request):
 def driver_live_status(request, driver_id: str):
     """Return JSON with driver's current location and active trip for live tracking."""
     try:
-        driver = firebase_service.get_driver_by_id(driver_id)
-        if not driver:
-            return JsonResponse({'success': False, 'message': 'Driver not found'}, status=404)
-
-        location = firebase_service.get_driver_location(driver_id)
-        current_trip = firebase_service.get_driver_current_trip(driver_id)
+        payload = _shared_live_payload(('driver', driver_id))
+        if payload is not None:
+            driver, location, current_trip = payload['driver'], payload['location'], payload['current_trip']
+            build = lambda: payload
+        else:
+            results = (FanOutLoader()
+                       .add('driver', firebase_service.get_driver_by_id, driver_id)
+                       .add('location', firebase_service.get_driver_location, driver_id, resolve_address=False,
+                            default=firebase_service._driver_location_payload(None, None))
+                       .add('current_trip', firebase_service.get_driver_current_trip, driver_id)
+                       .run())
+            driver, location, current_trip = results['driver'], results['location'], results['current_trip']
+            if not driver:
+                return JsonResponse({'success': False, 'message': 'Driver not found'}, status=404)
+            build = lambda: _driver_live_payload(driver, firebase_service.with_address(location), current_trip)
+
+        current_trip = current_trip or {}
+        intervals = settings.LIVE_POLL_INTERVALS
+        if current_trip.get('status') in ACTIVE_TRIP_STATUSES:
+            poll_interval = intervals['active_trip']
+        else:
+            poll_interval = intervals['online'] if driver.get('isDriverOnline', False) else intervals['offline']
+        version = [driver.get('id'), driver.get('firstName'), driver.get('lastName'), driver.get('isDriverOnline', False),
+                   location.get('latitude'), location.get('longitude'), location.get('last_updated'),
+                   location.get('is_online'), current_trip.get('id'), current_trip.get('status')]
+        return _conditional_live_response(request, version, poll_interval, build)
+    except Exception as e:
+        logger.error(f"driver_live_status error for {driver_id}: {str(e)}")
+        return JsonResponse({'success': False, 'message': str(e)}, status=500)
 
-        # Shape response
-        payload = {
-            'success': True,
-            'driver': {
-                'id': driver.get('id'),
-                'firstName': driver.get('firstName'),
-                'lastName': driver.get('lastName'),
-                'isDriverOnline': driver.get('isDriverOnline', False)
-            },
-            'location': location,
-            'current_trip': None
+def _driver_live_payload(driver, location, current_trip):
+    # Shape response
+    payload = {
+        'success': True,
+        'driver': {
+            'id': driver.get('id'),
+            'firstName': driver.get('firstName'),
+            'lastName': driver.get('lastName'),
+            'isDriverOnline': driver.get('isDriverOnline', False)
+        },
+        'location': location,
+        'current_trip': None
+    }
+
+    if current_trip:
+        payload['current_trip'] = {
+            'id': current_trip.get('id'),
+            'status': current_trip.get('status'),
+            'pickupLocation': current_trip.get('pickupLocation'),
+            'dropOffLocation': current_trip.get('dropOffLocation'),
+            'pickupLatLng': current_trip.get('pickupLatLng'),
+            'dropOffLatLng': current_trip.get('dropOffLatLng'),
+            'deliveryAmount': current_trip.get('deliveryAmount'),
+            'orderID': current_trip.get('orderID')
         }
 
-        if current_trip:
-            payload['current_trip'] = {
-                'id': current_trip.get('id'),
-                'status': current_trip.get('status'),
-                'pickupLocation': current_trip.get('pickupLocation'),
-                'dropOffLocation': current_trip.get('dropOffLocation'),
-                'pickupLatLng': current_trip.get('pickupLatLng'),
-                'dropOffLatLng': current_trip.get('dropOffLatLng'),
-                'deliveryAmount': current_trip.get('deliveryAmount'),
-                'orderID': current_trip.get('orderID')
-            }
+    return payload
 
-        return JsonResponse(payload)
-    except Exception as e:
-        logger.error(f"driver_live_status error for {driver_id}: {str(e)}")
-        return JsonResponse({'success': False, 'message': str(e)}, status=500)
\ No newline at end of file
+def driver_live_stream(request, driver_id: str):
+    """Push the driver's live status whenever its driver, location or active trip changes"""
+    def build(parts):
+        driver = parts['driver']
+        if not driver:
+            return {'success': False, 'message': 'Driver not found'}
+        location = firebase_service._driver_location_payload(parts['location'], driver)
+        return _driver_live_payload(driver, location, parts['active_trip'] or parts['latest_trip'])
+
+    return _live_stream_response(
+        ('driver', driver_id),
+        lambda: firebase_service.driver_live_sources(driver_id),
+        build
+    )
\ No newline at end of file
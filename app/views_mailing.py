@@ -1,10 +1,10 @@
-from django.shortcuts import render, redirect
-from django.conf import settings
-from django.core.mail import send_mail
+from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.csrf import csrf_exempt
 from app.firebase_service import FirebaseService
+from app.mail_engine import mail_worker_missing, queue_campaign
+from app.models import MailCampaign
 from django.http import JsonResponse
-import time
+from django.urls import reverse
 
 firebase_service = FirebaseService()
 
@@ -17,24 +17,17 @@ def customer_mailing(request):
         subject = request.POST.get('subject')
         message = request.POST.get('message')
         emails = [c.get('email') for c in customers if c.get('email')]
-        sent_count = 0
         if emails:
             try:
-                for email in emails:
-                    send_mail(
-                        subject,
-                        message,
-                        settings.DEFAULT_FROM_EMAIL,
-                        [email],  # Send to one recipient at a time
-                        fail_silently=False,
-                    )
-                    sent_count += 1
-                success = f'Email sent to {sent_count} customers.'
+                # Sent by the run_mail_worker command, one message per customer
+                campaign = queue_campaign(subject, message, emails, audience='customers')
+                success = f'Email queued for {campaign.total} customers.'
             except Exception as e:
                 error = f'Error sending email: {e}'
         else:
             error = 'No customer emails found.'
-    return render(request, 'customers/customer_mailing.html', {'success': success, 'error': error, 'total_customers': total_customers})
+    return render(request, 'customers/customer_mailing.html', {'success': success, 'error': error, 'total_customers': total_customers,
+                                                               'mail_worker_missing': mail_worker_missing()})
 
 @csrf_exempt
 def driver_mailing(request):
@@ -47,19 +40,15 @@ def driver_mailing(request):
         emails = [d.get('email') for d in drivers if d.get('email')]
         if emails:
             try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    emails,  # Send to all at once
-                    fail_silently=False,
-                )
-                success = f'Email sent to all drivers.'
+                # Bcc chunks so drivers don't see each other's addresses
+                campaign = queue_campaign(subject, message, emails, audience='drivers', mode='bcc')
+                success = f'Email queued for {campaign.total} drivers.'
             except Exception as e:
                 error = f'Error sending email: {e}'
         else:
             error = 'No driver emails found.'
-    return render(request, 'drivers/driver_mailing.html', {'success': success, 'error': error, 'total_drivers': total_drivers})
+    return render(request, 'drivers/driver_mailing.html', {'success': success, 'error': error, 'total_drivers': total_drivers,
+                                                           'mail_worker_missing': mail_worker_missing()})
 
 @csrf_exempt
 def customer_mailing_ajax(request):
@@ -68,22 +57,16 @@ def customer_mailing_ajax(request):
         message = request.POST.get('message')
         customers = firebase_service.get_all_customers()
         emails = [c.get('email') for c in customers if c.get('email')]
-        total = len(emails)
-        sent = 0
-        errors = []
-        for email in emails:
-            try:
-                send_mail(
-                    subject,
-                    message,
-                    settings.DEFAULT_FROM_EMAIL,
-                    [email],
-                    fail_silently=False,
-                )
-                sent += 1
-            except Exception as e:
-                errors.append(str(e))
-            # Simulate delay for demo (remove in production)
-            time.sleep(0.2)
-        return JsonResponse({'sent': sent, 'total': total, 'errors': errors})
+        campaign = queue_campaign(subject, message, emails, audience='customers')
+        # The worker sends it; the page follows mail_campaign_progress
+        return JsonResponse(dict(campaign.progress(), progress_url=reverse('mail_campaign_progress', args=[campaign.pk])),
+                            status=202)
     return JsonResponse({'error': 'Invalid request'}, status=400)
+
+def mail_campaign_progress(request, campaign_id):
+    campaign = get_object_or_404(MailCampaign, pk=campaign_id)
+    progress = campaign.progress()
+    # Lets the page say why a campaign isn't moving
+    progress['worker_missing'] = (campaign.status in (MailCampaign.STATUS_QUEUED, MailCampaign.STATUS_RUNNING)
+                                  and mail_worker_missing())
+    return JsonResponse(progress)
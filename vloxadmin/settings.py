@@ -33,6 +33,87 @@ if not firebase_admin._apps:
     except Exception as e:
         print(f"⚠️ Firebase initialization error: {e}")
 
+# Process-wide LRU cache for single Driver/Customer document reads
+FIREBASE_CACHE_MAX_ENTRIES = 2000
+FIREBASE_CACHE_TTL = 60  # seconds
+
+# Keep an in-memory copy of the Drivers collection via a Firestore snapshot
+# listener; reads fall back to streaming while the listener is disconnected
+FIREBASE_DRIVERS_MIRROR = False
+FIREBASE_MIRROR_RETRY_INTERVAL = 30  # seconds between reconnect attempts
+
+# Fleet map: keep online DriverLocation positions in an in-memory grid fed by a
+# snapshot listener (cell size in degrees, ~1.1 km at 0.01), and cap the drivers
+# returned for one viewport. Nearest-driver searches look no further than
+# NEAREST_DRIVERS_MAX_KM unless the request passes max_km.
+FLEET_LIVE_INDEX = True
+FLEET_GRID_CELL_SIZE = 0.01
+FLEET_MAP_MAX_DRIVERS = 500
+NEAREST_DRIVERS_MAX_K = 50
+NEAREST_DRIVERS_MAX_KM = 50
+
+# Server-side reverse geocoding of driver/customer positions. Backends are tried in
+# order; 'gazetteer' needs a CSV of name,latitude,longitude and is skipped without
+# one. Results are cached per coordinate rounded to REVERSE_GEOCODING_PRECISION
+# decimals (4 = ~11 m) in a SQLite LRU that survives restarts. Requests only see
+# the cache and the gazetteer; points needing Nominatim resolve in the background.
+REVERSE_GEOCODING_BACKENDS = ['gazetteer', 'nominatim']
+REVERSE_GEOCODING_GAZETTEER_PATH = os.environ.get('REVERSE_GEOCODING_GAZETTEER_PATH')
+REVERSE_GEOCODING_GAZETTEER_MAX_KM = 0.5
+REVERSE_GEOCODING_CACHE_PATH = BASE_DIR / 'geocode_cache.sqlite3'
+REVERSE_GEOCODING_CACHE_MAX_ENTRIES = 50000
+REVERSE_GEOCODING_PRECISION = 4
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/reverse'
+NOMINATIM_USER_AGENT = 'vloxadmin'
+NOMINATIM_MIN_INTERVAL = 1.0  # seconds between requests (Nominatim usage policy)
+
+# Thread pool used by detail pages to run independent Firestore reads concurrently
+FANOUT_MAX_WORKERS = 16
+FANOUT_TIMEOUT = 10  # seconds; per-request deadline for a fan-out
+
+# Most recent ratings listed on the driver detail page (older ones via the ratings API)
+DRIVER_DETAIL_RATINGS_LIMIT = 50
+
+# Suggested seconds between polls of the live status endpoints (X-Poll-Interval)
+LIVE_POLL_INTERVALS = {'active_trip': 5, 'online': 10, 'offline': 30}
+
+# Live tracking streams (Server-Sent Events): keep-alive interval and how long one
+# response may hold a worker before the browser reconnects, in seconds. Each viewer
+# occupies a worker for that long, which starves gunicorn's default sync workers, so
+# streams are off and the detail pages poll. Enable them only when serving with
+# --worker-class gthread (or gevent); keep the duration below gunicorn's --timeout.
+LIVE_STREAMS_ENABLED = False
+LIVE_STREAM_HEARTBEAT = 15
+LIVE_STREAM_MAX_DURATION = 25
+
+# Longest range of days the trip analytics API totals in one request
+TRIP_ANALYTICS_MAX_DAYS = 400
+
+# Trip series API: longest range served and default number of points returned.
+# The apps create and complete trips without touching the per-day rollups, so the
+# last TRIP_SERIES_LIVE_DAYS days are rebuilt when read and older than
+# TRIP_SERIES_REFRESH_INTERVAL seconds. Earlier days only follow admin status
+# changes until `manage.py rebuild_trip_series --days 7` runs; schedule it daily.
+TRIP_SERIES_MAX_DAYS = 400
+TRIP_SERIES_MAX_POINTS = 120
+TRIP_SERIES_LIVE_DAYS = 2
+TRIP_SERIES_REFRESH_INTERVAL = 300
+
+# Rows upserted per transaction by sync_firebase_data (overridable with --batch-size)
+FIREBASE_SYNC_BATCH_SIZE = 1000
+
+# replicate_firebase: most listener events per transaction, seconds to gather them,
+# and events buffered before the listeners are made to wait
+FIREBASE_REPLICA_BATCH_SIZE = 500
+FIREBASE_REPLICA_FLUSH_INTERVAL = 0.5
+FIREBASE_REPLICA_QUEUE_SIZE = 1000
+
+# Pushing local rows to Firestore: BulkWriter rate cap (Firestore's 500/50/5 ramp-up
+# guidance starts at 500 writes/s) and retries of a write failing with contention
+# or throttling before it is reported
+FIREBASE_PUSH_MAX_OPS_PER_SECOND = 500
+FIREBASE_PUSH_MAX_RETRIES = 5
+
 REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
@@ -87,6 +168,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.middleware.RequestReadCacheMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -188,6 +270,19 @@ EMAIL_USE_SSL = True
 EMAIL_PORT = 465
 EMAIL_TIMEOUT = 30
 
+# Bulk mailing: messages sent per SMTP connection, recipients per Bcc message,
+# and retries (each on a fresh connection) before a message is reported failed
+BULK_MAIL_BATCH_SIZE = 100
+BULK_MAIL_BCC_CHUNK_SIZE = 50
+BULK_MAIL_MAX_RETRIES = 2
+# The mailing pages only queue campaigns; `manage.py run_mail_worker` sends them and
+# must run as its own long-lived process next to the web server (a background worker
+# service on the host). Seconds without a checkpoint before a worker takes over a
+# running campaign, and seconds a campaign may wait unclaimed before the pages warn
+# that no worker is running.
+MAIL_WORKER_STALE_AFTER = 300
+MAIL_WORKER_CLAIM_AFTER = 60
+
 
 
 # settings.py - Additional logging configuration